@@ -0,0 +1,121 @@
+"""
+Накладные расходы журнала аудита (users/audit.py):
+
+* ``audit.check.off`` / ``.on`` — проверка ``CustomRBACPermission`` без
+  журнала и с постановкой решения в очередь (запись — в фоновом потоке);
+* ``test_sustained`` — поток ``RATE`` проверок в секунду в течение
+  ``DURATION`` секунд с записью в БД и в файл: занятость потока запросов
+  на проверку, отброшенные события, наибольшая длина очереди, скорость
+  записи и время дописывания остатка после конца потока;
+* ``test_burst`` — всплеск, которого не вмещает очередь ``AUDIT_QUEUE_SIZE``:
+  сколько событий отброшено при ``drop`` и во что обходится ожидание
+  места при ``block``.
+
+    pytest benchmarks/bench_audit.py -s --bench-json results/audit.json
+"""
+import time
+from types import SimpleNamespace
+
+import pytest
+from django.test import RequestFactory
+
+from users import audit
+from users.audit import AuditWriter, audit_log
+from users.models import AuditEvent, PermissionRule, Resource, Role, User
+from users.permissions import CustomRBACPermission
+
+RATE = 5000
+DURATION = 5
+TICK = 0.01
+BURST = 50000
+
+
+@pytest.fixture
+def check(settings, tmp_path):
+    settings.AUDIT_FILE = str(tmp_path / 'audit.jsonl')
+    user = User.objects.create_user(email='audit@bench.local')
+    role = Role.objects.create(name='audit-reader')
+    PermissionRule.objects.create(role=role, resource=Resource.objects.create(name='orders'), can_read=True)
+    user.roles.add(role)
+    permission = CustomRBACPermission()
+    request = RequestFactory().get('/api/v1/resources/orders/', REMOTE_ADDR='10.0.0.1')
+    request.user, request.auth = user, None
+    view = SimpleNamespace(required_resource='orders')
+    assert permission.has_permission(request, view)
+    audit_log.reset()
+    yield lambda: permission.has_permission(request, view)
+    audit_log.flush(timeout=30)
+
+
+@pytest.mark.django_db
+def test_check_overhead(bench, settings, check):
+    off = bench(check, 'audit.check.off')
+    settings.AUDIT_LOG = True
+    settings.AUDIT_BACKEND = 'file'
+    on = bench(check, 'audit.check.on')
+    print(f'\npermission check p50 {off["median"] * 1000:.1f} -> {on["median"] * 1000:.1f} us, '
+          f'p99 {off["p99"] * 1000:.1f} -> {on["p99"] * 1000:.1f} us')
+
+
+def produce(check, rate, duration):
+    """Проверки с постоянной частотой; возвращает время, занятое проверками, и наибольшую длину очереди."""
+    per_tick = int(rate * TICK)
+    busy, depth = 0.0, 0
+    started = time.perf_counter()
+    for tick in range(int(duration / TICK)):
+        begin = time.perf_counter()
+        for _ in range(per_tick):
+            check()
+        busy += time.perf_counter() - begin
+        depth = max(depth, audit_log.snapshot()[1])
+        delay = started + (tick + 1) * TICK - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    return busy, depth
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('backend', ['db', 'file'])
+def test_sustained(settings, check, backend):
+    events = RATE * DURATION
+    base, _ = produce(check, RATE, 1)
+
+    settings.AUDIT_LOG = True
+    settings.AUDIT_BACKEND = backend
+    started = time.perf_counter()
+    busy, depth = produce(check, RATE, DURATION)
+    produced = time.perf_counter()
+    assert audit_log.flush(timeout=60)
+    finished = time.perf_counter()
+
+    counts = dict(audit_log.snapshot()[0])
+    written, dropped = counts.get(('written',), 0), counts.get(('dropped',), 0)
+    assert written + dropped == events and not counts.get(('failed',))
+    if backend == 'db':
+        assert AuditEvent.objects.count() == written
+    print(f'\n{backend}: {events} checks at {RATE}/s, busy {busy / DURATION * 100:.1f}% of the request thread '
+          f'(without audit {base * 100:.1f}%), per check {busy / events * 1e6:.1f} us '
+          f'(without audit {base / RATE * 1e6:.1f} us)')
+    print(f'{backend}: written {written}, dropped {dropped}, max queue {depth}, '
+          f'writer {written / (finished - started):.0f} events/s, drained in {(finished - produced) * 1000:.0f} ms')
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('policy', ['drop', 'block'])
+def test_burst(settings, monkeypatch, check, policy):
+    settings.AUDIT_LOG = True
+    settings.AUDIT_BACKEND = 'db'
+    settings.AUDIT_OVERFLOW = policy
+    settings.AUDIT_QUEUE_SIZE = BURST // 10
+    # Размер очереди читается при ее создании: отдельный писатель для прогона.
+    writer = AuditWriter()
+    monkeypatch.setattr(audit, 'audit_log', writer)
+
+    started = time.perf_counter()
+    for _ in range(BURST):
+        check()
+    elapsed = time.perf_counter() - started
+    assert writer.flush(timeout=60)
+    counts = dict(writer.snapshot()[0])
+    print(f'\n{policy}: burst of {BURST} checks in {elapsed * 1000:.0f} ms '
+          f'({BURST / elapsed:.0f}/s), written {counts.get(("written",), 0)}, dropped {counts.get(("dropped",), 0)}')
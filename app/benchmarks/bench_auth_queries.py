@@ -0,0 +1,70 @@
+"""
+Бенчмарк: число SQL-запросов и время на запрос для стандартной
+JWT-аутентификации и StatelessJWTAuthentication.
+
+Запуск (файл не собирается обычным прогоном тестов):
+
+    pytest benchmarks/bench_auth_queries.py -s
+"""
+import time
+
+import pytest
+from django.db import connection
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from users.api import OrderViewSet, ReportViewSet, UserProfileView
+from users.authentication import StatelessJWTAuthentication
+from users.models import Order, PermissionRule, Resource, Role, User
+from users.tokens import RBACRefreshToken
+
+REQUESTS = 200
+ENDPOINTS = ('/api/v1/resources/orders/', '/api/v1/profile/')
+
+
+@pytest.fixture
+def manager():
+    user = User.objects.create_user(email='bench@example.com', password='password')
+    role = Role.objects.create(name='BenchManager')
+    resource = Resource.objects.create(name='orders')
+    PermissionRule.objects.create(role=role, resource=resource, can_read=True)
+    user.roles.add(role)
+    Order.objects.bulk_create(Order(owner=user, item=f'Item {i}', price=i) for i in range(20))
+    return user
+
+
+def measure(client, path):
+    client.get(path)  # прогрев кэшей
+    queries = []
+
+    def count_queries(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count_queries):
+        response = client.get(path)
+    assert response.status_code == 200, response.content
+    started = time.perf_counter()
+    for _ in range(REQUESTS):
+        client.get(path)
+    elapsed = (time.perf_counter() - started) / REQUESTS
+    return len(queries), elapsed * 1000
+
+
+@pytest.mark.django_db
+def test_queries_per_request(manager, monkeypatch):
+    variants = (
+        ('JWTAuthentication', JWTAuthentication, RefreshToken),
+        ('StatelessJWTAuthentication', StatelessJWTAuthentication, RBACRefreshToken),
+    )
+    print()
+    print(f'{"endpoint":<28} {"authentication":<28} {"queries":>8} {"ms/request":>11}')
+    for name, auth_class, token_class in variants:
+        for view in (OrderViewSet, ReportViewSet, UserProfileView):
+            monkeypatch.setattr(view, 'authentication_classes', (auth_class,))
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token_class.for_user(manager).access_token}')
+        for path in ENDPOINTS:
+            queries, ms = measure(client, path)
+            print(f'{path:<28} {name:<28} {queries:>8} {ms:>11.3f}')
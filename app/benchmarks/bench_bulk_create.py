@@ -0,0 +1,55 @@
+"""
+Бенчмарк: пропускная способность создания заказов по одному
+(POST /orders/) и пакетом (POST /orders/bulk/).
+
+    pytest benchmarks/bench_bulk_create.py -s
+"""
+import json
+import time
+
+import pytest
+from rest_framework.test import APIClient
+
+from users.models import Order, PermissionRule, Resource, Role, User
+from users.tokens import RBACRefreshToken
+
+ITEMS = 2000
+
+
+@pytest.fixture
+def client():
+    user = User.objects.create_user(email='bench@example.com', password='password')
+    role = Role.objects.create(name='BenchWriter')
+    resource = Resource.objects.create(name='orders')
+    PermissionRule.objects.create(role=role, resource=resource, can_create=True, can_read=True)
+    user.roles.add(role)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {RBACRefreshToken.for_user(user).access_token}')
+    return client
+
+
+@pytest.mark.django_db
+def test_bulk_vs_single_throughput(client):
+    items = [{'item': f'Item {i}', 'price': f'{i % 1000}.99'} for i in range(ITEMS)]
+
+    started = time.perf_counter()
+    for item in items:
+        assert client.post('/api/v1/resources/orders/', item, format='json').status_code == 201
+    single = ITEMS / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    response = client.post('/api/v1/resources/orders/bulk/', items, format='json')
+    bulk_json = ITEMS / (time.perf_counter() - started)
+    assert response.status_code == 201
+
+    body = '\n'.join(json.dumps(item) for item in items)
+    started = time.perf_counter()
+    response = client.post('/api/v1/resources/orders/bulk/', body, content_type='application/x-ndjson')
+    bulk_ndjson = ITEMS / (time.perf_counter() - started)
+    assert response.status_code == 201
+    assert Order.objects.count() == ITEMS * 3
+
+    print()
+    print(f'{"mode":<16} {"orders/s":>10} {"speedup":>8}')
+    for name, rate in (('single', single), ('bulk json', bulk_json), ('bulk ndjson', bulk_ndjson)):
+        print(f'{name:<16} {rate:>10.0f} {rate / single:>7.1f}x')
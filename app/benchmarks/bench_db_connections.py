@@ -0,0 +1,132 @@
+"""
+Стоимость установки соединения с БД в задержке запроса: задержка p50/p99
+``GET /api/v1/profile/`` при разных режимах соединений (см. README,
+«Соединения с БД»):
+
+* ``per-request`` — ``DB_CONN_MAX_AGE=0``, новое соединение на каждый запрос;
+* ``persistent`` — ``DB_CONN_MAX_AGE=60`` с проверкой перед переиспользованием;
+* ``pool`` — ``DB_POOL=True``, пул psycopg 3 (нужен ``psycopg[binary,pool]``).
+
+Каждый режим замеряется в отдельном процессе (настройки соединений читаются
+при запуске). Запрос проходит через ``WSGIHandler`` с сигналами начала и
+конца запроса, как под gunicorn, поэтому соединения закрываются и
+открываются так же, как в рабочем воркере. ``connects/req`` — сколько
+соединений в среднем открывается на запрос.
+
+    cd app && python benchmarks/bench_db_connections.py --json results/db_connections.json
+"""
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS_DIR)
+sys.path.insert(1, os.path.dirname(BENCHMARKS_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+from harness import DEFAULT_THRESHOLD, compare, format_comparison, format_results, load, measure, metadata, result, save  # noqa: E402
+
+MODES = {
+    'per-request': {'DB_POOL': 'False', 'DB_CONN_MAX_AGE': '0'},
+    'persistent': {'DB_POOL': 'False', 'DB_CONN_MAX_AGE': '60', 'DB_CONN_HEALTH_CHECKS': 'True'},
+    'pool': {'DB_POOL': 'True'},
+}
+EMAIL = 'bench-db-connections@example.com'
+
+
+def run_child(path, min_time):
+    """Замер в текущем процессе; результат — JSON в stdout."""
+    import django
+
+    django.setup()
+
+    from wsgiref.util import setup_testing_defaults
+
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.db.backends.signals import connection_created
+
+    from users.models import User
+    from users.tokens import RBACRefreshToken
+
+    user, _ = User.objects.get_or_create(email=EMAIL)
+    token = str(RBACRefreshToken.for_user(user).access_token)
+    handler = WSGIHandler()
+    connects = []
+    connection_created.connect(lambda **kwargs: connects.append(1), weak=False)
+
+    def request():
+        environ = {'PATH_INFO': path, 'HTTP_AUTHORIZATION': f'Bearer {token}', 'HTTP_ACCEPT': 'application/json',
+                   'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr}
+        setup_testing_defaults(environ)
+        statuses = []
+        response = handler(environ, lambda status, headers: statuses.append(status))
+        try:
+            b''.join(response)
+        finally:
+            response.close()  # request_finished: закрытие или возврат соединения
+        assert statuses[0].startswith('200'), statuses
+
+    for _ in range(3):
+        request()
+    connects.clear()
+    stats = measure(request, warmup=0, min_time=min_time)
+    stats['connects_per_request'] = len(connects) / stats['rounds']
+    from django.db import connection
+
+    print(json.dumps({'stats': stats, 'database': connection.vendor}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--modes', default=','.join(MODES), help='режимы через запятую')
+    parser.add_argument('--path', default='/api/v1/profile/')
+    parser.add_argument('--min-time', type=float, default=3.0, help='минимальная длительность замера, секунды')
+    parser.add_argument('--json', help='файл для сохранения результатов')
+    parser.add_argument('--compare', help='файл результатов базового прогона')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.path, args.min_time)
+        return 0
+
+    results, database = {}, None
+    for mode in args.modes.split(','):
+        env = {**os.environ, **MODES[mode]}
+        process = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', '--path', args.path, '--min-time', str(args.min_time)],
+            env=env, capture_output=True, text=True,
+        )
+        if process.returncode:
+            # Например, для pool без psycopg 3.
+            error = process.stderr.strip().splitlines()
+            print(f'{mode:<12} failed: {error[-1] if error else process.returncode}')
+            continue
+        output = json.loads(process.stdout.strip().splitlines()[-1])
+        stats, database = output['stats'], output['database']
+        results[f'db.{mode}.p50'] = result(stats['median'], 'ms', 'lower', stats)
+        results[f'db.{mode}.p99'] = result(stats['p99'], 'ms', 'lower', stats)
+        print(f'{mode:<12} p50 {stats["median"]:>8.3f} ms  p99 {stats["p99"]:>8.3f} ms  '
+              f'connects/req {stats["connects_per_request"]:.2f}')
+
+    print('\n'.join(format_results(results)))
+    if args.json:
+        import django
+
+        django.setup()
+        save(args.json, results, metadata(path=args.path, database=database))
+        print(f'results saved to {args.json}')
+    if args.compare:
+        rows = compare(load(args.compare)['results'], results, args.threshold)
+        print('\n'.join(format_comparison(rows)))
+        if any(row[4] == 'regression' for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
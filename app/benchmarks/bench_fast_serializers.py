@@ -0,0 +1,64 @@
+"""
+Бенчмарк: сериализация и рендеринг 10 000 заказов через OrderSerializer +
+JSONRenderer и через RowEncoder + FastJSONRenderer (users/fast_serializers.py).
+
+    pytest benchmarks/bench_fast_serializers.py -s
+"""
+import time
+
+import pytest
+from rest_framework.renderers import JSONRenderer
+
+from users.fast_serializers import RowEncoder
+from users.models import Order, User
+from users.renderers import FastJSONRenderer
+from users.serializers import OrderSerializer
+
+ROWS = 10_000
+REPEAT = 5
+
+
+def timed(func):
+    func()  # прогрев
+    started = time.perf_counter()
+    for _ in range(REPEAT):
+        result = func()
+    return (time.perf_counter() - started) / REPEAT * 1000, result
+
+
+@pytest.mark.django_db
+def test_list_payload():
+    user = User.objects.create_user(email='bench@example.com', password='password')
+    Order.objects.bulk_create(
+        (Order(owner=user, item=f'Товар {i}', price=f'{i % 1000}.5') for i in range(ROWS)), batch_size=5000
+    )
+    queryset = Order.objects.filter(owner=user).order_by('-created_at', '-id')
+    encoder = RowEncoder(OrderSerializer)
+
+    def drf():
+        return JSONRenderer().render(OrderSerializer(queryset.all(), many=True).data)
+
+    def fast():
+        return FastJSONRenderer().render(encoder.encode_many(queryset.values(*encoder.fields)))
+
+    # Только сериализация уже выбранных данных, без запроса к БД.
+    instances = list(queryset.all())
+    rows = list(queryset.values(*encoder.fields))
+
+    def drf_serialize():
+        return OrderSerializer(instances, many=True).data
+
+    def fast_serialize():
+        return encoder.encode_many(rows)
+
+    drf_ms, drf_body = timed(drf)
+    fast_ms, fast_body = timed(fast)
+    assert fast_body == drf_body
+
+    print()
+    print(f'{"path":<34} {"ms":>10}')
+    print(f'{"ModelSerializer + JSONRenderer":<34} {drf_ms:>10.1f}')
+    print(f'{"RowEncoder + FastJSONRenderer":<34} {fast_ms:>10.1f}')
+    print(f'{"  speedup":<34} {drf_ms / fast_ms:>9.1f}x')
+    for name, func in (('serialize only: ModelSerializer', drf_serialize), ('serialize only: RowEncoder', fast_serialize)):
+        print(f'{name:<34} {timed(func)[0]:>10.1f}')
@@ -0,0 +1,89 @@
+"""
+Бенчмарк: пропускная способность логина (логинов в секунду на ядро) для
+разных алгоритмов хеширования и режимов пула (users/hashing.py), а также
+задержка первого входа с устаревшим хешем: ModelBackend пересчитывает хеш
+синхронно, PooledModelBackend — в фоне.
+
+    pytest benchmarks/bench_login.py -s
+"""
+import os
+import threading
+import time
+
+import pytest
+from django.contrib.auth import authenticate
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import make_password
+from django.db import connections
+
+from users.backends import PooledModelBackend
+from users.hashing import hashing_pool
+from users.models import User
+
+CORES = len(os.sched_getaffinity(0))
+CONCURRENCY = CORES * 2
+LOGINS = 8 * CONCURRENCY
+
+
+def throughput():
+    barrier = threading.Barrier(CONCURRENCY + 1)
+    failures = []
+
+    def worker():
+        barrier.wait()
+        try:
+            for _ in range(LOGINS // CONCURRENCY):
+                if authenticate(email='bench@example.com', password='password') is None:
+                    failures.append(1)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker) for _ in range(CONCURRENCY)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    assert not failures
+    return LOGINS / elapsed
+
+
+@pytest.mark.django_db(transaction=True)
+def test_login_throughput(settings):
+    settings.PASSWORD_HASHING_QUEUE_TIMEOUT = 60
+    user = User.objects.create_user(email='bench@example.com', password='password')
+
+    print()
+    print(f'cores: {CORES}, concurrent logins: {CONCURRENCY}')
+    print(f'{"hasher":<8} {"pool":<8} {"logins/s":>10} {"per core":>10}')
+    for hasher in ('argon2', 'pbkdf2'):
+        algorithm = 'argon2' if hasher == 'argon2' else 'pbkdf2_sha256'
+        User.objects.filter(pk=user.pk).update(password=make_password('password', hasher=algorithm))
+        # Предпочтительный хешер — первый в списке, иначе хеш обновлялся бы после входа.
+        settings.PASSWORD_HASHERS = sorted(settings.PASSWORD_HASHERS, key=lambda path: hasher not in path.lower())
+        for pool in ('', 'thread', 'process'):
+            settings.PASSWORD_HASHING_POOL = pool
+            rate = throughput()
+            print(f'{hasher:<8} {pool or "-":<8} {rate:>10.1f} {rate / CORES:>10.1f}')
+    hashing_pool.shutdown()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_legacy_hash_login_latency(settings):
+    settings.PASSWORD_HASHING_POOL = 'thread'
+    user = User.objects.create_user(email='bench@example.com', password='password')
+    legacy = make_password('password', hasher='pbkdf2_sha256')
+
+    print()
+    print(f'{"backend":<20} {"first login with legacy hash, ms":>34}')
+    for backend in (ModelBackend(), PooledModelBackend()):
+        User.objects.filter(pk=user.pk).update(password=legacy)
+        started = time.perf_counter()
+        assert backend.authenticate(None, email='bench@example.com', password='password') is not None
+        elapsed = (time.perf_counter() - started) * 1000
+        hashing_pool.join()
+        assert User.objects.get(pk=user.pk).password.startswith('argon2$')
+        print(f'{type(backend).__name__:<20} {elapsed:>34.1f}')
+    hashing_pool.shutdown()
@@ -0,0 +1,52 @@
+"""
+Бенчмарк: CPU, затраченный на воспроизведение атаки credential stuffing
+(поток логинов с одного IP по списку email, почти все — несуществующие),
+без ограничения частоты и с LoginIPThrottle/LoginEmailThrottle.
+
+    pytest benchmarks/bench_login_throttle.py -s
+"""
+import time
+
+import pytest
+from rest_framework.test import APIClient
+
+from users.api import LoginView
+from users.models import User
+from users.throttles import local_buckets, throttle_counters
+
+ATTEMPTS = 200
+
+
+def replay(attack):
+    client = APIClient()
+    statuses = {}
+    cpu, wall = time.process_time(), time.perf_counter()
+    for credentials in attack:
+        code = client.post('/api/v1/auth/login/', credentials).status_code
+        statuses[code] = statuses.get(code, 0) + 1
+    return time.process_time() - cpu, time.perf_counter() - wall, statuses
+
+
+@pytest.mark.django_db
+def test_attack_replay(settings, monkeypatch):
+    # Рекомендованный OWASP минимум для argon2id, чтобы прогон не был слишком долгим.
+    settings.PASSWORD_ARGON2_MEMORY_COST = 19456
+    settings.PASSWORD_ARGON2_PARALLELISM = 1
+    User.objects.create_user(email='victim@example.com', password='password')
+    attack = [
+        {'email': 'victim@example.com' if i % 10 == 0 else f'leaked{i}@example.com', 'password': f'guess{i}'}
+        for i in range(ATTEMPTS)
+    ]
+
+    print()
+    print(f'{"throttling":<12} {"CPU, s":>8} {"wall, s":>8}  statuses')
+    with monkeypatch.context() as patch:
+        patch.setattr(LoginView, 'throttle_classes', ())
+        cpu, wall, statuses = replay(attack)
+    print(f'{"off":<12} {cpu:>8.2f} {wall:>8.2f}  {statuses}')
+
+    local_buckets.reset()
+    throttle_counters.reset()
+    cpu, wall, statuses = replay(attack)
+    print(f'{"on":<12} {cpu:>8.2f} {wall:>8.2f}  {statuses}')
+    print(f'counters: {throttle_counters.snapshot()}')
@@ -0,0 +1,43 @@
+"""
+Бенчмарк: накладные расходы метрик запросов (users/metrics.py) на списке
+заказов при METRICS_SAMPLE_RATE = 0 (middleware отключен), 0.01 и 1.
+
+    pytest benchmarks/bench_metrics.py -s
+"""
+import time
+
+import pytest
+from rest_framework.test import APIClient
+
+from users.models import Order, PermissionRule, Resource, Role, User
+from users.tokens import RBACRefreshToken
+
+REQUESTS = 2000
+
+
+@pytest.mark.django_db
+def test_metrics_overhead(settings):
+    user = User.objects.create_user(email='bench@example.com', password='password')
+    role = Role.objects.create(name='Reader')
+    PermissionRule.objects.create(role=role, resource=Resource.objects.create(name='orders'), can_read=True)
+    user.roles.add(role)
+    Order.objects.bulk_create(Order(owner=user, item=f'Товар {i}', price=i) for i in range(10))
+    token = str(RBACRefreshToken.for_user(user).access_token)
+
+    def run(sample_rate):
+        settings.METRICS_SAMPLE_RATE = sample_rate
+        client = APIClient()  # middleware загружается заново с текущими настройками
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        for _ in range(50):  # прогрев
+            client.get('/api/v1/resources/orders/')
+        started = time.perf_counter()
+        for _ in range(REQUESTS):
+            client.get('/api/v1/resources/orders/')
+        return (time.perf_counter() - started) / REQUESTS * 1_000_000
+
+    results = [(rate, run(rate)) for rate in (0, 0.01, 1, 0)]
+    baseline = min(us for rate, us in results if rate == 0)
+    print()
+    print(f'{"sample rate":<12} {"us/request":>12} {"overhead":>10}')
+    for rate, us in results:
+        print(f'{rate:<12} {us:>12.1f} {(us / baseline - 1) * 100:>9.1f}%')
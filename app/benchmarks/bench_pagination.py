@@ -0,0 +1,72 @@
+"""
+Бенчмарк: латентность первой и 10 000-й страницы заказов для
+PageNumberPagination (OFFSET + COUNT) и KeysetPagination.
+
+    pytest benchmarks/bench_pagination.py -s
+"""
+import time
+
+import pytest
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from users import services
+from users.models import Order, User
+from users.pagination import KeysetPagination
+
+ROWS = 100_000
+PAGE_SIZE = 10
+DEEP_PAGE = 10_000
+REPEAT = 20
+
+factory = APIRequestFactory()
+
+
+def timed(func):
+    func()  # прогрев
+    started = time.perf_counter()
+    for _ in range(REPEAT):
+        func()
+    return (time.perf_counter() - started) / REPEAT * 1000
+
+
+def page_number(user, page):
+    request = Request(factory.get('/api/v1/resources/orders/', {'page': page}))
+    paginator = PageNumberPagination()
+    paginator.page_size = PAGE_SIZE
+    return lambda: paginator.get_paginated_response(
+        [o.id for o in paginator.paginate_queryset(services.get_user_orders(user), request)]
+    )
+
+
+def keyset(user, page):
+    params = {}
+    if page > 1:
+        anchor = services.get_user_orders(user)[(page - 1) * PAGE_SIZE - 1]
+        params['cursor'] = KeysetPagination().cursor_for(anchor)
+    request = Request(factory.get('/api/v1/resources/orders/', params))
+    paginator = KeysetPagination()
+    paginator.page_size = PAGE_SIZE
+
+    def run():
+        return paginator.get_paginated_response(
+            [o.id for o in paginator.paginate_queryset(services.get_user_orders(user), request)]
+        )
+    return run
+
+
+@pytest.mark.django_db
+def test_deep_page_latency():
+    user = User.objects.create_user(email='bench@example.com', password='password')
+    User.objects.create_user(email='noise@example.com', password='password')
+    Order.objects.bulk_create(
+        (Order(owner=user, item=f'Item {i}', price=i % 1000) for i in range(ROWS)), batch_size=5000
+    )
+
+    print()
+    print(f'{"pagination":<22} {"page 1, ms":>12} {"page 10000, ms":>16}')
+    for name, make in (('PageNumberPagination', page_number), ('KeysetPagination', keyset)):
+        first = timed(make(user, 1))
+        deep = timed(make(user, DEEP_PAGE))
+        print(f'{name:<22} {first:>12.3f} {deep:>16.3f}')
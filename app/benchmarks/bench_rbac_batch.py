@@ -0,0 +1,103 @@
+"""
+Массовые операции RBAC (users/rbac_batch.py):
+
+* ``rbac_batch.assign`` / ``.revoke`` — назначение и снятие роли у
+  ``USERS`` × scale пользователей пакетом;
+* ``rbac_batch.assign.per_user`` — то же через ``user.roles.add`` на
+  каждого пользователя (как при вызовах API по одному), на ``SAMPLE``
+  пользователях с пересчетом на ``USERS``;
+* ``rbac_batch.import`` / ``.import.noop`` — применение документа из
+  ``ROLES`` ролей × ``RESOURCES`` ресурсов: с изменением каждого правила и
+  повторное (без изменений).
+
+Каждый пакет назначений ставит отметки изменения ролей пользователей одним
+вызовом, не трогая матрицу; импорт сбрасывает матрицу RBAC один раз
+(проверяется по числу увеличений поколения), повторный импорт — ни разу.
+
+    pytest benchmarks/bench_rbac_batch.py -s --bench-json results/rbac_batch.json
+"""
+import itertools
+import time
+
+import pytest
+
+from users import rbac, rbac_batch
+from users.models import Role, User
+
+pytestmark = pytest.mark.django_db
+
+USERS = 10000
+SAMPLE = 500
+ROLES = 200
+RESOURCES = 10
+
+
+@pytest.fixture
+def invalidations(monkeypatch):
+    calls = []
+    bump = rbac._bump_generation
+    monkeypatch.setattr(rbac, '_bump_generation', lambda: calls.append(1) or bump())
+    return calls
+
+
+@pytest.fixture
+def stamps(monkeypatch):
+    calls = []
+    stamp = rbac._stamp_users
+    monkeypatch.setattr(rbac, '_stamp_users', lambda user_ids: calls.append(len(user_ids)) or stamp(user_ids))
+    return calls
+
+
+def test_assign(bench, bench_scale, invalidations, stamps):
+    User.objects.bulk_create(User(email=f'assign{i}@bench.local') for i in range(USERS * bench_scale))
+    ids = list(User.objects.filter(email__startswith='assign').values_list('pk', flat=True))
+    role = Role.objects.create(name='bench-assign')
+
+    def cycle():
+        assert rbac_batch.assign_roles(ids, [role.pk]) == len(ids)
+        assert rbac_batch.revoke_roles(ids, [role.pk]) == len(ids)
+
+    stats = bench(cycle, 'rbac_batch.assign_revoke', rounds=3, warmup=1)
+    # Внутри транзакции теста: отметка сразу, вторая — после фиксации (не выполняется).
+    assert stamps == [len(ids)] * (2 * stats['rounds'] + 2)
+    assert not invalidations
+
+    started = time.perf_counter()
+    for user in User.objects.filter(pk__in=ids[:SAMPLE]):
+        user.roles.add(role)
+    per_user = (time.perf_counter() - started) * 1000 * len(ids) / SAMPLE
+    print(f'\nassign+revoke {len(ids)} users in batch: {stats["median"]:.1f} ms, '
+          f'per-user add (extrapolated, assign only): {per_user:.1f} ms')
+
+
+def test_import(bench, invalidations):
+    resources = [f'resource-{i}' for i in range(RESOURCES)]
+    documents = [
+        {
+            'version': 1,
+            'resources': resources,
+            'roles': {
+                f'role-{i}': {
+                    'parents': [f'role-{i - 1}'] if i else [],
+                    'rules': {name: {'actions': actions, 'scope': 'own'} for name in resources},
+                }
+                for i in range(ROLES)
+            },
+        }
+        for actions in (['read'], ['read', 'update'])
+    ]
+    rbac_batch.import_document(documents[0])
+    alternating = itertools.cycle(documents[::-1])
+
+    def apply():
+        changes = rbac_batch.import_document(next(alternating))
+        assert changes['rules_updated'] == ROLES * RESOURCES
+
+    invalidations.clear()
+    stats = bench(apply, 'rbac_batch.import', rounds=5, warmup=1)
+    assert len(invalidations) == stats['rounds'] + 1
+
+    rbac_batch.import_document(documents[1])
+    invalidations.clear()
+    bench(lambda: rbac_batch.import_document(documents[1]), 'rbac_batch.import.noop', rounds=5, warmup=1)
+    assert not invalidations
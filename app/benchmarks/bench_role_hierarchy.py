@@ -0,0 +1,99 @@
+"""
+Наследование ролей (users/hierarchy.py): выбор ролей пользователя вместе с
+унаследованными по замыканию ``RoleClosure`` в сравнении с рекурсивным CTE
+по ребрам ``Role.parents`` и стоимость изменения ребер.
+
+Иерархии:
+
+* ``deep`` — цепочка из ``DEPTH`` × scale ролей, пользователю назначена последняя;
+* ``wide`` — роль с ``WIDTH`` × scale родителями, каждый из которых наследует
+  общую корневую роль.
+
+``hierarchy.<shape>.closure`` — запрос через ORM (как в ``rbac``),
+``.closure.sql`` — тот же SQL без построения QuerySet, для сравнения с
+``.cte`` на уровне БД. ``hierarchy.<shape>.edge`` — добавление и удаление
+ребра между новой ролью и корнем иерархии вместе с пересчетом замыкания.
+
+    pytest benchmarks/bench_role_hierarchy.py -s --bench-json results/role_hierarchy.json
+"""
+import pytest
+from django.db import connection
+
+from users import hierarchy
+from users.models import Role, User
+
+pytestmark = pytest.mark.django_db
+
+DEPTH = 20
+WIDTH = 1000
+
+CTE = '''
+    WITH RECURSIVE effective(role_id) AS (
+        SELECT role_id FROM {user_roles} WHERE user_id = %s
+        UNION
+        SELECT edge.to_role_id FROM {parents} edge JOIN effective ON edge.from_role_id = effective.role_id
+    )
+    SELECT role_id FROM effective
+'''
+
+
+def closure_lookup(user_id):
+    return set(hierarchy.effective_role_ids(user_id))
+
+
+def cte_lookup(user_id):
+    sql = CTE.format(
+        user_roles=connection.ops.quote_name(User.roles.through._meta.db_table),
+        parents=connection.ops.quote_name(Role.parents.through._meta.db_table),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [user_id])
+        return {row[0] for row in cursor.fetchall()}
+
+
+def deep(size):
+    roles = Role.objects.bulk_create(Role(name=f'deep-{i}') for i in range(size))
+    for parent, child in zip(roles, roles[1:]):
+        child.parents.add(parent)
+    return roles[0], roles[-1], size
+
+
+def wide(size):
+    root = Role.objects.create(name='wide-root')
+    parents = Role.objects.bulk_create(Role(name=f'wide-{i}') for i in range(size))
+    root.children.add(*parents)
+    role = Role.objects.create(name='wide-leaf')
+    role.parents.add(*parents)
+    return root, role, size + 2
+
+
+@pytest.mark.parametrize('shape', [deep, wide], ids=['deep', 'wide'])
+def test_role_hierarchy(bench, bench_scale, shape):
+    size = (DEPTH if shape is deep else WIDTH) * bench_scale
+    root, leaf, expected = shape(size)
+    user = User.objects.create_user(email=f'{shape.__name__}@bench.local')
+    user.roles.add(leaf)
+    assert len(closure_lookup(user.pk)) == len(cte_lookup(user.pk)) == expected
+    assert hierarchy.rebuild(dry_run=True) == 0
+
+    name = f'hierarchy.{shape.__name__}'
+    bench(lambda: closure_lookup(user.pk), f'{name}.closure')
+    sql, params = hierarchy.effective_role_ids(user.pk).query.sql_with_params()
+
+    def closure_sql():
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    bench(closure_sql, f'{name}.closure.sql')
+    bench(lambda: cte_lookup(user.pk), f'{name}.cte')
+
+    # Новая роль становится родителем корня: меняются пары со всеми ролями иерархии.
+    extra = Role.objects.create(name=f'{shape.__name__}-extra')
+
+    def edge():
+        root.parents.add(extra)
+        root.parents.remove(extra)
+
+    bench(edge, f'{name}.edge', min_time=0.5)
+    assert hierarchy.rebuild(dry_run=True) == 0
@@ -0,0 +1,112 @@
+"""
+Бенчмарк полнотекстового поиска (users/search.py) на текущей БД: по
+умолчанию 1M пользователей × 5 отчетов = 5M отчетов (``datagen.generate``,
+набор переиспользуется, если уже создан).
+
+Замеры:
+
+* ``search.api.*`` — ``GET /api/v1/resources/reports/?q=`` от имени ``user0``
+  (поиск среди записей пользователя, ранжирование, первая страница);
+* ``search.global.*`` — поиск по всем отчетам, как в админке (первые 20 по
+  рангу); ``search.global.rare.icontains`` — прежний поиск админки
+  (``icontains`` по ``title``/``content``, без ранжирования) для сравнения.
+
+``common`` — слово почти из каждого отчета, ``rare`` — слово ``код<N>`` из
+нескольких отчетов на миллион.
+
+    cd app && python benchmarks/bench_search.py --users 1000000 --json results/search.json
+"""
+import argparse
+import os
+import sys
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS_DIR)
+sys.path.insert(1, os.path.dirname(BENCHMARKS_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db.models import Q  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from django.utils.module_loading import import_string  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+from rest_framework_simplejwt.settings import api_settings as jwt_settings  # noqa: E402
+
+from datagen import email, generate  # noqa: E402
+from harness import DEFAULT_THRESHOLD, compare, format_comparison, format_results, load, measure, metadata, result, save  # noqa: E402
+from users.models import Report, User  # noqa: E402
+from users.search import RANK_FIELD, search  # noqa: E402
+
+COMMON = 'выручка'
+PHRASE = 'выручка маржа'
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=1_000_000)
+    parser.add_argument('--reports-per-user', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--min-time', type=float, default=1.0, help='минимальная длительность замера, секунды')
+    parser.add_argument('--json', help='файл для сохранения результатов')
+    parser.add_argument('--compare', help='файл результатов базового прогона')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    counts = generate(users=args.users, orders_per_user=0, reports_per_user=args.reports_per_user,
+                      workers=args.workers, verbose=True)
+    print(f'dataset: {counts}')
+
+    setup_test_environment()  # testserver в ALLOWED_HOSTS для APIClient
+    user = User.objects.get(email=email(0))
+    rare = next(word for word in Report.objects.filter(author=user).values_list('content', flat=True)[0].split()
+                if word.startswith('код'))
+    token_class = import_string(jwt_settings.TOKEN_OBTAIN_SERIALIZER).token_class
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {token_class.for_user(user).access_token}')
+
+    def api(query):
+        def run():
+            response = client.get('/api/v1/resources/reports/', {'q': query})
+            assert response.status_code == 200, response.content
+        return run
+
+    def global_search(query):
+        queryset = search(Report.objects.all(), query, scoped=False).order_by(f'-{RANK_FIELD}', '-pk')
+        return lambda: list(queryset.values('id', RANK_FIELD)[:20])
+
+    def global_icontains(query):
+        queryset = Report.objects.filter(Q(title__icontains=query) | Q(content__icontains=query)).order_by('-pk')
+        return lambda: list(queryset.values('id')[:20])
+
+    cases = {
+        'search.api.common': (api(COMMON), {}),
+        'search.api.phrase': (api(PHRASE), {}),
+        'search.api.rare': (api(rare), {}),
+        'search.global.rare': (global_search(rare), {}),
+        'search.global.rare.icontains': (global_icontains(rare), {'warmup': 1, 'rounds': 3}),
+        'search.global.common': (global_search(COMMON), {'warmup': 1, 'rounds': 3}),
+    }
+    results = {}
+    for name, (func, options) in cases.items():
+        options.setdefault('min_time', args.min_time)
+        stats = measure(func, **options)
+        results[name] = result(stats['median'], 'ms', 'lower', stats)
+        print(f'{name:<32} {stats["median"]:>10.2f} ms')
+
+    print('\n'.join(format_results(results)))
+    if args.json:
+        save(args.json, results, metadata(users=args.users, reports=counts['reports']))
+        print(f'results saved to {args.json}')
+    if args.compare:
+        rows = compare(load(args.compare)['results'], results, args.threshold)
+        print('\n'.join(format_comparison(rows)))
+        if any(row[4] == 'regression' for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+Микробенчмарки основных сценариев сервиса в процессе (APIClient, без сети):
+логин, refresh, logout (черный список), проверка прав (одна и пакет из 100
+через API), список заказов (первая и глубокая страница), создание заказа,
+профиль, статистика заказов по агрегатам в сравнении с агрегацией по самим
+заказам.
+
+Данные создаются ``datagen.generate`` (объем умножается на ``--bench-scale``).
+Лимиты частоты логина подняты, чтобы измерялась обработка, а не 429.
+
+    pytest benchmarks/bench_suite.py -s --bench-json results/$(git rev-parse --short HEAD).json
+    pytest benchmarks/bench_suite.py -s --bench-compare results/base.json --bench-threshold 0.15
+"""
+from types import SimpleNamespace
+
+import pytest
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+from django.utils.module_loading import import_string
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from datagen import PASSWORD, email, generate
+from users.models import Order, User
+from users.permissions import CustomRBACPermission
+from users.services import bulk_create_orders
+from users.throttles import TokenBucketThrottle
+
+pytestmark = pytest.mark.django_db
+
+TOKEN_ROUNDS = 200
+
+
+@pytest.fixture(autouse=True)
+def unthrottled(monkeypatch):
+    monkeypatch.setattr(TokenBucketThrottle, 'THROTTLE_RATES', {
+        'login_ip': '1000000/s', 'login_email': '1000000/s', 'register_ip': '1000000/s',
+    })
+
+
+@pytest.fixture
+def dataset(bench_scale):
+    """Пользователь ``user0@bench.local`` со всеми правами и 1000 × scale заказами на фоне остальных данных."""
+    generate(users=200 * bench_scale, orders_per_user=20, reports_per_user=2)
+    user = User.objects.get(email=email(0))
+    bulk_create_orders(
+        user, [{'item': f'Товар {i}', 'price': f'{i % 1000}.50'} for i in range(1000 * bench_scale)], batch_size=5000,
+    )
+    return user
+
+
+def refresh_token_for(user):
+    token_class = import_string(jwt_settings.TOKEN_OBTAIN_SERIALIZER).token_class
+    return token_class.for_user(user)
+
+
+@pytest.fixture
+def api(dataset):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh_token_for(dataset).access_token}')
+    return client
+
+
+def expect(response, status_code):
+    assert response.status_code == status_code, response.content
+    return response
+
+
+def test_login(bench, dataset):
+    client = APIClient()
+    payload = {'email': dataset.email, 'password': PASSWORD}
+    bench(lambda: expect(client.post('/api/v1/auth/login/', payload, format='json'), 200), rounds=10, warmup=1)
+
+
+def test_token_refresh(bench, dataset):
+    client = APIClient()
+    tokens = [str(refresh_token_for(dataset)) for _ in range(TOKEN_ROUNDS + 3)]
+    bench(
+        lambda: expect(client.post('/api/v1/auth/token/refresh/', {'refresh': tokens.pop()}, format='json'), 200),
+        rounds=TOKEN_ROUNDS,
+    )
+
+
+def test_logout_blacklist(bench, api, dataset):
+    tokens = [str(refresh_token_for(dataset)) for _ in range(TOKEN_ROUNDS + 3)]
+    bench(
+        lambda: expect(api.post('/api/v1/auth/logout/', {'refresh': tokens.pop()}, format='json'), 205),
+        rounds=TOKEN_ROUNDS,
+    )
+
+
+def test_permission_check(bench, dataset):
+    permission = CustomRBACPermission()
+    request = SimpleNamespace(user=dataset, method='GET', auth=None)
+    view = SimpleNamespace(required_resource='orders')
+    assert permission.has_permission(request, view)
+    bench(lambda: permission.has_permission(request, view))
+
+
+def test_permission_check_batch(bench, api):
+    """100 проверок (ресурс, действие) одним запросом POST /api/v1/authz/check/."""
+    checks = [[resource, action] for resource in ('orders', 'reports') for action in ('create', 'read', 'update', 'delete')]
+    payload = {'checks': (checks * 13)[:100]}
+    stats = bench(lambda: expect(api.post('/api/v1/authz/check/', payload, format='json'), 200))
+    assert stats['p99'] < 5, stats
+
+
+def test_order_list_first_page(bench, api):
+    bench(lambda: expect(api.get('/api/v1/resources/orders/'), 200))
+
+
+def test_order_list_deep_page(bench, api):
+    url = '/api/v1/resources/orders/'
+    for _ in range(20):
+        url = expect(api.get(url), 200).data['next']
+    bench(lambda: expect(api.get(url), 200))
+
+
+def test_order_create(bench, api):
+    payload = {'item': 'Новый товар', 'price': '99.90'}
+    bench(lambda: expect(api.post('/api/v1/resources/orders/', payload, format='json'), 201))
+
+
+def test_profile(bench, api):
+    bench(lambda: expect(api.get('/api/v1/profile/'), 200))
+
+
+def test_order_stats(bench, api):
+    bench(lambda: expect(api.get('/api/v1/resources/orders/stats/'), 200))
+
+
+def test_order_stats_scan(bench, dataset):
+    """То же, что stats, агрегацией по заказам (стоимость растет с числом заказов)."""
+    orders = Order.objects.filter(owner=dataset).order_by()
+    bench(lambda: list(
+        orders.values(month=TruncMonth('created_at')).annotate(count=Count('id'), total=Sum('price')).order_by('month')
+    ))
@@ -0,0 +1,38 @@
+"""
+Сравнение двух файлов результатов бенчмарков (см. benchmarks/harness.py).
+Код возврата 1, если хотя бы одна метрика ухудшилась больше порога.
+
+    python benchmarks/compare.py baseline.json current.json --threshold 0.1
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import DEFAULT_THRESHOLD, compare, format_comparison, load  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='допустимое относительное ухудшение (0.1 = 10%%)')
+    args = parser.parse_args()
+
+    baseline, current = load(args.baseline), load(args.current)
+    for label, data in (('baseline', baseline), ('current', current)):
+        meta = data.get('meta', {})
+        print(f'{label}: {meta.get("timestamp")} commit={meta.get("commit")} db={meta.get("database")}')
+    rows = compare(baseline['results'], current['results'], args.threshold)
+    print('\n'.join(format_comparison(rows)))
+    regressions = [row[0] for row in rows if row[4] == 'regression']
+    if regressions:
+        print(f'\nрегрессии (> {args.threshold:.0%}): {", ".join(regressions)}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+Фикстуры набора бенчмарков.
+
+``bench(func, name=None, **measure_kwargs)`` замеряет функцию
+(``harness.measure``) и записывает результат. В конце сессии результаты
+выводятся таблицей, сохраняются в ``--bench-json`` и сравниваются с
+``--bench-compare``: ухудшение больше ``--bench-threshold`` делает прогон
+неуспешным.
+
+    pytest benchmarks/bench_suite.py -s --bench-json results/new.json --bench-compare results/base.json
+"""
+import pytest
+
+from harness import DEFAULT_THRESHOLD, compare, format_comparison, format_results, measure, metadata, result, save, load
+
+results_key = pytest.StashKey[dict]()
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('bench', 'бенчмарки (benchmarks/)')
+    group.addoption('--bench-json', default=None, help='файл для сохранения результатов')
+    group.addoption('--bench-compare', default=None, help='файл результатов базового прогона')
+    group.addoption('--bench-threshold', type=float, default=DEFAULT_THRESHOLD,
+                    help='допустимое относительное ухудшение (0.1 = 10%%)')
+    group.addoption('--bench-scale', type=int, default=1, help='множитель объема данных бенчмарков')
+
+
+def pytest_configure(config):
+    config.stash[results_key] = {}
+
+
+@pytest.fixture
+def bench(request):
+    results = request.config.stash[results_key]
+
+    def run(func, name=None, **kwargs):
+        stats = measure(func, **kwargs)
+        results[name or request.node.name] = result(stats['median'], 'ms', 'lower', stats)
+        return stats
+
+    return run
+
+
+@pytest.fixture(autouse=True)
+def audit_off(settings):
+    """Журнал аудита выключен: его накладные расходы измеряет bench_audit.py."""
+    settings.AUDIT_LOG = False
+
+
+@pytest.fixture
+def bench_scale(request):
+    return request.config.getoption('--bench-scale')
+
+
+def pytest_sessionfinish(session, exitstatus):
+    config = session.config
+    results = config.stash.get(results_key, None)
+    if not results:
+        return
+    reporter = config.pluginmanager.get_plugin('terminalreporter')
+    write = reporter.write_line if reporter else print
+    write('')
+    for line in format_results(results):
+        write(line)
+
+    path = config.getoption('--bench-json')
+    if path:
+        save(path, results, metadata(scale=config.getoption('--bench-scale')))
+        write(f'results saved to {path}')
+
+    baseline_path = config.getoption('--bench-compare')
+    if baseline_path:
+        rows = compare(load(baseline_path)['results'], results, config.getoption('--bench-threshold'))
+        write('')
+        for line in format_comparison(rows):
+            write(line)
+        if any(row[4] == 'regression' for row in rows):
+            write('performance regression detected')
+            session.exitstatus = 1
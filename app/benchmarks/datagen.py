@@ -0,0 +1,67 @@
+"""
+Набор данных для бенчмарков и нагрузочного теста: обертка над командой
+``generate_data`` (пакетная загрузка, COPY на PostgreSQL, детерминированные
+значения). Пользователи ``user{N}@bench.local`` с паролем ``password``;
+``user0`` имеет все права. Если набор уже создан, он переиспользуется.
+
+    python benchmarks/datagen.py --users 1000000 --orders-per-user 10 --workers 8
+"""
+import argparse
+import io
+import os
+import sys
+
+EMAIL_DOMAIN = 'bench.local'
+PASSWORD = 'password'
+
+
+def email(index):
+    return f'user{index}@{EMAIL_DOMAIN}'
+
+
+def generate(users=1000, roles=10, orders_per_user=10, reports_per_user=2, seed=42,
+             batch_size=10000, workers=1, verbose=False):
+    """Создает набор данных (если его нет) и возвращает число записей по моделям."""
+    from django.core.management import call_command
+
+    from users.models import Order, Report, User
+
+    if not User.objects.filter(email=email(0)).exists():
+        call_command(
+            'generate_data', users=users, roles=roles, orders_per_user=orders_per_user,
+            reports_per_user=reports_per_user, seed=seed, batch_size=batch_size, workers=workers,
+            password=PASSWORD, email_domain=EMAIL_DOMAIN, stdout=None if verbose else io.StringIO(),
+        )
+    domain = f'@{EMAIL_DOMAIN}'
+    return {
+        'users': User.objects.filter(email__endswith=domain).count(),
+        'orders': Order.objects.filter(owner__email__endswith=domain).count(),
+        'reports': Report.objects.filter(author__email__endswith=domain).count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--roles', type=int, default=10)
+    parser.add_argument('--orders-per-user', type=int, default=10)
+    parser.add_argument('--reports-per-user', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=1)
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+    import django
+    django.setup()
+
+    print(generate(
+        users=args.users, roles=args.roles, orders_per_user=args.orders_per_user,
+        reports_per_user=args.reports_per_user, seed=args.seed, batch_size=args.batch_size,
+        workers=args.workers, verbose=True,
+    ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""
+Общая часть набора бенчмарков: замеры, сохранение результатов в JSON и
+сравнение прогонов.
+
+Формат файла результатов::
+
+    {
+        "meta": {"timestamp": ..., "commit": ..., "python": ..., "database": ..., ...},
+        "results": {
+            "<имя>": {"value": 1.23, "unit": "ms", "better": "lower", "stats": {...}},
+            ...
+        }
+    }
+
+``value`` — основная метрика, по которой сравниваются прогоны: медиана для
+микробенчмарков (``better: lower``), запросы в секунду или перцентиль
+задержки для нагрузочного теста.
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+
+DEFAULT_THRESHOLD = 0.10
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return float('nan')
+    return sorted_values[min(int(len(sorted_values) * p), len(sorted_values) - 1)]
+
+
+def summarize(samples):
+    """Статистика по длительностям в секундах; значения — в миллисекундах."""
+    values = sorted(sample * 1000 for sample in samples)
+    mean = statistics.fmean(values)
+    return {
+        'rounds': len(values),
+        'min': values[0],
+        'median': statistics.median(values),
+        'mean': mean,
+        'p95': percentile(values, 0.95),
+        'p99': percentile(values, 0.99),
+        'stddev': statistics.stdev(values) if len(values) > 1 else 0.0,
+        'ops': 1000 / mean if mean else float('inf'),
+    }
+
+
+def measure(func, rounds=None, warmup=3, min_time=1.0, max_rounds=100000):
+    """
+    Выполняет ``func`` ``rounds`` раз (или пока не пройдет ``min_time`` секунд,
+    но не меньше 5 раз) после ``warmup`` прогревочных вызовов.
+    """
+    for _ in range(warmup):
+        func()
+    samples = []
+    started = time.perf_counter()
+    while True:
+        call_started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - call_started)
+        if rounds is not None:
+            if len(samples) >= rounds:
+                break
+        elif len(samples) >= max_rounds or (len(samples) >= 5 and time.perf_counter() - started >= min_time):
+            break
+    return summarize(samples)
+
+
+def result(value, unit, better='lower', stats=None):
+    return {'value': value, 'unit': unit, 'better': better, 'stats': stats or {}}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def metadata(**extra):
+    import django
+    from django.db import connection
+
+    meta = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'platform': platform.platform(),
+        'cpus': len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count(),
+    }
+    meta.update(extra)
+    return meta
+
+
+def save(path, results, meta):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as fp:
+        json.dump({'meta': meta, 'results': results}, fp, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+def load(path):
+    with open(path, encoding='utf-8') as fp:
+        return json.load(fp)
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Сравнивает результаты двух прогонов. Возвращает строки
+    ``(имя, было, стало, ухудшение, статус)``, где ухудшение — относительное
+    (0.15 = на 15% хуже), статус — ``ok``, ``regression``, ``improvement``,
+    ``new`` или ``missing``.
+    """
+    rows = []
+    for name in sorted(set(baseline) | set(current)):
+        before, after = baseline.get(name), current.get(name)
+        if before is None or after is None:
+            rows.append((name, before and before['value'], after and after['value'], None,
+                         'new' if before is None else 'missing'))
+            continue
+        old, new = before['value'], after['value']
+        if not old or not new:
+            slowdown = 0.0
+        elif after.get('better', 'lower') == 'lower':
+            slowdown = new / old - 1
+        else:
+            slowdown = old / new - 1
+        if slowdown > threshold:
+            status = 'regression'
+        elif slowdown < -threshold:
+            status = 'improvement'
+        else:
+            status = 'ok'
+        rows.append((name, old, new, slowdown, status))
+    return rows
+
+
+def format_results(results):
+    lines = [f'{"benchmark":<44} {"value":>12} {"unit":<6} {"p95":>10} {"rounds":>8}']
+    for name, item in sorted(results.items()):
+        stats = item.get('stats', {})
+        p95 = stats.get('p95')
+        lines.append(
+            f'{name:<44} {item["value"]:>12.3f} {item["unit"]:<6} '
+            f'{"" if p95 is None else f"{p95:.3f}":>10} {stats.get("rounds", ""):>8}'
+        )
+    return lines
+
+
+def format_comparison(rows):
+    lines = [f'{"benchmark":<44} {"baseline":>12} {"current":>12} {"change":>8}  status']
+    for name, old, new, slowdown, status in rows:
+        old_text = '-' if old is None else f'{old:.3f}'
+        new_text = '-' if new is None else f'{new:.3f}'
+        change = '' if slowdown is None else f'{slowdown * 100:+.1f}%'
+        lines.append(f'{name:<44} {old_text:>12} {new_text:>12} {change:>8}  {status}')
+    return lines
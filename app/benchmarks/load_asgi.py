@@ -0,0 +1,137 @@
+"""
+Нагрузочный бенчмарк: gunicorn (sync-воркеры, WSGI, /api/v1/...) против
+uvicorn (ASGI, /api/v1/async/...) при 1000 одновременных соединений.
+
+Скрипт создает в текущей БД пользователя с правом чтения заказов и
+тестовые заказы, по очереди запускает оба сервера и нагружает список
+заказов. Каждое соединение отправляет запрос, читает ответ до конца и
+открывает новое (gunicorn sync не поддерживает keep-alive).
+
+    cd app && python benchmarks/load_asgi.py --connections 1000 --duration 20 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from users.models import Order, PermissionRule, Resource, Role, User  # noqa: E402
+from users.tokens import RBACRefreshToken  # noqa: E402
+
+EMAIL = 'load-asgi@example.com'
+
+
+def prepare():
+    user, _ = User.objects.get_or_create(email=EMAIL, defaults={'first_name': 'Load', 'last_name': 'Test'})
+    role, _ = Role.objects.get_or_create(name='LoadReader')
+    resource, _ = Resource.objects.get_or_create(name='orders')
+    PermissionRule.objects.update_or_create(role=role, resource=resource, defaults={'can_read': True})
+    user.roles.add(role)
+    if not Order.objects.filter(owner=user).exists():
+        Order.objects.bulk_create(Order(owner=user, item=f'Item {i}', price=i) for i in range(50))
+    return str(RBACRefreshToken.for_user(user).access_token)
+
+
+def wait_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(('127.0.0.1', port)) == 0:
+                return
+        time.sleep(0.2)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+async def load(port, path, token, connections, duration, timeout):
+    request = (
+        f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n'
+        f'Authorization: Bearer {token}\r\nConnection: close\r\n\r\n'
+    ).encode()
+    latencies, errors = [], {}
+    deadline = time.monotonic() + duration
+
+    async def client():
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            try:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+                writer.write(request)
+                response = await asyncio.wait_for(reader.read(), timeout)
+                writer.close()
+                code = response[9:12].decode() if response else 'empty'
+            except (OSError, asyncio.TimeoutError) as exc:
+                code = type(exc).__name__
+            if code == '200':
+                latencies.append(time.monotonic() - started)
+            else:
+                errors[code] = errors.get(code, 0) + 1
+
+    started = time.monotonic()
+    await asyncio.gather(*(client() for _ in range(connections)))
+    elapsed = time.monotonic() - started
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000 if latencies else float('nan')
+
+    return len(latencies) / elapsed, percentile(0.5), percentile(0.99), errors
+
+
+def run_server(command, port):
+    process = subprocess.Popen(command, env=os.environ.copy(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_port(port)
+        return process
+    except Exception:
+        process.kill()
+        raise
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--connections', type=int, default=1000)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    token = prepare()
+    servers = [
+        ('gunicorn sync', '/api/v1/resources/orders/', [
+            sys.executable, '-m', 'gunicorn', 'core.wsgi:application', '--workers', str(args.workers),
+            '--bind', f'127.0.0.1:{args.port}', '--backlog', '2048',
+        ]),
+        ('uvicorn (ASGI)', '/api/v1/async/resources/orders/', [
+            sys.executable, '-m', 'uvicorn', 'core.asgi:application', '--workers', str(args.workers),
+            '--port', str(args.port), '--backlog', '2048', '--no-access-log',
+        ]),
+    ]
+
+    print(f'connections: {args.connections}, duration: {args.duration}s, workers: {args.workers}')
+    print(f'{"server":<16} {"req/s":>8} {"p50, ms":>9} {"p99, ms":>9}  errors')
+    for name, path, command in servers:
+        process = run_server(command, args.port)
+        try:
+            asyncio.run(load(args.port, path, token, 10, 2, args.timeout))  # прогрев
+            rps, p50, p99, errors = asyncio.run(
+                load(args.port, path, token, args.connections, args.duration, args.timeout)
+            )
+        finally:
+            process.send_signal(signal.SIGTERM)
+            process.wait()
+        print(f'{name:<16} {rps:>8.1f} {p50:>9.1f} {p99:>9.1f}  {errors or "-"}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+"""
+Нагрузочный тест по сценариям: login, refresh, logout, permission (403 без
+ролей), orders (первая страница списка), order_create, profile.
+
+Скрипт готовит данные в текущей БД (``datagen.generate``), запускает
+локальный сервер (gunicorn или uvicorn) с поднятыми лимитами частоты
+логина и по очереди нагружает каждый сценарий ``--connections``
+соединениями в течение ``--duration`` секунд. С ``--url`` нагружается уже
+запущенный сервер (лимиты частоты на нем нужно поднять самостоятельно:
+``THROTTLE_LOGIN_IP`` и т. д.).
+
+Результаты (req/s и перцентили задержки) сохраняются в ``--json`` в формате
+``benchmarks/harness.py`` и сравниваются с ``--compare``.
+
+Сценарии с записью на SQLite и нескольких воркерах упираются в блокировку
+БД; для них используйте локальный Postgres.
+
+    cd app && python benchmarks/loadgen.py --users 10000 --connections 50 --duration 10 --json results/load.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS_DIR)
+sys.path.insert(1, os.path.dirname(BENCHMARKS_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.utils.module_loading import import_string  # noqa: E402
+from rest_framework_simplejwt.settings import api_settings as jwt_settings  # noqa: E402
+
+from datagen import EMAIL_DOMAIN, PASSWORD, email, generate  # noqa: E402
+from harness import DEFAULT_THRESHOLD, compare, format_comparison, format_results, load, metadata, percentile, result, save  # noqa: E402
+from users.models import User  # noqa: E402
+
+SCENARIOS = ('login', 'refresh', 'logout', 'permission', 'orders', 'order_create', 'profile')
+DENIED_EMAIL = f'denied@{EMAIL_DOMAIN}'
+UNTHROTTLED = {'THROTTLE_LOGIN_IP': '1000000/s', 'THROTTLE_LOGIN_EMAIL': '1000000/s', 'THROTTLE_REGISTER_IP': '1000000/s'}
+
+
+# --- HTTP ---
+
+async def http(host, port, method, path, headers=None, body=None, timeout=30):
+    """Один запрос по HTTP/1.1 с ``Connection: close``; возвращает ``(status, body)``."""
+    payload = json.dumps(body).encode() if body is not None else b''
+    lines = [f'{method} {path} HTTP/1.1', f'Host: {host}:{port}', 'Connection: close',
+             f'Content-Length: {len(payload)}']
+    if body is not None:
+        lines.append('Content-Type: application/json')
+    lines.extend(f'{name}: {value}' for name, value in (headers or {}).items())
+    request = ('\r\n'.join(lines) + '\r\n\r\n').encode() + payload
+
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        writer.write(request)
+        response = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    head, _, content = response.partition(b'\r\n\r\n')
+    status = int(head[9:12]) if len(head) >= 12 else 0
+    return status, content
+
+
+def bearer(token):
+    return {'Authorization': f'Bearer {token}'}
+
+
+# --- Сценарии ---
+
+class Fixtures:
+    """Пользователи и токены для сценариев."""
+
+    def __init__(self, users):
+        self.token_class = import_string(jwt_settings.TOKEN_OBTAIN_SERIALIZER).token_class
+        bench_users = User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}')
+        # Пользователи с правом чтения заказов, для order_create — с правом создания.
+        self.users = self.with_permission(bench_users, 'can_read', users)
+        self.writers = self.with_permission(bench_users, 'can_create', users)
+        self.denied, _ = User.objects.get_or_create(email=DENIED_EMAIL, defaults={'first_name': 'Denied', 'last_name': 'User'})
+        self.denied.roles.clear()
+        self.access = {
+            user_id: str(self.refresh(user_id).access_token) for user_id, _ in set(self.users) | set(self.writers)
+        }
+        self.denied_access = str(self.refresh(self.denied.pk).access_token)
+
+    @staticmethod
+    def with_permission(queryset, flag, limit):
+        queryset = queryset.filter(
+            roles__permissions__resource__name='orders', **{f'roles__permissions__{flag}': True}
+        )
+        return list(queryset.distinct().order_by('id').values_list('id', 'email')[:limit])
+
+    def refresh(self, user_id):
+        """Новый refresh-токен без записи в БД (строка OutstandingToken создается при отзыве)."""
+        token = self.token_class()
+        token[jwt_settings.USER_ID_CLAIM] = user_id
+        return token
+
+
+def scenario_clients(name, fixtures):
+    """Фабрика клиентов: каждый вызов возвращает функцию следующего запроса ``() -> (method, path, headers, body, ожидаемый статус)``."""
+    users = itertools.cycle(fixtures.writers if name == 'order_create' else fixtures.users)
+
+    def factory():
+        user_id, user_email = next(users)
+        access = bearer(fixtures.access[user_id])
+        state = {'refresh': str(fixtures.refresh(user_id))}
+
+        def login():
+            return 'POST', '/api/v1/auth/login/', None, {'email': user_email, 'password': PASSWORD}, 200
+
+        def refresh():
+            return 'POST', '/api/v1/auth/token/refresh/', None, {'refresh': state['refresh']}, 200
+
+        def logout():
+            return 'POST', '/api/v1/auth/logout/', access, {'refresh': str(fixtures.refresh(user_id))}, 205
+
+        def permission():
+            return 'GET', '/api/v1/resources/orders/', bearer(fixtures.denied_access), None, 403
+
+        def orders():
+            return 'GET', '/api/v1/resources/orders/', access, None, 200
+
+        def order_create():
+            return 'POST', '/api/v1/resources/orders/', access, {'item': 'Load test', 'price': '10.00'}, 201
+
+        def profile():
+            return 'GET', '/api/v1/profile/', access, None, 200
+
+        handlers = {
+            'login': login, 'refresh': refresh, 'logout': logout, 'permission': permission,
+            'orders': orders, 'order_create': order_create, 'profile': profile,
+        }
+        return handlers[name], state
+
+    return factory
+
+
+async def run_scenario(host, port, name, fixtures, connections, duration, timeout):
+    latencies, errors = [], {}
+    factory = scenario_clients(name, fixtures)
+    deadline = time.monotonic() + duration
+
+    async def client():
+        next_request, state = factory()
+        while time.monotonic() < deadline:
+            method, path, headers, body, expected = next_request()
+            started = time.monotonic()
+            try:
+                status, content = await http(host, port, method, path, headers, body, timeout)
+            except (OSError, asyncio.TimeoutError) as exc:
+                status, content = type(exc).__name__, b''
+            if status == expected:
+                latencies.append(time.monotonic() - started)
+                if name == 'refresh':
+                    # Ротация: старый refresh-токен отозван, продолжаем с новым.
+                    state['refresh'] = json.loads(content)['refresh']
+            else:
+                errors[str(status)] = errors.get(str(status), 0) + 1
+
+    started = time.monotonic()
+    await asyncio.gather(*(client() for _ in range(connections)))
+    elapsed = time.monotonic() - started
+    latencies = sorted(latency * 1000 for latency in latencies)
+    stats = {
+        'requests': len(latencies), 'errors': errors, 'seconds': elapsed,
+        'p50': percentile(latencies, 0.5), 'p95': percentile(latencies, 0.95), 'p99': percentile(latencies, 0.99),
+        'rounds': len(latencies),
+    }
+    return {
+        f'load.{name}.rps': result(len(latencies) / elapsed, 'req/s', 'higher', stats),
+        f'load.{name}.p99': result(stats['p99'], 'ms', 'lower', stats),
+    }
+
+
+# --- Сервер ---
+
+def wait_port(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex((host, port)) == 0:
+                return
+        time.sleep(0.2)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+def start_server(kind, port, workers):
+    if kind == 'uvicorn':
+        command = [sys.executable, '-m', 'uvicorn', 'core.asgi:application', '--workers', str(workers),
+                   '--port', str(port), '--backlog', '2048', '--no-access-log']
+    else:
+        command = [sys.executable, '-m', 'gunicorn', 'core.wsgi:application', '--workers', str(workers),
+                   '--bind', f'127.0.0.1:{port}', '--backlog', '2048']
+    env = {**os.environ, **UNTHROTTLED}
+    process = subprocess.Popen(
+        command, env=env, cwd=os.path.dirname(BENCHMARKS_DIR), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_port('127.0.0.1', port)
+    except Exception:
+        process.kill()
+        raise
+    return process
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', help='уже запущенный сервер, например http://127.0.0.1:8000')
+    parser.add_argument('--server', choices=('gunicorn', 'uvicorn'), default='gunicorn')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--connections', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--users', type=int, default=1000, help='пользователей в наборе данных')
+    parser.add_argument('--orders-per-user', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='файл для сохранения результатов')
+    parser.add_argument('--compare', help='файл результатов базового прогона')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f'unknown scenarios: {", ".join(sorted(unknown))}')
+
+    counts = generate(users=args.users, orders_per_user=args.orders_per_user, seed=args.seed, verbose=True)
+    print(f'dataset: {counts}')
+    fixtures = Fixtures(min(args.connections, args.users))
+    if not fixtures.users:
+        parser.error(f'no users in dataset (expected {email(0)} ...)')
+
+    process = None
+    if args.url:
+        parts = urlsplit(args.url)
+        host, port = parts.hostname, parts.port or 80
+    else:
+        host, port = '127.0.0.1', args.port
+        process = start_server(args.server, port, args.workers)
+
+    results = {}
+    try:
+        for name in scenarios:
+            asyncio.run(run_scenario(host, port, name, fixtures, min(args.connections, 5), 1, args.timeout))  # прогрев
+            scenario = asyncio.run(
+                run_scenario(host, port, name, fixtures, args.connections, args.duration, args.timeout)
+            )
+            results.update(scenario)
+            stats = scenario[f'load.{name}.rps']['stats']
+            print(f'{name:<14} {stats["requests"] / stats["seconds"]:>9.1f} req/s  '
+                  f'p50 {stats["p50"]:>8.1f} ms  p99 {stats["p99"]:>8.1f} ms  errors {stats["errors"] or "-"}')
+    finally:
+        if process is not None:
+            process.send_signal(signal.SIGTERM)
+            process.wait()
+
+    print('\n'.join(format_results(results)))
+    if args.json:
+        save(args.json, results, metadata(
+            server=args.url or args.server, workers=None if args.url else args.workers,
+            connections=args.connections, duration=args.duration, users=args.users,
+        ))
+        print(f'results saved to {args.json}')
+    if args.compare:
+        rows = compare(load(args.compare)['results'], results, args.threshold)
+        print('\n'.join(format_comparison(rows)))
+        if any(row[4] == 'regression' for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,5 +12,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+# Под ASGI синхронный код запроса выполняется в разных потоках, и постоянные
+# соединения не переиспользуются между запросами, а накапливаются: по умолчанию
+# новое соединение на запрос (для переиспользования — DB_POOL=True).
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
@@ -0,0 +1,93 @@
+"""
+Чтение с реплик (``DATABASE_REPLICAS``) и запись в основную БД (``default``).
+
+Реплики используются только там, где это разрешено явно (``use_replica``:
+``ReplicaReadMixin`` в ``users/api.py`` включает его для GET списков,
+записей, профиля и проверки прав). Остальные чтения, чтения
+внутри транзакции и все записи идут в основную БД; без реплик маршрутизатор
+ничего не меняет.
+
+Реплика отстает от основной БД, поэтому после изменения данных пользователя
+(и сброса зависящих от них кэшей: версий коллекций, профиля) он на
+``REPLICA_PIN_SECONDS`` закрепляется за основной БД (``pin``): свои записи
+он видит сразу, а кэши не заполняются устаревшими данными. Изменение правил
+RBAC закрепляет за основной БД всех (``pin_all``).
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+PRIMARY = DEFAULT_DB_ALIAS
+ALL_KEY = 'db:pinned:all'
+
+# Разрешено ли читать с реплики в текущем запросе (задаче).
+replica_allowed = ContextVar('replica_allowed', default=False)
+
+
+def _key(user_id):
+    return f'db:pinned:{user_id}'
+
+
+def _set_pins(keys):
+    cache.set_many(dict.fromkeys(keys, True), settings.REPLICA_PIN_SECONDS)
+
+
+def _pin(keys):
+    if not settings.DATABASE_REPLICAS:
+        return
+    _set_pins(keys)
+    # Отсчет окна — от фиксации транзакции, когда изменения начинают реплицироваться.
+    if connections[PRIMARY].in_atomic_block:
+        transaction.on_commit(lambda: _set_pins(keys), using=PRIMARY)
+
+
+def pin(user_ids):
+    """Чтения пользователей ``user_ids`` — из основной БД на ``REPLICA_PIN_SECONDS``."""
+    _pin([_key(user_id) for user_id in set(user_ids) if user_id is not None])
+
+
+def pin_all():
+    _pin([ALL_KEY])
+
+
+def is_pinned(user_id):
+    if not settings.DATABASE_REPLICAS:
+        return True
+    return bool(cache.get_many([ALL_KEY, _key(user_id)]))
+
+
+@contextmanager
+def primary_reads():
+    """Блок, в котором включается ``use_replica``: по выходе чтения снова идут в основную БД."""
+    token = replica_allowed.set(False)
+    try:
+        yield
+    finally:
+        replica_allowed.reset(token)
+
+
+def use_replica(user_id):
+    """Дальнейшие чтения блока ``primary_reads`` — с реплики, если пользователь не закреплен."""
+    replica_allowed.set(not is_pinned(user_id))
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or not replica_allowed.get() or connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная БД.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == PRIMARY
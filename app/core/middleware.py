@@ -0,0 +1,92 @@
+import random
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from users import metrics
+
+
+class RequestMetricsMiddleware:
+    """
+    Сбор метрик запроса (``users/metrics.py``): стоит первым в ``MIDDLEWARE``,
+    чтобы общее время включало остальные middleware. Запрос учитывается с
+    вероятностью ``METRICS_SAMPLE_RATE``; при 0 middleware отключается.
+    При ``METRICS_SERVER_TIMING`` учтенные ответы получают заголовок
+    ``Server-Timing``.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if settings.METRICS_SAMPLE_RATE <= 0:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.METRICS_SAMPLE_RATE
+        self.server_timing = settings.METRICS_SERVER_TIMING
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+        record = metrics.RequestMetrics()
+        token = metrics.current.set(record)
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        return self.finish(request, response, record)
+
+    async def __acall__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return await self.get_response(request)
+        record = metrics.RequestMetrics()
+        token = metrics.current.set(record)
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        return self.finish(request, response, record)
+
+    def finish(self, request, response, record):
+        total = perf_counter() - record.started
+        metrics.registry.observe_request(
+            metrics.view_label(request), request.method, response.status_code, total, record
+        )
+        if self.server_timing:
+            response['Server-Timing'] = record.server_timing(total)
+        return response
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoiseMiddleware, поддерживающий async-цепочку middleware. Исходный
+    класс только синхронный, и под ASGI Django переключал бы каждый запрос
+    в поток и обратно. Здесь в поток уходит только отдача статического файла.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
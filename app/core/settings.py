@@ -4,6 +4,7 @@
 from pathlib import Path
 import os
 from datetime import timedelta
+from django.core.exceptions import ImproperlyConfigured
 
 # Создаем пути внутри проекта вот так: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -36,8 +37,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первым, чтобы метрики включали время всех остальных middleware.
+    'core.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'core.middleware.AsyncWhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -73,6 +76,11 @@ DB_USER = os.environ.get('POSTGRES_USER')
 DB_PASSWORD = os.environ.get('POSTGRES_PASSWORD')
 DB_HOST = os.environ.get('DB_HOST')
 DB_PORT = os.environ.get('DB_PORT')
+DB_POOL = os.environ.get('DB_POOL', 'False') == 'True'
+# core/asgi.py задает 0 по умолчанию: под ASGI постоянные соединения не переиспользуются.
+_conn_max_age = os.environ.get('DB_CONN_MAX_AGE', '60')
+DB_CONN_MAX_AGE = 0 if DB_POOL else (int(_conn_max_age) if _conn_max_age else None)
+DB_CONN_HEALTH_CHECKS = os.environ.get('DB_CONN_HEALTH_CHECKS', 'True') == 'True'
 
 DATABASES = {
     'default': {
@@ -82,9 +90,70 @@ DATABASES = {
         'PASSWORD': DB_PASSWORD,
         'HOST': DB_HOST,
         'PORT': DB_PORT,
+        # Соединение переиспользуется воркером между запросами (DB_CONN_MAX_AGE секунд,
+        # пусто — без ограничения, 0 — новое соединение на каждый запрос) и перед
+        # повторным использованием проверяется (DB_CONN_HEALTH_CHECKS).
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': DB_CONN_HEALTH_CHECKS,
     }
 }
 
+if DB_POOL:
+    # Пул psycopg 3 (pip install -r requirements-pool.txt): отдельный в каждом процессе и
+    # для каждой БД (реплики тоже). Постоянные соединения Django с ним несовместимы.
+    try:
+        from psycopg_pool import ConnectionPool
+    except ImportError:
+        raise ImproperlyConfigured('Для DB_POOL=True нужен psycopg 3 с пулом: pip install -r requirements-pool.txt')
+
+    DATABASES['default']['OPTIONS'] = {'pool': {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 1)),
+        'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 4)),
+        'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', 600)),
+        **({'check': ConnectionPool.check_connection} if DB_CONN_HEALTH_CHECKS else {}),
+    }}
+
+# Реплики для чтения (core/db_router.py): DB_REPLICAS=хост[:порт][/имя_бд],...
+# Имя БД, пользователь и пароль по умолчанию — как у основной. Без реплик все идет в default.
+DATABASE_REPLICAS = []
+for _index, _replica in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(',')), start=1):
+    _location, _, _name = _replica.strip().partition('/')
+    _host, _, _port = _location.partition(':')
+    DATABASES[f'replica{_index}'] = {
+        **DATABASES['default'],
+        'NAME': _name or DB_NAME,
+        'HOST': _host,
+        'PORT': _port or DB_PORT,
+        # В тестах реплика — та же тестовая БД.
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{_index}')
+
+DATABASE_ROUTERS = ['core.db_router.PrimaryReplicaRouter']
+# Сколько секунд после изменения данных пользователь читает только из основной БД
+# (должно превышать отставание реплик).
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 5))
+
+# Кэш
+# Общий кэш (Redis) нужен, чтобы воркеры gunicorn синхронизировали поколение матрицы RBAC.
+# Без REDIS_URL используется локальный кэш процесса (подходит для разработки и тестов).
+REDIS_URL = os.environ.get('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # Кастомная модель пользователя
 AUTH_USER_MODEL = 'users.User'
 
@@ -104,6 +173,38 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Хеширование паролей (см. users/hashers.py).
+# PASSWORD_HASHER выбирает алгоритм для новых хешей: argon2 (нужен argon2-cffi) или pbkdf2.
+# Хеши других алгоритмов и с другой стоимостью обновляются после входа в фоне.
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'argon2')
+PASSWORD_ARGON2_TIME_COST = int(os.environ.get('PASSWORD_ARGON2_TIME_COST', 2))
+PASSWORD_ARGON2_MEMORY_COST = int(os.environ.get('PASSWORD_ARGON2_MEMORY_COST', 102400))  # КиБ
+PASSWORD_ARGON2_PARALLELISM = int(os.environ.get('PASSWORD_ARGON2_PARALLELISM', 8))
+PASSWORD_PBKDF2_ITERATIONS = int(os.environ.get('PASSWORD_PBKDF2_ITERATIONS', 1000000))
+
+_PASSWORD_HASHERS = {
+    'argon2': 'users.hashers.TunableArgon2PasswordHasher',
+    'pbkdf2': 'users.hashers.TunablePBKDF2PasswordHasher',
+}
+PASSWORD_HASHERS = [
+    _PASSWORD_HASHERS.pop(PASSWORD_HASHER),
+    *_PASSWORD_HASHERS.values(),
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+# Пул проверки и вычисления хешей паролей (см. users/hashing.py):
+# thread | process | пустая строка (без пула). Число воркеров по умолчанию — число CPU.
+PASSWORD_HASHING_POOL = os.environ.get('PASSWORD_HASHING_POOL', 'thread')
+PASSWORD_HASHING_WORKERS = int(os.environ.get('PASSWORD_HASHING_WORKERS', 0))
+PASSWORD_HASHING_QUEUE_SIZE = int(os.environ.get('PASSWORD_HASHING_QUEUE_SIZE', 32))
+PASSWORD_HASHING_QUEUE_TIMEOUT = float(os.environ.get('PASSWORD_HASHING_QUEUE_TIMEOUT', 5))
+PASSWORD_REHASH_QUEUE_SIZE = int(os.environ.get('PASSWORD_REHASH_QUEUE_SIZE', 1000))
+
+AUTHENTICATION_BACKENDS = [
+    'users.backends.PooledModelBackend',
+]
+
 # Интернационализация
 LANGUAGE_CODE = 'ru-ru'
 TIME_ZONE = 'Europe/Moscow'
@@ -123,11 +224,29 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'users.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    # Число доверенных прокси перед приложением: без них X-Forwarded-For
+    # игнорируется и лимиты по IP нельзя обойти подделкой заголовка.
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
+    # Частоты логина и регистрации (token bucket, см. users/throttles.py)
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': os.environ.get('THROTTLE_LOGIN_IP', '30/min'),
+        'login_email': os.environ.get('THROTTLE_LOGIN_EMAIL', '10/min'),
+        'register_ip': os.environ.get('THROTTLE_REGISTER_IP', '10/hour'),
+    },
 }
 
+# Хранилище корзин: local — только память процесса, cache — дополнительно
+# общая корзина в кэше Django (лимит на все воркеры, нужен REDIS_URL).
+AUTH_THROTTLE_BACKEND = os.environ.get('AUTH_THROTTLE_BACKEND', 'cache' if REDIS_URL else 'local')
+AUTH_THROTTLE_LOCAL_MAX_KEYS = int(os.environ.get('AUTH_THROTTLE_LOCAL_MAX_KEYS', 100000))
+
 # Настройки JWT
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
@@ -137,8 +256,80 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
     'USER_ID_FIELD': 'id',
     'USER_ID_CLAIM': 'user_id',
+    'TOKEN_REFRESH_SERIALIZER': 'users.tokens.CachedTokenRefreshSerializer',
 }
 
+# Кэш черного списка refresh-токенов (см. users/blacklist.py).
+JWT_BLACKLIST_BLOOM_CAPACITY = int(os.environ.get('JWT_BLACKLIST_BLOOM_CAPACITY', 100000))
+JWT_BLACKLIST_LRU_SIZE = int(os.environ.get('JWT_BLACKLIST_LRU_SIZE', 10000))
+
+# Встраивание маски прав RBAC в access-токены (см. users/tokens.py).
+JWT_RBAC_CLAIMS = os.environ.get('JWT_RBAC_CLAIMS', 'False') == 'True'
+
+# Stateless-аутентификация: пользователь восстанавливается из claim'ов токена без SELECT
+# (см. users/authentication.py). Требует токенов с claim'ами, поэтому включает и JWT_RBAC_CLAIMS.
+JWT_STATELESS_AUTH = os.environ.get('JWT_STATELESS_AUTH', 'False') == 'True'
+
+# Как часто (в секундах) процесс сверяет список отозванных пользователей с общим кэшем.
+AUTH_REVOCATION_SYNC_INTERVAL = float(os.environ.get('AUTH_REVOCATION_SYNC_INTERVAL', 1.0))
+
+if JWT_RBAC_CLAIMS or JWT_STATELESS_AUTH:
+    SIMPLE_JWT['TOKEN_OBTAIN_SERIALIZER'] = 'users.tokens.RBACTokenObtainPairSerializer'
+    SIMPLE_JWT['TOKEN_REFRESH_SERIALIZER'] = 'users.tokens.RBACTokenRefreshSerializer'
+
+if JWT_STATELESS_AUTH:
+    REST_FRAMEWORK['DEFAULT_AUTHENTICATION_CLASSES'] = (
+        'users.authentication.StatelessJWTAuthentication',
+    )
+
+# Настройки RBAC
+# Максимальное число пользователей, чьи наборы ролей кэшируются в одном процессе.
+RBAC_USER_CACHE_SIZE = int(os.environ.get('RBAC_USER_CACHE_SIZE', 10000))
+# Пакетная проверка прав (POST /api/v1/authz/check/): пар (ресурс, действие) и пользователей в одном запросе.
+AUTHZ_MAX_CHECKS = int(os.environ.get('AUTHZ_MAX_CHECKS', 500))
+AUTHZ_MAX_USERS = int(os.environ.get('AUTHZ_MAX_USERS', 100))
+# Массовое назначение ролей (POST /api/v1/admin/roles/assign/ и revoke/): пользователей в одном запросе.
+RBAC_BULK_MAX_USERS = int(os.environ.get('RBAC_BULK_MAX_USERS', 100000))
+
+# Кэш ответа профиля в общем кэше Django (см. users/profile_cache.py): время жизни записи, секунды.
+PROFILE_CACHE_TIMEOUT = int(os.environ.get('PROFILE_CACHE_TIMEOUT', 3600))
+
+# Массовое создание заказов и отчетов (POST .../bulk/)
+BULK_CREATE_BATCH_SIZE = int(os.environ.get('BULK_CREATE_BATCH_SIZE', 1000))
+BULK_CREATE_MAX_ITEMS = int(os.environ.get('BULK_CREATE_MAX_ITEMS', 50000))
+
+# Потоковая выгрузка (GET .../export/): строк за одно чтение из курсора БД
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 2000))
+
+# Быстрая сериализация списков и детальных ответов заказов/отчетов
+# через .values() и скомпилированные кодировщики строк (см. users/fast_serializers.py)
+FAST_SERIALIZERS = os.environ.get('FAST_SERIALIZERS', 'True') == 'True'
+
+# Метрики запросов (см. users/metrics.py, эндпоинт /metrics в формате Prometheus).
+# Доля учитываемых запросов: 0 отключает middleware метрик полностью.
+METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', 1.0))
+# Заголовок Server-Timing с временем этапов (по умолчанию только при DEBUG).
+METRICS_SERVER_TIMING = os.environ.get('METRICS_SERVER_TIMING', str(DEBUG)) == 'True'
+# Bearer-токен для /metrics; без него эндпоинт доступен только при DEBUG.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Журнал аудита (см. users/audit.py): решения CustomRBACPermission, входы и выходы.
+AUDIT_LOG = os.environ.get('AUDIT_LOG', 'True') == 'True'
+# Куда пишет фоновый поток: db — таблица AuditEvent, file — JSON Lines с ротацией.
+AUDIT_BACKEND = os.environ.get('AUDIT_BACKEND', 'db')
+AUDIT_FILE = os.environ.get('AUDIT_FILE', str(BASE_DIR / 'audit.jsonl'))
+AUDIT_FILE_MAX_BYTES = int(os.environ.get('AUDIT_FILE_MAX_BYTES', 100 * 1024 * 1024))
+AUDIT_FILE_BACKUPS = int(os.environ.get('AUDIT_FILE_BACKUPS', 10))
+# Очередь событий процесса и политика при ее переполнении:
+# drop — отбросить новое событие, drop_oldest — самое старое,
+# block — ждать место до AUDIT_BLOCK_TIMEOUT секунд (затем отбросить новое).
+AUDIT_QUEUE_SIZE = int(os.environ.get('AUDIT_QUEUE_SIZE', 100000))
+AUDIT_OVERFLOW = os.environ.get('AUDIT_OVERFLOW', 'drop')
+AUDIT_BLOCK_TIMEOUT = float(os.environ.get('AUDIT_BLOCK_TIMEOUT', 0.05))
+# Запись пакетами: не больше AUDIT_BATCH_SIZE событий, не реже раза в AUDIT_FLUSH_INTERVAL секунд.
+AUDIT_BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', 2000))
+AUDIT_FLUSH_INTERVAL = float(os.environ.get('AUDIT_FLUSH_INTERVAL', 1.0))
+
 # Настройки Swagger
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Auth System API',
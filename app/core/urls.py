@@ -2,9 +2,13 @@ from django.contrib import admin
 from django.urls import path, include
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
+from users.metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/v1/', include('users.urls')),
+    path('api/v1/async/', include('users.async_urls')),
+    path('metrics', metrics_view, name='metrics'),
     
     # Swagger
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
@@ -1,16 +1,46 @@
+from django import forms
 from django.contrib import admin
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, Role, Resource, PermissionRule, Order, Report
+from . import hierarchy
+from .models import AuditEvent, User, Role, Resource, PermissionRule, Order, Report, Team
+from .search import RANK_FIELD, search
+
+class RankedChangeList(ChangeList):
+    """Результаты полнотекстового поиска по убыванию релевантности, если сортировка не выбрана явно."""
+
+    def get_ordering(self, request, queryset):
+        if RANK_FIELD in queryset.query.annotations and ORDER_VAR not in self.params:
+            return ['-' + RANK_FIELD, '-pk']
+        return super().get_ordering(request, queryset)
+
+class FullTextSearchAdminMixin:
+    """
+    Поиск в списке через полнотекстовый индекс (users/search.py) с
+    сортировкой по релевантности. Запрос с '@' ищется по search_fields
+    штатным способом (email владельца).
+    """
+
+    def is_full_text_search(self, search_term):
+        return bool(search_term) and '@' not in search_term
+
+    def get_search_results(self, request, queryset, search_term):
+        if not self.is_full_text_search(search_term):
+            return super().get_search_results(request, queryset, search_term)
+        return search(queryset, search_term, scoped=False), False
+
+    def get_changelist(self, request, **kwargs):
+        return RankedChangeList
 
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
     list_display = ('email', 'first_name', 'last_name', 'is_staff', 'is_active')
     ordering = ('email',)
-    list_filter = ('is_staff', 'is_active', 'roles')
+    list_filter = ('is_staff', 'is_active', 'roles', 'team')
     fieldsets = (
         (None, {'fields': ('email', 'password')}),
         ('Персональная информация', {'fields': ('first_name', 'last_name', 'middle_name')}),
-        ('Права доступа', {'fields': ('is_active', 'is_staff', 'is_superuser', 'roles')}),
+        ('Права доступа', {'fields': ('is_active', 'is_staff', 'is_superuser', 'roles', 'team')}),
         ('Важные даты', {'fields': ('last_login',)}),
     )
     add_fieldsets = (
@@ -21,8 +51,26 @@ class UserAdmin(BaseUserAdmin):
     )
     filter_horizontal = ('roles',)
 
+class RoleAdminForm(forms.ModelForm):
+    class Meta:
+        model = Role
+        fields = '__all__'
+
+    def clean_parents(self):
+        parents = self.cleaned_data['parents']
+        if self.instance.pk:
+            hierarchy.check_edges([(parent.pk, self.instance.pk) for parent in parents])
+        return parents
+
 @admin.register(Role)
 class RoleAdmin(admin.ModelAdmin):
+    form = RoleAdminForm
+    list_display = ('name',)
+    search_fields = ('name',)
+    filter_horizontal = ('parents',)
+
+@admin.register(Team)
+class TeamAdmin(admin.ModelAdmin):
     list_display = ('name',)
     search_fields = ('name',)
 
@@ -33,18 +81,36 @@ class ResourceAdmin(admin.ModelAdmin):
 
 @admin.register(PermissionRule)
 class PermissionRuleAdmin(admin.ModelAdmin):
-    list_display = ('role', 'resource', 'can_create', 'can_read', 'can_update', 'can_delete')
-    list_filter = ('role', 'resource')
-    list_editable = ('can_create', 'can_read', 'can_update', 'can_delete')
+    list_display = ('role', 'resource', 'can_create', 'can_read', 'can_update', 'can_delete', 'scope')
+    list_filter = ('role', 'resource', 'scope')
+    list_editable = ('can_create', 'can_read', 'can_update', 'can_delete', 'scope')
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(FullTextSearchAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'item', 'price', 'owner', 'created_at')
     list_filter = ('created_at', 'owner')
     search_fields = ('item', 'owner__email')
 
 @admin.register(Report)
-class ReportAdmin(admin.ModelAdmin):
+class ReportAdmin(FullTextSearchAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'title', 'author', 'created_at')
     list_filter = ('created_at', 'author')
     search_fields = ('title', 'author__email')
+
+@admin.register(AuditEvent)
+class AuditEventAdmin(admin.ModelAdmin):
+    """Журнал только для просмотра: записи добавляет фоновый поток (users/audit.py)."""
+    list_display = ('created_at', 'kind', 'user_id', 'resource', 'action', 'allowed', 'detail', 'ip')
+    list_filter = ('kind', 'allowed', 'resource')
+    search_fields = ('detail',)
+    date_hierarchy = 'created_at'
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
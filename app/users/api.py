@@ -1,55 +1,132 @@
 from rest_framework import generics, status, views, viewsets, permissions
+from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.permissions import SAFE_METHODS, AllowAny, IsAuthenticated, IsAdminUser
 from django.contrib.auth import get_user_model
-from drf_spectacular.utils import extend_schema, OpenApiExample
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.dateparse import parse_date
+from django.utils.http import parse_etags
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiExample, OpenApiParameter
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.views import TokenObtainPairView
+
+from core import db_router
 
 from .serializers import (
     UserRegistrationSerializer, UserProfileSerializer, 
-    RoleSerializer, PermissionRuleSerializer,
+    RoleSerializer, PermissionRuleSerializer, PermissionCheckSerializer, RoleAssignmentSerializer,
     OrderSerializer, ReportSerializer
 )
-from .models import Role, PermissionRule, Resource, Order, Report
+from .models import Role, PermissionRule, Resource, Order, OrderRollup, Report
+from .exports import EXPORT_FORMATS, ORDER_EXPORT, REPORT_EXPORT, STREAMERS
+from .fast_serializers import FastReadMixin
+from .filters import RBACScopeFilter, request_scope
+from .metrics import InstrumentedViewMixin
+from .pagination import KeysetPagination, RankedKeysetPagination
+from .parsers import NDJSONParser
 from .permissions import CustomRBACPermission
-from . import services
+from .throttles import LoginEmailThrottle, LoginIPThrottle, RegisterIPThrottle
+from .tokens import CachedRefreshToken
+from . import audit, profile_cache, rbac, rbac_batch, search, services, versions
 
 User = get_user_model()
 
 # --- Auth ---
 
-class RegisterView(generics.CreateAPIView):
+class RegisterView(InstrumentedViewMixin, generics.CreateAPIView):
     queryset = User.objects.all()
     permission_classes = (AllowAny,)
     serializer_class = UserRegistrationSerializer
+    throttle_classes = (RegisterIPThrottle,)
+
+class LoginView(InstrumentedViewMixin, TokenObtainPairView):
+    """Получение пары JWT с ограничением частоты по IP и email (до проверки пароля)."""
+    throttle_classes = (LoginIPThrottle, LoginEmailThrottle)
+
+    def post(self, request, *args, **kwargs):
+        # Как TokenViewBase.post, с записью входа в журнал аудита.
+        serializer = self.get_serializer(data=request.data)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except TokenError as e:
+            raise InvalidToken(e.args[0]) from e
+        except AuthenticationFailed:
+            audit.login(request, email=request.data.get(serializer.username_field))
+            raise
+        audit.login(request, serializer.user)
+        return Response(serializer.validated_data, status=status.HTTP_200_OK)
 
-class LogoutView(views.APIView):
+class LogoutView(InstrumentedViewMixin, views.APIView):
     permission_classes = (IsAuthenticated,)
 
     @extend_schema(request={'refresh': str}, responses={205: None})
     def post(self, request):
         try:
             refresh_token = request.data["refresh"]
-            token = RefreshToken(refresh_token)
+            token = CachedRefreshToken(refresh_token)
             token.blacklist()
+            audit.logout(request)
             return Response(status=status.HTTP_205_RESET_CONTENT)
         except Exception as e:
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
-class UserProfileView(views.APIView):
+class ReplicaReadMixin:
+    """
+    GET-запросы читают с реплики (core/db_router.py): проверка прав и данные
+    ответа. Пользователь из JWT загружается из основной БД; закрепленный за
+    ней после своих изменений пользователь читает только из нее.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with db_router.primary_reads():
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            self.perform_authentication(request)
+            db_router.use_replica(request.user.pk)
+        super().initial(request, *args, **kwargs)
+
+class UserProfileView(InstrumentedViewMixin, ReplicaReadMixin, views.APIView):
+    """
+    Профиль текущего пользователя. JSON-ответ GET берется из кэша
+    (users/profile_cache.py) и сопровождается ETag: при совпадении
+    If-None-Match возвращается 304 без обращения к БД.
+    """
     permission_classes = (IsAuthenticated,)
     serializer_class = UserProfileSerializer
 
     def get(self, request):
-        serializer = self.serializer_class(request.user)
-        return Response(serializer.data)
+        if request.accepted_renderer.format != 'json':
+            # Браузерный API рендерится как обычно.
+            return Response(self.serializer_class(request.user).data)
+        cached, stamp = profile_cache.lookup(request.user.pk)
+        etag, body = cached or profile_cache.store(request.user.pk, stamp)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(body, content_type='application/json')
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        patch_vary_headers(response, ('Authorization',))
+        return response
     
     def put(self, request):
         """Обновление профиля пользователя."""
         serializer = self.serializer_class(request.user, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
-            return Response(serializer.data)
+            # Сохранение сбросило запись кэша (сигнал), новая пишется сразу.
+            etag, body = profile_cache.refresh(request.user.pk)
+            response = HttpResponse(body, content_type='application/json')
+            response['ETag'] = etag
+            return response
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request):
@@ -63,27 +140,239 @@ class UserProfileView(views.APIView):
         # Но так как user.is_active становится False, последующие запросы не пройдут проверку.
         return Response({"detail": "Аккаунт удален."}, status=status.HTTP_204_NO_CONTENT)
 
+class PermissionCheckView(InstrumentedViewMixin, views.APIView):
+    """
+    Пакетная проверка прав (точка принятия решений для фронтенда и других
+    сервисов): для каждой пары ``[ресурс, действие]`` — разрешил бы ли
+    ``CustomRBACPermission`` такое действие. Без ``users`` проверяется текущий
+    пользователь; проверять других может только администратор (``is_staff``).
+    Решения берутся из скомпилированной матрицы RBAC (users/rbac.py), ответ —
+    матрица ``allowed[пользователь][проверка]`` в порядке запроса.
+    Несуществующим пользователям запрещено все.
+    """
+    permission_classes = (IsAuthenticated,)
+    serializer_class = PermissionCheckSerializer
+
+    @extend_schema(
+        request=PermissionCheckSerializer,
+        examples=[OpenApiExample('Проверка', value={'checks': [['orders', 'read'], ['orders', 'delete']]}, request_only=True)],
+    )
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        checks = serializer.validated_data['checks']
+        user_ids = serializer.validated_data.get('users')
+        if user_ids is None or user_ids == [request.user.pk]:
+            user_ids, users = [request.user.pk], [request.user]
+        elif not request.user.is_staff:
+            return Response({'detail': 'Проверять права других пользователей может только администратор.'},
+                            status=status.HTTP_403_FORBIDDEN)
+        else:
+            found = {user.pk: user for user in User.objects.filter(pk__in=user_ids).only('id', 'is_active', 'is_superuser')}
+            users = [found.get(user_id) or User(pk=user_id, is_active=False) for user_id in user_ids]
+        return Response({'users': user_ids, 'allowed': rbac.check_many(users, checks)})
+
 # --- RBAC Admin ---
 
-class RoleViewSet(viewsets.ModelViewSet):
+class RoleViewSet(InstrumentedViewMixin, viewsets.ModelViewSet):
     queryset = Role.objects.all()
     serializer_class = RoleSerializer
     permission_classes = (IsAdminUser,)
 
-class PermissionRuleViewSet(viewsets.ModelViewSet):
+    @extend_schema(request=RoleAssignmentSerializer,
+                   responses={200: {'type': 'object', 'properties': {'assigned': {'type': 'integer'}}}})
+    @action(detail=False, methods=['post'])
+    def assign(self, request):
+        """
+        Назначение ролей ``roles`` всем пользователям ``users`` пакетной
+        вставкой (users/rbac_batch.py); ``assigned`` — число новых назначений.
+        """
+        serializer = RoleAssignmentSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        return Response({'assigned': rbac_batch.assign_roles(data['users'], data['roles'])})
+
+    @extend_schema(request=RoleAssignmentSerializer,
+                   responses={200: {'type': 'object', 'properties': {'revoked': {'type': 'integer'}}}})
+    @action(detail=False, methods=['post'])
+    def revoke(self, request):
+        """Снятие ролей ``roles`` с пользователей ``users``; ``revoked`` — число удаленных назначений."""
+        serializer = RoleAssignmentSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        return Response({'revoked': rbac_batch.revoke_roles(data['users'], data['roles'])})
+
+class PermissionRuleViewSet(InstrumentedViewMixin, viewsets.ModelViewSet):
     queryset = PermissionRule.objects.all()
     serializer_class = PermissionRuleSerializer
     permission_classes = (IsAdminUser,)
 
+class RBACDocumentView(InstrumentedViewMixin, views.APIView):
+    """
+    Роли, ресурсы и правила одним документом (users/rbac_batch.py): GET —
+    выгрузка, PUT — применение в одной транзакции с записью только отличий.
+    ``?prune=true`` удаляет роли и ресурсы, которых нет в документе,
+    ``?dry_run=true`` только подсчитывает изменения.
+    """
+    permission_classes = (IsAdminUser,)
+
+    @extend_schema(responses={200: OpenApiTypes.OBJECT})
+    def get(self, request):
+        return Response(rbac_batch.export_document())
+
+    @extend_schema(request=OpenApiTypes.OBJECT, responses={200: OpenApiTypes.OBJECT}, parameters=[
+        OpenApiParameter('prune', bool, description='Удалить роли и ресурсы, которых нет в документе'),
+        OpenApiParameter('dry_run', bool, description='Только подсчитать изменения'),
+    ])
+    def put(self, request):
+        flags = {name: request.query_params.get(name) in ('1', 'true', 'True') for name in ('prune', 'dry_run')}
+        try:
+            changes = rbac_batch.import_document(request.data, **flags)
+        except DjangoValidationError as exc:
+            return Response({'detail': exc.messages}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(changes)
+
 # --- Бизнес-логика (Реальные модели + Сервисный слой) ---
 
-class OrderViewSet(viewsets.ModelViewSet):
+class BulkCreateMixin:
+    """
+    Массовое создание: POST .../bulk/ с JSON-массивом или NDJSON-потоком.
+    Права (can_create) проверяются один раз на запрос, элементы валидируются
+    сериализатором в режиме many, запись — одной транзакцией через bulk_create.
+    """
+    bulk_create_service = None
+
+    def get_bulk_batch_size(self, request):
+        try:
+            batch_size = int(request.query_params.get('batch_size', settings.BULK_CREATE_BATCH_SIZE))
+        except ValueError:
+            batch_size = settings.BULK_CREATE_BATCH_SIZE
+        return min(max(batch_size, 1), settings.BULK_CREATE_MAX_ITEMS)
+
+    @extend_schema(responses={201: None, 400: None})
+    @action(detail=False, methods=['post'], url_path='bulk', parser_classes=(JSONParser, NDJSONParser))
+    def bulk(self, request):
+        items = request.data
+        if not isinstance(items, list):
+            return Response({"detail": "Ожидается массив объектов."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.BULK_CREATE_MAX_ITEMS:
+            return Response(
+                {"detail": f"Не более {settings.BULK_CREATE_MAX_ITEMS} объектов за запрос."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        serializer = self.get_serializer(data=items, many=True)
+        if not serializer.is_valid():
+            errors = serializer.errors
+            # В зависимости от версии DRF ошибки many=True — список или словарь {индекс: ошибки}.
+            pairs = errors.items() if isinstance(errors, dict) else enumerate(errors)
+            errors = [{'index': index, 'errors': error} for index, error in pairs if error]
+            return Response({'created': 0, 'results': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        objects = self.bulk_create_service(
+            request.user, serializer.validated_data, batch_size=self.get_bulk_batch_size(request)
+        )
+        results = [{'index': index, 'id': obj.pk} for index, obj in enumerate(objects)]
+        return Response({'created': len(objects), 'results': results}, status=status.HTTP_201_CREATED)
+
+class ExportMixin:
+    """
+    Потоковая выгрузка всех доступных пользователю записей: GET .../export/?fmt=ndjson|csv.
+    Доступ (can_read) и область видимости — те же, что у списка (get_queryset).
+    """
+    export_spec = None
+
+    @extend_schema(responses={200: None})
+    @action(detail=False, methods=['get'], url_path='export', pagination_class=None)
+    def export(self, request):
+        export_format = request.query_params.get('fmt', 'ndjson')
+        if export_format not in STREAMERS:
+            return Response(
+                {"detail": f"Поддерживаемые форматы: {', '.join(STREAMERS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        stream = STREAMERS[export_format](self.export_spec, self.get_queryset())
+        response = StreamingHttpResponse(stream, content_type=EXPORT_FORMATS[export_format])
+        response['Content-Disposition'] = f'attachment; filename="{self.export_spec.name}.{export_format}"'
+        return response
+
+class SearchMixin:
+    """
+    Полнотекстовый поиск в списке: GET ...?q=<запрос> (users/search.py).
+    Поиск выполняется внутри get_queryset (записи в области прав пользователя),
+    результаты упорядочены по релевантности и листаются курсором по рангу.
+    """
+    search_query_param = 'q'
+    search_pagination_class = RankedKeysetPagination
+
+    def get_search_query(self):
+        return self.request.query_params.get(self.search_query_param, '').strip()
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        query = self.get_search_query()
+        if query:
+            # Для области ALL совпадения выбираются из индекса, а не проверяются построчно.
+            queryset = search.search(queryset, query, scoped=request_scope(self.request, self) != PermissionRule.ALL)
+        return queryset
+
+    @property
+    def paginator(self):
+        if self.pagination_class is None or not self.get_search_query():
+            return super().paginator
+        if not hasattr(self, '_search_paginator'):
+            self._search_paginator = self.search_pagination_class()
+        return self._search_paginator
+
+class ConditionalGetMixin:
+    """
+    Условные GET списка и записи. ETag строится из версии коллекции
+    пользователя (users/versions.py), адреса и формата ответа; при совпадении
+    If-None-Match ответ 304 отдается после проверки прав, но до выборки и
+    сериализации. Версия учитывает только записи пользователя, поэтому
+    ответы с областью прав шире OWN (users/filters.py) строятся всегда.
+    """
+
+    def conditional(self, handler, request, *args, **kwargs):
+        if request_scope(request, self) != PermissionRule.OWN:
+            return handler(request, *args, **kwargs)
+        etag = versions.etag(
+            self.get_queryset().model, request.user.pk, request.accepted_renderer.format, request.get_full_path()
+        )
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
+
+search_schema = extend_schema_view(list=extend_schema(parameters=[
+    OpenApiParameter('q', str, description='Полнотекстовый поиск; результаты по убыванию релевантности.'),
+]))
+
+@search_schema
+class OrderViewSet(InstrumentedViewMixin, ReplicaReadMixin, ConditionalGetMixin, FastReadMixin, SearchMixin, ExportMixin, BulkCreateMixin, viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = (IsAuthenticated, CustomRBACPermission)
     required_resource = 'orders'
+    owner_field = 'owner'
+    pagination_class = KeysetPagination
+    bulk_create_service = staticmethod(services.bulk_create_orders)
+    export_spec = ORDER_EXPORT
 
     def get_queryset(self):
-        return services.get_user_orders(self.request.user)
+        # Записи в области прав пользователя для действия запроса (users/filters.py).
+        return RBACScopeFilter().filter_queryset(self.request, services.get_orders(), self)
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -92,13 +381,46 @@ class OrderViewSet(viewsets.ModelViewSet):
         headers = self.get_success_headers(serializer.data)
         return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED, headers=headers)
 
-class ReportViewSet(viewsets.ModelViewSet):
+    @extend_schema(
+        parameters=[
+            OpenApiParameter('period', str, enum=[OrderRollup.DAY, OrderRollup.MONTH]),
+            OpenApiParameter('from', str, description='YYYY-MM-DD'),
+            OpenApiParameter('to', str, description='YYYY-MM-DD'),
+        ],
+        responses={200: None, 400: None},
+    )
+    @action(detail=False, methods=['get'], url_path='stats', pagination_class=None)
+    def stats(self, request):
+        """
+        Итоги заказов пользователя (количество, сумма цен) и ряд по дням или
+        месяцам. Читаются агрегаты (users/rollups.py), а не сами заказы.
+        """
+        granularity = request.query_params.get('period', OrderRollup.MONTH)
+        if granularity not in (OrderRollup.DAY, OrderRollup.MONTH):
+            return Response({"detail": "period: day или month."}, status=status.HTTP_400_BAD_REQUEST)
+        bounds = {}
+        for param in ('from', 'to'):
+            value = request.query_params.get(param)
+            try:
+                bounds[param] = parse_date(value) if value else None
+            except ValueError:
+                bounds[param] = None
+            if value and bounds[param] is None:
+                return Response({"detail": f"{param}: ожидается дата YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(services.get_order_stats(request.user, granularity, bounds['from'], bounds['to']))
+
+@search_schema
+class ReportViewSet(InstrumentedViewMixin, ReplicaReadMixin, ConditionalGetMixin, FastReadMixin, SearchMixin, ExportMixin, BulkCreateMixin, viewsets.ModelViewSet):
     serializer_class = ReportSerializer
     permission_classes = (IsAuthenticated, CustomRBACPermission)
     required_resource = 'reports'
+    owner_field = 'author'
+    pagination_class = KeysetPagination
+    bulk_create_service = staticmethod(services.bulk_create_reports)
+    export_spec = REPORT_EXPORT
 
     def get_queryset(self):
-        return services.get_user_reports(self.request.user)
+        return RBACScopeFilter().filter_queryset(self.request, services.get_reports(), self)
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -4,3 +4,7 @@ class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
     verbose_name = 'Управление пользователями и RBAC'
+
+    def ready(self):
+        # Регистрация системных проверок и обработчиков сигналов (инвалидация кэшей RBAC).
+        from . import checks, signals  # noqa: F401
@@ -0,0 +1,322 @@
+"""
+Асинхронные (ASGI) варианты эндпоинтов аутентификации, профиля и ресурсов.
+
+Маршруты повторяют ``users/urls.py`` под префиксом ``/api/v1/async/``. Запросы
+к БД идут через async ORM (``aget``, ``acreate``, async-итерация), права
+проверяются ``CustomRBACPermission.ahas_permission``, а хеширование паролей
+выполняется в пуле (``users/hashing.py``) без блокировки event loop. Формат
+ответов и ошибок совпадает с DRF-представлениями.
+
+Выигрыш дают только при запуске под ASGI-сервером (uvicorn), например::
+
+    gunicorn core.asgi:application -k uvicorn.workers.UvicornWorker
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import aauthenticate, get_user_model
+from django.contrib.auth.models import AnonymousUser, update_last_login
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import aprefetch_related_objects
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.request import Request
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from . import audit, rbac, services
+from .authentication import AsyncJWTAuthentication
+from .fast_serializers import RowEncoder
+from .filters import scope_filter
+from .hashing import hashing_pool
+from .metrics import stage
+from .pagination import KeysetPagination
+from .models import PermissionRule
+from .permissions import METHOD_ACTIONS, CustomRBACPermission
+from .renderers import FastJSONRenderer
+from .serializers import OrderSerializer, ReportSerializer, UserProfileSerializer, UserRegistrationSerializer
+from .throttles import LoginEmailThrottle, LoginIPThrottle, RegisterIPThrottle
+
+User = get_user_model()
+
+
+class AsyncAPIView(View):
+    """
+    Базовое async-представление: JWT-аутентификация, проверка прав и
+    ограничений частоты, разбор тела через ``rest_framework.request.Request``.
+    Обработчики возвращают ``(data, status)``.
+    """
+    authenticate_requests = True
+    permission_classes = (IsAuthenticated,)
+    throttle_classes = ()
+    parser_classes = (JSONParser, FormParser, MultiPartParser)
+    http_method_names = ['get', 'post', 'put', 'patch', 'delete']
+
+    _authentication = AsyncJWTAuthentication()
+    _renderer = FastJSONRenderer()
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # JWT в заголовке, cookie не используются — как в DRF APIView.
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        request = Request(request, parsers=[parser() for parser in self.parser_classes])
+        self.request = request
+        try:
+            await self.initial(request)
+            method = request.method.lower()
+            handler = getattr(self, method, None) if method in self.http_method_names else None
+            if handler is None:
+                raise exceptions.MethodNotAllowed(request.method)
+            data, status_code = await handler(request, *args, **kwargs)
+            response = self.render(data, status_code)
+        except exceptions.APIException as exc:
+            response = self.handle_exception(exc)
+        except ObjectDoesNotExist:
+            response = self.handle_exception(exceptions.NotFound())
+        return response
+
+    async def initial(self, request):
+        request.user, request.auth = AnonymousUser(), None
+        if self.authenticate_requests:
+            with stage('auth'):
+                try:
+                    result = await self._authentication.aauthenticate(request)
+                except TokenError as exc:
+                    raise InvalidToken(exc.args[0])
+            if result is not None:
+                request.user, request.auth = result
+        with stage('throttle'):
+            await self.check_throttles(request)
+        with stage('permission'):
+            await self.check_permissions(request)
+
+    async def check_permissions(self, request):
+        for permission_class in self.permission_classes:
+            permission = permission_class()
+            if hasattr(permission, 'ahas_permission'):
+                allowed = await permission.ahas_permission(request, self)
+            else:
+                allowed = permission.has_permission(request, self)
+            if not allowed:
+                if self.authenticate_requests and request.auth is None:
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied(getattr(permission, 'message', None))
+
+    async def check_throttles(self, request):
+        for throttle_class in self.throttle_classes:
+            throttle = throttle_class()
+            if settings.AUTH_THROTTLE_BACKEND == 'cache':
+                allowed = await sync_to_async(throttle.allow_request)(request, self)
+            else:
+                allowed = throttle.allow_request(request, self)
+            if not allowed:
+                raise exceptions.Throttled(throttle.wait())
+
+    def render(self, data, status_code):
+        if data is None:
+            return HttpResponse(status=status_code)
+        return HttpResponse(self._renderer.render(data), status=status_code, content_type='application/json')
+
+    def handle_exception(self, exc):
+        if isinstance(exc.detail, (list, dict)):
+            data = exc.detail
+        else:
+            data = {'detail': exc.detail}
+        response = self.render(data, exc.status_code)
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            response.status_code = status.HTTP_401_UNAUTHORIZED
+            response['WWW-Authenticate'] = self._authentication.authenticate_header(self.request)
+        if getattr(exc, 'wait', None):
+            response['Retry-After'] = '%d' % exc.wait
+        return response
+
+
+# --- Auth ---
+
+class AsyncLoginView(AsyncAPIView):
+    authenticate_requests = False
+    permission_classes = ()
+    throttle_classes = (LoginIPThrottle, LoginEmailThrottle)
+
+    async def post(self, request):
+        serializer = import_string(jwt_settings.TOKEN_OBTAIN_SERIALIZER)(data=request.data)
+        # Только проверка полей: аутентификация (validate) выполняется асинхронно ниже.
+        attrs = serializer.to_internal_value(request.data)
+        user = await aauthenticate(
+            request._request,
+            **{serializer.username_field: attrs[serializer.username_field], 'password': attrs['password']}
+        )
+        if not jwt_settings.USER_AUTHENTICATION_RULE(user):
+            audit.login(request, email=attrs[serializer.username_field], wait=False)
+            raise exceptions.AuthenticationFailed(
+                serializer.error_messages['no_active_account'], 'no_active_account'
+            )
+        data = await sync_to_async(self.issue_tokens)(serializer, user)
+        audit.login(request, user, wait=False)
+        return data, status.HTTP_200_OK
+
+    @staticmethod
+    def issue_tokens(serializer, user):
+        # Запись OutstandingToken и claim'ы RBAC требуют синхронного ORM.
+        refresh = serializer.get_token(user)
+        data = {'refresh': str(refresh), 'access': str(refresh.access_token)}
+        if jwt_settings.UPDATE_LAST_LOGIN:
+            update_last_login(None, user)
+        return data
+
+
+class AsyncRegisterView(AsyncAPIView):
+    authenticate_requests = False
+    permission_classes = ()
+    throttle_classes = (RegisterIPThrottle,)
+
+    async def post(self, request):
+        serializer = UserRegistrationSerializer(data=request.data)
+        # Проверка уникальности email обращается к БД.
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+        data = dict(serializer.validated_data)
+        password = data.pop('password')
+        data.pop('password_confirm')
+        user = User(email=User.objects.normalize_email(data.pop('email')), **data)
+        user.password = await hashing_pool.amake(password)
+        await user.asave()
+        return UserRegistrationSerializer(user).data, status.HTTP_201_CREATED
+
+
+class AsyncUserProfileView(AsyncAPIView):
+
+    async def get_profile_user(self, request):
+        user = request.user
+        if user.get_deferred_fields():
+            # Пользователь из claim'ов токена (JWT_STATELESS_AUTH).
+            user = await User.objects.aget(pk=user.pk)
+        await aprefetch_related_objects([user], 'roles')
+        return user
+
+    async def get(self, request):
+        user = await self.get_profile_user(request)
+        return UserProfileSerializer(user).data, status.HTTP_200_OK
+
+    async def put(self, request):
+        """Обновление профиля пользователя."""
+        user = await self.get_profile_user(request)
+        serializer = UserProfileSerializer(user, data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        for attr, value in serializer.validated_data.items():
+            setattr(user, attr, value)
+        await user.asave()
+        return UserProfileSerializer(user).data, status.HTTP_200_OK
+
+    async def delete(self, request):
+        """Мягкое удаление учетной записи пользователя."""
+        await sync_to_async(request.user.soft_delete)()
+        return {"detail": "Аккаунт удален."}, status.HTTP_204_NO_CONTENT
+
+
+# --- Ресурсы ---
+
+class AsyncResourceMixin:
+    permission_classes = (IsAuthenticated, CustomRBACPermission)
+    required_resource = None
+    owner_field = 'owner'
+    serializer_class = None
+    queryset_service = None
+
+    _row_encoders = {}
+
+    async def aget_queryset(self):
+        """Записи в области прав пользователя для действия запроса (users/filters.py)."""
+        user = self.request.user
+        if user.is_superuser:
+            scope = PermissionRule.ALL
+        else:
+            action_bit = rbac.ACTION_BITS[METHOD_ACTIONS[self.request.method]]
+            scope = await rbac.matrix.ascope(user.pk, self.required_resource, action_bit)
+        return scope_filter(self.queryset_service(), user, scope, self.owner_field)
+
+    def get_row_encoder(self):
+        encoder = self._row_encoders.get(self.serializer_class)
+        if encoder is None:
+            encoder = self._row_encoders[self.serializer_class] = RowEncoder(self.serializer_class)
+        return encoder
+
+
+class AsyncResourceListView(AsyncResourceMixin, AsyncAPIView):
+    """Список (keyset-пагинация, быстрая сериализация) и создание."""
+    create_service = None
+
+    async def get(self, request):
+        encoder = self.get_row_encoder()
+        paginator = KeysetPagination()
+        queryset = await self.aget_queryset()
+        page = await paginator.apaginate_queryset(queryset.values(*encoder.fields), request, self)
+        return paginator.get_paginated_response(encoder.encode_many(page)).data, status.HTTP_200_OK
+
+    async def post(self, request):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        instance = await self.create_service(request.user, serializer.validated_data)
+        return self.serializer_class(instance).data, status.HTTP_201_CREATED
+
+
+class AsyncResourceDetailView(AsyncResourceMixin, AsyncAPIView):
+    """Просмотр, изменение и удаление одной записи."""
+
+    async def get(self, request, pk):
+        encoder = self.get_row_encoder()
+        queryset = await self.aget_queryset()
+        row = await queryset.values(*encoder.fields).aget(pk=pk)
+        return encoder.encode(row), status.HTTP_200_OK
+
+    async def put(self, request, pk, partial=False):
+        queryset = await self.aget_queryset()
+        instance = await queryset.aget(pk=pk)
+        serializer = self.serializer_class(instance, data=request.data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        for attr, value in serializer.validated_data.items():
+            setattr(instance, attr, value)
+        await instance.asave()
+        return self.serializer_class(instance).data, status.HTTP_200_OK
+
+    async def patch(self, request, pk):
+        return await self.put(request, pk, partial=True)
+
+    async def delete(self, request, pk):
+        queryset = await self.aget_queryset()
+        instance = await queryset.aget(pk=pk)
+        await instance.adelete()
+        return None, status.HTTP_204_NO_CONTENT
+
+
+class AsyncOrderListView(AsyncResourceListView):
+    required_resource = 'orders'
+    serializer_class = OrderSerializer
+    queryset_service = staticmethod(services.get_orders)
+    create_service = staticmethod(services.acreate_order)
+
+
+class AsyncOrderDetailView(AsyncResourceDetailView):
+    required_resource = 'orders'
+    serializer_class = OrderSerializer
+    queryset_service = staticmethod(services.get_orders)
+
+
+class AsyncReportListView(AsyncResourceListView):
+    required_resource = 'reports'
+    owner_field = 'author'
+    serializer_class = ReportSerializer
+    queryset_service = staticmethod(services.get_reports)
+    create_service = staticmethod(services.acreate_report)
+
+
+class AsyncReportDetailView(AsyncResourceDetailView):
+    required_resource = 'reports'
+    owner_field = 'author'
+    serializer_class = ReportSerializer
+    queryset_service = staticmethod(services.get_reports)
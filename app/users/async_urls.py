@@ -0,0 +1,19 @@
+from django.urls import path
+
+from .async_api import (
+    AsyncLoginView, AsyncRegisterView, AsyncUserProfileView,
+    AsyncOrderListView, AsyncOrderDetailView,
+    AsyncReportListView, AsyncReportDetailView,
+)
+
+# Асинхронные варианты эндпоинтов (см. users/async_api.py)
+urlpatterns = [
+    path('auth/register/', AsyncRegisterView.as_view(), name='async_register'),
+    path('auth/login/', AsyncLoginView.as_view(), name='async_token_obtain_pair'),
+    path('profile/', AsyncUserProfileView.as_view(), name='async_profile'),
+
+    path('resources/orders/', AsyncOrderListView.as_view(), name='async_orders'),
+    path('resources/orders/<int:pk>/', AsyncOrderDetailView.as_view(), name='async_order_detail'),
+    path('resources/reports/', AsyncReportListView.as_view(), name='async_reports'),
+    path('resources/reports/<int:pk>/', AsyncReportDetailView.as_view(), name='async_report_detail'),
+]
@@ -0,0 +1,234 @@
+"""
+Журнал аудита: решения ``CustomRBACPermission`` (разрешено/запрещено),
+входы, неудачные входы и выходы.
+
+Событие не пишется в потоке запроса: ``record`` кладет кортеж в очередь
+процесса (``AUDIT_QUEUE_SIZE``), а фоновый поток забирает события пакетами
+(до ``AUDIT_BATCH_SIZE``, не реже раза в ``AUDIT_FLUSH_INTERVAL`` секунд) и
+записывает их одной вставкой в ``AuditEvent`` (``AUDIT_BACKEND=db``) или
+строками JSON в файл с ротацией по размеру (``file``). Если запись не
+успевает за потоком событий и очередь заполнена, действует
+``AUDIT_OVERFLOW``: ``drop`` — новое событие отбрасывается, ``drop_oldest``
+— вытесняется самое старое, ``block`` — запрос ждет места не дольше
+``AUDIT_BLOCK_TIMEOUT`` секунд (асинхронные представления не ждут).
+Отброшенные и не записанные из-за ошибки события учитываются в
+``/metrics`` (``audit_events_total``).
+
+Очередь и поток у каждого процесса свои; при завершении процесса
+оставшиеся события дописываются (``atexit``).
+"""
+import atexit
+import ipaddress
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+from rest_framework.throttling import BaseThrottle
+
+from .metrics import counter, gauge, registry
+from .models import AuditEvent
+
+logger = logging.getLogger(__name__)
+
+KIND_NAMES = {AuditEvent.DECISION: 'decision', AuditEvent.LOGIN: 'login',
+              AuditEvent.LOGIN_FAILED: 'login_failed', AuditEvent.LOGOUT: 'logout'}
+FIELDS = ('created_at', 'kind', 'user_id', 'resource', 'action', 'allowed', 'detail', 'ip')
+
+
+class AuditWriter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._handler = None
+        self._counts = Counter()
+
+    def record(self, kind, user_id=None, resource='', action='', allowed=None, detail='', ip=None, wait=True):
+        """Постановка события в очередь; ``wait=False`` — не ждать места даже при ``AUDIT_OVERFLOW=block``."""
+        if not settings.AUDIT_LOG:
+            return
+        event = (time.time(), kind, user_id, resource, action, allowed, detail[:255], ip)
+        events = self._queue or self._start()
+        try:
+            events.put_nowait(event)
+            return
+        except queue.Full:
+            pass
+        policy = settings.AUDIT_OVERFLOW
+        if policy == 'block' and wait:
+            try:
+                events.put(event, timeout=settings.AUDIT_BLOCK_TIMEOUT)
+                return
+            except queue.Full:
+                pass
+        elif policy == 'drop_oldest':
+            try:
+                events.get_nowait()
+                events.put_nowait(event)
+            except (queue.Empty, queue.Full):
+                pass
+        self._count('dropped')
+
+    def _start(self):
+        with self._lock:
+            if self._queue is None:
+                events = queue.Queue(settings.AUDIT_QUEUE_SIZE)
+                self._thread = threading.Thread(target=self._run, args=(events,), name='audit-writer', daemon=True)
+                self._thread.start()
+                self._queue = events
+            return self._queue
+
+    def _run(self, events):
+        while True:
+            batch, waiters = [], []
+            item = events.get()
+            deadline = time.monotonic() + settings.AUDIT_FLUSH_INTERVAL
+            while True:
+                if isinstance(item, threading.Event):
+                    # flush(): записать накопленное, не дожидаясь интервала.
+                    waiters.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= settings.AUDIT_BATCH_SIZE:
+                    break
+                try:
+                    item = events.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+            for waiter in waiters:
+                waiter.set()
+
+    def _write(self, batch):
+        try:
+            if settings.AUDIT_BACKEND == 'file':
+                self._write_file(batch)
+            else:
+                self._write_db(batch)
+        except Exception:
+            logger.exception('Не удалось записать %s событий аудита', len(batch))
+            self._count('failed', len(batch))
+            if settings.AUDIT_BACKEND != 'file':
+                connections['default'].close()
+        else:
+            self._count('written', len(batch))
+
+    @staticmethod
+    def _write_db(batch):
+        # Как в цикле запроса: соединение с истекшим CONN_MAX_AGE или разорванное заменяется.
+        close_old_connections()
+        AuditEvent.objects.bulk_create(
+            AuditEvent(**dict(zip(FIELDS, (datetime.fromtimestamp(event[0], timezone.utc), *event[1:]))))
+            for event in batch
+        )
+
+    def _write_file(self, batch):
+        if self._handler is None or self._handler.baseFilename != os.path.abspath(settings.AUDIT_FILE):
+            if self._handler is not None:
+                self._handler.close()
+            self._handler = RotatingFileHandler(
+                settings.AUDIT_FILE, maxBytes=settings.AUDIT_FILE_MAX_BYTES,
+                backupCount=settings.AUDIT_FILE_BACKUPS, encoding='utf-8',
+            )
+        lines = []
+        for created_at, kind, *rest in batch:
+            values = dict(zip(FIELDS[2:], rest))
+            values['created_at'] = datetime.fromtimestamp(created_at, timezone.utc).isoformat()
+            values['kind'] = KIND_NAMES[kind]
+            lines.append(json.dumps(values, ensure_ascii=False))
+        # Пакет — одна запись обработчика: ротация не разрывает его между файлами.
+        self._handler.emit(logging.makeLogRecord({'msg': '\n'.join(lines)}))
+
+    def flush(self, timeout=None):
+        """Ожидает записи событий, поставленных в очередь до вызова. ``False`` — не дождались."""
+        events = self._queue
+        if events is None:
+            return True
+        done = threading.Event()
+        try:
+            events.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def _count(self, result, count=1):
+        with self._lock:
+            self._counts[result] += count
+
+    def snapshot(self):
+        """Счетчики ``{(result,): число}`` для /metrics и текущая длина очереди."""
+        with self._lock:
+            counts = {(result,): count for result, count in self._counts.items()}
+        events = self._queue
+        return counts, events.qsize() if events is not None else 0
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+    def _after_fork(self):
+        # Поток не переживает fork (gunicorn --preload): дочерний процесс
+        # запускает свой. Блокировка могла быть захвачена в момент fork.
+        self._lock = threading.Lock()
+        self._queue = self._thread = self._handler = None
+        self._counts = Counter()
+
+
+audit_log = AuditWriter()
+
+
+@registry.register
+def collect_metrics(lines):
+    counts, queued = audit_log.snapshot()
+    counter(lines, 'audit_events_total', 'События аудита: записанные, отброшенные при переполнении очереди, с ошибкой записи.',
+            ('result',), counts)
+    gauge(lines, 'audit_queue_events', 'События аудита в очереди на запись.', queued)
+os.register_at_fork(after_in_child=audit_log._after_fork)
+atexit.register(audit_log.flush, 5)
+
+_ident = BaseThrottle()
+
+
+def client_ip(request):
+    """IP клиента с учетом ``NUM_PROXIES``, как в ограничении частоты; None, если это не адрес."""
+    ip = _ident.get_ident(request)
+    try:
+        return str(ipaddress.ip_address(ip))
+    except ValueError:
+        return None
+
+
+def decision(request, resource_name, action, allowed, wait=True):
+    if not settings.AUDIT_LOG:
+        return
+    user = request.user
+    audit_log.record(
+        AuditEvent.DECISION, user.pk if user and user.is_authenticated else None,
+        resource_name or '', action or '', allowed, request.path, client_ip(request), wait=wait,
+    )
+
+
+def login(request, user=None, email='', wait=True):
+    """Успешный (``user``) или неудачный (``email`` из запроса) вход."""
+    if not settings.AUDIT_LOG:
+        return
+    if user is not None:
+        audit_log.record(AuditEvent.LOGIN, user.pk, allowed=True, ip=client_ip(request), wait=wait)
+    else:
+        audit_log.record(AuditEvent.LOGIN_FAILED, allowed=False, detail=str(email or ''),
+                         ip=client_ip(request), wait=wait)
+
+
+def logout(request):
+    if not settings.AUDIT_LOG:
+        return
+    audit_log.record(AuditEvent.LOGOUT, request.user.pk, allowed=True, ip=client_ip(request))
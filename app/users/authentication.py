@@ -0,0 +1,104 @@
+"""
+Stateless JWT-аутентификация.
+
+Стандартный ``JWTAuthentication`` загружает строку ``User`` на каждый запрос
+ради проверки ``is_active``/``is_superuser``. ``StatelessJWTAuthentication``
+строит пользователя из claim'ов access-токена (см. ``users/tokens.py``):
+это настоящий экземпляр ``User`` с заполненными ``id``, ``is_superuser``,
+``is_staff``, ``is_active``, а остальные поля отложены и догружаются одним
+запросом при первом обращении. Токены, выпущенные до деактивации, удаления,
+смены пароля или флагов пользователя, отсекаются по списку отзыва в памяти
+процесса (``users/revocation.py``).
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .revocation import revoked_users
+from .tokens import CREDENTIALS_CLAIM, USER_FLAG_CLAIMS
+
+User = get_user_model()
+
+
+def user_from_claims(validated_token):
+    """Экземпляр ``User`` из claim'ов токена с отложенными остальными полями."""
+    claims = {'is_active': True}
+    for claim in USER_FLAG_CLAIMS:
+        claims[claim] = bool(validated_token[claim])
+    values = {'id': int(validated_token[api_settings.USER_ID_CLAIM]), **claims}
+    # from_db ожидает значения в порядке полей модели.
+    field_names = [f.attname for f in User._meta.concrete_fields if f.attname in values]
+    user = User.from_db(router.db_for_read(User), field_names, [values[name] for name in field_names])
+    user._token_claims = claims
+    return user
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    JWT-аутентификация без SELECT пользователя на каждый запрос.
+    Токены без claim'ов пользователя (выпущенные до включения режима)
+    обрабатываются как в ``JWTAuthentication``.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = int(validated_token[api_settings.USER_ID_CLAIM])
+        except (KeyError, TypeError, ValueError) as e:
+            raise InvalidToken(_('Token contained no recognizable user identification')) from e
+
+        if revoked_users.is_revoked(user_id, validated_token.get(CREDENTIALS_CLAIM, 0)):
+            raise AuthenticationFailed(_('Token has been revoked'), code='token_revoked')
+
+        if any(claim not in validated_token for claim in USER_FLAG_CLAIMS):
+            return super().get_user(validated_token)
+
+        return user_from_claims(validated_token)
+
+
+class AsyncJWTAuthentication(StatelessJWTAuthentication):
+    """
+    JWT-аутентификация для ASGI-представлений (``users/async_api.py``).
+    При ``JWT_STATELESS_AUTH`` пользователь строится из claim'ов, иначе
+    загружается через async ORM, как в ``JWTAuthentication``.
+    """
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_('Token contained no recognizable user identification')) from e
+
+        if settings.JWT_STATELESS_AUTH and all(claim in validated_token for claim in USER_FLAG_CLAIMS):
+            try:
+                user_id = int(user_id)
+            except (TypeError, ValueError) as e:
+                raise InvalidToken(_('Token contained no recognizable user identification')) from e
+            if await revoked_users.ais_revoked(user_id, validated_token.get(CREDENTIALS_CLAIM, 0)):
+                raise AuthenticationFailed(_('Token has been revoked'), code='token_revoked')
+            return user_from_claims(validated_token)
+
+        try:
+            user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found') from e
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        return user
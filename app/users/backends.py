@@ -0,0 +1,50 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from .hashing import hashing_pool
+
+UserModel = get_user_model()
+
+
+class PooledModelBackend(ModelBackend):
+    """
+    ModelBackend, проверяющий пароль в пуле хеширования (``users/hashing.py``).
+    Устаревший хеш (другой алгоритм или стоимость) обновляется в фоне после
+    успешного входа, а не синхронно в запросе, как в ``ModelBackend``.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Хешируем пароль и для несуществующего пользователя, чтобы время
+            # ответа не выдавало наличие учетной записи.
+            hashing_pool.make(password)
+            return None
+        is_correct, must_update = hashing_pool.verify(password, user.password)
+        if not is_correct or not self.user_can_authenticate(user):
+            return None
+        if must_update:
+            hashing_pool.rehash_later(user.pk, password, user.password)
+        return user
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = await UserModel._default_manager.aget_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            await hashing_pool.amake(password)
+            return None
+        is_correct, must_update = await hashing_pool.averify(password, user.password)
+        if not is_correct or not self.user_can_authenticate(user):
+            return None
+        if must_update:
+            hashing_pool.rehash_later(user.pk, password, user.password)
+        return user
@@ -0,0 +1,130 @@
+"""
+Кэш черного списка refresh-токенов.
+
+simplejwt проверяет черный список запросом к ``BlacklistedToken`` при каждом
+refresh/logout. Здесь каждый процесс держит фильтр Блума всех отозванных JTI
+(ответ "точно не отозван" без запроса к БД) и точный LRU-кэш недавно
+отозванных JTI. В БД идут только ложноположительные срабатывания фильтра.
+
+Новые отзывы распространяются между воркерами через журнал в общем кэше
+(``users/journal.py``); при потере записей фильтр перестраивается из БД.
+Кэш в памяти процесса при ``DEBUG=False`` отклоняет системная проверка
+``users.E001`` (``users/checks.py``).
+"""
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils import timezone
+
+from .journal import CacheJournal
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = max(int(capacity), 1)
+        self.size = max(int(-self.capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(int(round(self.size / self.capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class RevokedTokens:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bloom = None
+        self._recent = OrderedDict()
+        self._position = 0
+        self._journal = None
+
+    @property
+    def journal(self):
+        if self._journal is None:
+            lifetime = settings.SIMPLE_JWT['REFRESH_TOKEN_LIFETIME']
+            self._journal = CacheJournal('jwt:blacklist', int(lifetime.total_seconds()))
+        return self._journal
+
+    def _load(self):
+        from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+        position = self.journal.position()
+        jtis = list(
+            BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now())
+            .values_list('token__jti', flat=True)
+        )
+        capacity = getattr(settings, 'JWT_BLACKLIST_BLOOM_CAPACITY', 100000)
+        bloom = BloomFilter(max(capacity, len(jtis) * 2))
+        for jti in jtis:
+            bloom.add(jti)
+        self._bloom, self._position = bloom, position
+
+    def _sync(self):
+        with self._lock:
+            if self._bloom is None:
+                self._load()
+                return
+            position, jtis = self.journal.read(self._position)
+            if jtis is None or self._bloom.count + len(jtis) > self._bloom.capacity:
+                self._load()
+                return
+            for jti in jtis:
+                self._bloom.add(jti)
+            self._position = position
+
+    def _remember(self, jti):
+        recent = self._recent
+        recent[jti] = True
+        recent.move_to_end(jti)
+        while len(recent) > getattr(settings, 'JWT_BLACKLIST_LRU_SIZE', 10000):
+            recent.popitem(last=False)
+
+    def is_revoked(self, jti):
+        """Отозван ли токен. В типичном случае (не отозван) запроса к БД нет."""
+        from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+        self._sync()
+        if jti not in self._bloom:
+            return False
+        with self._lock:
+            if jti in self._recent:
+                self._recent.move_to_end(jti)
+                return True
+        revoked = BlacklistedToken.objects.filter(token__jti=jti).exists()
+        if revoked:
+            with self._lock:
+                self._remember(jti)
+        return revoked
+
+    def add(self, jti):
+        """Регистрирует отозванный токен во всех процессах."""
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(jti)
+            self._remember(jti)
+        self.journal.append(jti)
+
+    def reset(self):
+        with self._lock:
+            self._bloom = None
+            self._recent = OrderedDict()
+            self._position = 0
+
+
+revoked_tokens = RevokedTokens()
@@ -0,0 +1,40 @@
+"""
+Системные проверки конфигурации (``manage.py check``, запуск сервера).
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# Кэши, у которых каждый процесс видит только свои записи.
+PER_PROCESS_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+# Состояние, которое воркеры согласуют только через ``CACHES['default']``.
+SHARED_STATE = (
+    'отзыв refresh-токенов (users/blacklist.py)',
+    'версии коллекций для ETag (users/versions.py)',
+    'отзыв access-токенов при смене учетных данных (users/revocation.py)',
+    'кэш ответов профиля (users/profile_cache.py)',
+)
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    ``SHARED_STATE`` доходит до других воркеров только через общий кэш: с
+    кэшем в памяти процесса, например, токен, отозванный в одном воркере,
+    принимается остальными до перезапуска, а ETag не меняется после записи
+    через другой воркер.
+    """
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if settings.DEBUG or backend not in PER_PROCESS_CACHES:
+        return []
+    return [Error(
+        f'CACHES["default"] ({backend}) не разделяется между процессами, а через него '
+        f'воркеры согласуют {", ".join(SHARED_STATE)}.',
+        hint='Задайте REDIS_URL (общий Redis). Для единственного процесса проверку '
+             'можно отключить: SILENCED_SYSTEM_CHECKS = ["users.E001"].',
+        id='users.E001',
+    )]
@@ -0,0 +1,143 @@
+"""
+Быстрый путь сериализации для read-only эндпоинтов (list/retrieve).
+
+``RowEncoder`` компилируется один раз из обычного ``ModelSerializer``: по его
+полям строится функция, превращающая строку ``QuerySet.values()`` в словарь
+с теми же ключами, в том же порядке и с тем же форматированием значений
+(``Decimal`` -> строка, ``datetime`` -> ISO 8601 в текущем часовом поясе).
+Экземпляры моделей и пофилдовая сериализация DRF не создаются.
+
+Ответ рендерится ``FastJSONRenderer`` (``users/renderers.py``).
+"""
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .exports import format_datetime, format_decimal
+from .metrics import stage
+
+
+class UnsupportedField(Exception):
+    pass
+
+
+def _converter(field):
+    """Функция преобразования значения из .values() или None (значение как есть)."""
+    if isinstance(field, serializers.DecimalField):
+        coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+        if (
+            not coerce_to_string or field.localize or field.normalize_output
+            or field.rounding is not None or field.decimal_places is None
+        ):
+            raise UnsupportedField(field)
+        places = field.decimal_places
+        return lambda value: format_decimal(value, places)
+    if isinstance(field, serializers.DateTimeField):
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        if not isinstance(output_format, str) or output_format.lower() != ISO_8601 or hasattr(field, 'timezone'):
+            raise UnsupportedField(field)
+        return format_datetime
+    if isinstance(field, serializers.PrimaryKeyRelatedField):
+        if field.pk_field is not None:
+            raise UnsupportedField(field)
+        return None
+    if isinstance(field, (serializers.CharField, serializers.IntegerField, serializers.BooleanField)):
+        return None
+    raise UnsupportedField(field)
+
+
+def _getter(converter):
+    """Преобразователь ``(значение, часовой пояс)`` или None (значение как есть)."""
+    if converter is None or converter is format_datetime:
+        return converter
+
+    def convert(value, tz):
+        return converter(value) if value is not None else None
+    return convert
+
+
+class RowEncoder:
+    """
+    Кодировщик строк ``.values()`` для сериализатора, собранный один раз.
+    """
+
+    def __init__(self, serializer_class):
+        serializer = serializer_class()
+        columns = []
+        sources = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if '.' in field.source or field.source == '*':
+                raise UnsupportedField(field)
+            columns.append((name, field.source, _converter(field)))
+            if field.source not in sources:
+                sources.append(field.source)
+        self.fields = tuple(sources)
+        self._encode = self._compile(columns)
+
+    @staticmethod
+    def _compile(columns):
+        # Поля без преобразования копируются одним проходом по кортежу, а
+        # преобразователи получают значение и часовой пояс, определенный один
+        # раз на весь ответ, а не на строку.
+        getters = tuple((name, source, _getter(converter)) for name, source, converter in columns)
+
+        def encode(row, tz):
+            return {
+                name: row[source] if getter is None else getter(row[source], tz)
+                for name, source, getter in getters
+            }
+        return encode
+
+    def encode(self, row):
+        with stage('serialize'):
+            return self._encode(row, timezone.get_current_timezone())
+
+    def encode_many(self, rows):
+        if not isinstance(rows, list):
+            rows = list(rows)  # выборка из БД не входит во время сериализации
+        with stage('serialize'):
+            encode, tz = self._encode, timezone.get_current_timezone()
+            return [encode(row, tz) for row in rows]
+
+
+class FastReadMixin:
+    """
+    Быстрые list/retrieve для ModelViewSet: выборка через ``.values()`` и
+    кодирование ``RowEncoder``, скомпилированным из ``serializer_class``.
+    Отключается настройкой ``FAST_SERIALIZERS = False``.
+    """
+    _row_encoders = {}
+
+    def get_row_encoder(self):
+        serializer_class = self.get_serializer_class()
+        encoder = self._row_encoders.get(serializer_class)
+        if encoder is None:
+            encoder = self._row_encoders[serializer_class] = RowEncoder(serializer_class)
+        return encoder
+
+    def list(self, request, *args, **kwargs):
+        if not getattr(settings, 'FAST_SERIALIZERS', True):
+            return super().list(request, *args, **kwargs)
+        encoder = self.get_row_encoder()
+        queryset = self.filter_queryset(self.get_queryset())
+        # Аннотации фильтров (например, ранг поиска) остаются в строках для пагинации.
+        queryset = queryset.values(*encoder.fields, *queryset.query.annotations)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(encoder.encode_many(page))
+        return Response(encoder.encode_many(queryset))
+
+    def retrieve(self, request, *args, **kwargs):
+        if not getattr(settings, 'FAST_SERIALIZERS', True):
+            return super().retrieve(request, *args, **kwargs)
+        encoder = self.get_row_encoder()
+        queryset = self.filter_queryset(self.get_queryset()).values(*encoder.fields)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_object_or_404(queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        self.check_object_permissions(request, row)
+        return Response(encoder.encode(row))
@@ -0,0 +1,63 @@
+"""
+Ограничение записей областью прав (``PermissionRule.scope``).
+
+``CustomRBACPermission`` решает, разрешено ли действие с ресурсом; какие
+именно записи при этом доступны, определяет наибольшая область среди правил
+ролей пользователя, разрешающих это действие (``rbac.matrix.scope``, без
+запросов к БД в установившемся режиме):
+
+* ``OWN`` — свои записи: ``owner_id = <пользователь>``;
+* ``TEAM`` — записи участников команды пользователя: ``owner_id IN (SELECT id
+  FROM users_user WHERE team_id = (SELECT team_id ... WHERE id = <пользователь>))``
+  (свои — всегда); без команды — как ``OWN``;
+* ``ALL`` — все записи, без условия.
+
+Область превращается в одно условие того же запроса, поэтому список
+остается одним запросом при любом числе ролей и правил. Поле владельца —
+``owner_field`` представления.
+"""
+from django.db.models import Q
+from rest_framework.filters import BaseFilterBackend
+
+from . import rbac
+from .models import PermissionRule, User
+from .permissions import METHOD_ACTIONS
+
+
+def scope_filter(queryset, user, scope, owner_field='owner'):
+    """Записи ``queryset``, доступные ``user`` в области ``scope``."""
+    if scope == PermissionRule.ALL:
+        return queryset
+    own = Q(**{owner_field: user.pk})
+    if scope == PermissionRule.TEAM:
+        team = User.objects.filter(pk=user.pk).values('team_id')
+        members = User.objects.filter(team_id__in=team).values('pk')
+        return queryset.filter(own | Q(**{f'{owner_field}__in': members}))
+    if scope == PermissionRule.OWN:
+        return queryset.filter(own)
+    return queryset.none()
+
+
+def request_scope(request, view):
+    """Область для действия запроса (кэшируется в запросе)."""
+    scope = getattr(request, '_rbac_scope', None)
+    if scope is None:
+        user = request.user
+        action = METHOD_ACTIONS.get(request.method)
+        if user.is_superuser:
+            scope = PermissionRule.ALL
+        elif action is None:
+            scope = 0
+        else:
+            scope = rbac.matrix.scope(user.pk, view.required_resource, rbac.ACTION_BITS[action])
+        request._rbac_scope = scope
+    return scope
+
+
+class RBACScopeFilter(BaseFilterBackend):
+    """Условие области прав (см. модуль) для ``get_queryset`` представлений ресурсов."""
+
+    def filter_queryset(self, request, queryset, view):
+        return scope_filter(
+            queryset, request.user, request_scope(request, view), getattr(view, 'owner_field', 'owner')
+        )
@@ -0,0 +1,30 @@
+"""
+Хешеры паролей с настраиваемой стоимостью.
+
+Параметры берутся из настроек (``PASSWORD_ARGON2_*``, ``PASSWORD_PBKDF2_ITERATIONS``),
+поэтому стоимость можно подобрать под железо без изменения кода. Хеши,
+созданные с другими параметрами, помечаются ``must_update`` и обновляются
+после успешного входа (см. ``users/backends.py``).
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, PBKDF2PasswordHasher
+
+
+class TunableArgon2PasswordHasher(Argon2PasswordHasher):
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_ARGON2_PARALLELISM
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS
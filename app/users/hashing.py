@@ -0,0 +1,188 @@
+"""
+Ограниченный пул для хеширования и проверки паролей.
+
+Хеширование пароля — самая дорогая часть логина и регистрации. Пул
+ограничивает число одновременных вычислений хеша (``PASSWORD_HASHING_WORKERS``
+плюс очередь ``PASSWORD_HASHING_QUEUE_SIZE``): при всплеске логинов лишние
+запросы не занимают CPU, а ждут слот не дольше ``PASSWORD_HASHING_QUEUE_TIMEOUT``
+секунд и получают 503. Режим ``PASSWORD_HASHING_POOL``:
+
+* ``thread`` — потоки; argon2 и PBKDF2 (hashlib) отпускают GIL, поэтому
+  вычисления идут параллельно на всех ядрах;
+* ``process`` — процессы, для хешеров на чистом Python;
+* пустая строка — без пула, в потоке запроса.
+
+Для ASGI-представлений есть async-варианты (``averify``, ``amake``).
+
+Обновление устаревших хешей после входа выполняется в отдельном фоновом
+потоке и не задерживает ответ.
+"""
+import asyncio
+import logging
+import os
+import threading
+from concurrent import futures
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.db import connections
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordHashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _('Сервер перегружен, повторите попытку позже.')
+    default_code = 'password_hashing_busy'
+
+
+def _init_process():
+    import django
+
+    django.setup()
+
+
+def _verify(password, encoded):
+    return hashers.verify_password(password, encoded)
+
+
+def _make(password):
+    return hashers.make_password(password)
+
+
+class HashingPool:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._config = None
+        self._slots = None
+        self._background = None
+        self._pending = set()
+
+    def _get_pool(self):
+        mode = settings.PASSWORD_HASHING_POOL
+        if mode not in ('thread', 'process'):
+            return None
+        workers = settings.PASSWORD_HASHING_WORKERS or os.cpu_count() or 1
+        config = (mode, workers, settings.PASSWORD_HASHING_QUEUE_SIZE)
+        with self._lock:
+            if self._config != config:
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                if mode == 'process':
+                    self._executor = ProcessPoolExecutor(workers, initializer=_init_process)
+                else:
+                    self._executor = ThreadPoolExecutor(workers, thread_name_prefix='password-hashing')
+                self._slots = threading.BoundedSemaphore(workers + settings.PASSWORD_HASHING_QUEUE_SIZE)
+                self._config = config
+            return self._executor, self._slots
+
+    def run(self, func, *args):
+        pool = self._get_pool()
+        if pool is None:
+            return func(*args)
+        executor, slots = pool
+        if not slots.acquire(timeout=settings.PASSWORD_HASHING_QUEUE_TIMEOUT):
+            raise PasswordHashingBusy()
+        try:
+            return executor.submit(func, *args).result()
+        finally:
+            slots.release()
+
+    async def arun(self, func, *args):
+        """``run`` для async-кода: event loop не блокируется ни ожиданием слота, ни хешированием."""
+        pool = self._get_pool()
+        if pool is None:
+            return await sync_to_async(func, thread_sensitive=False)(*args)
+        executor, slots = pool
+        if not slots.acquire(blocking=False):
+            await self._await_slot(slots)
+        try:
+            future = executor.submit(func, *args)
+        except BaseException:
+            slots.release()
+            raise
+        # Слот освобождается по завершении вычисления, а не корутины: при отмене
+        # запроса уже начатое хеширование продолжает занимать его до конца.
+        future.add_done_callback(lambda _: slots.release())
+        return await asyncio.wrap_future(future)
+
+    @staticmethod
+    async def _await_slot(slots):
+        waiting = asyncio.ensure_future(asyncio.to_thread(slots.acquire, timeout=settings.PASSWORD_HASHING_QUEUE_TIMEOUT))
+        try:
+            acquired = await asyncio.shield(waiting)
+        except asyncio.CancelledError:
+            # Поток ожидания не прерывается: слот, полученный им после отмены, возвращается.
+            def release(task):
+                if not task.cancelled() and task.result():
+                    slots.release()
+            waiting.add_done_callback(release)
+            raise
+        if not acquired:
+            raise PasswordHashingBusy()
+
+    def verify(self, password, encoded):
+        """``(пароль верен, хеш нужно обновить)``, см. ``django.contrib.auth.hashers.verify_password``."""
+        return self.run(_verify, password, encoded)
+
+    def make(self, password):
+        return self.run(_make, password)
+
+    async def averify(self, password, encoded):
+        return await self.arun(_verify, password, encoded)
+
+    async def amake(self, password):
+        return await self.arun(_make, password)
+
+    def rehash_later(self, user_id, password, encoded):
+        """
+        Пересчитывает хеш пароля в фоне. Хеш сохраняется, только если пароль
+        пользователя не изменился за это время. Если очередь переполнена,
+        обновление пропускается и произойдет при следующем входе.
+        """
+        with self._lock:
+            if len(self._pending) >= settings.PASSWORD_REHASH_QUEUE_SIZE:
+                return None
+            if self._background is None:
+                self._background = ThreadPoolExecutor(1, thread_name_prefix='password-rehash')
+            future = self._background.submit(self._rehash, user_id, password, encoded)
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            self._pending.discard(future)
+
+    def _rehash(self, user_id, password, encoded):
+        from .models import User
+
+        try:
+            User.objects.filter(pk=user_id, password=encoded).update(password=self.make(password))
+        except Exception:
+            logger.exception('Не удалось обновить хеш пароля пользователя %s', user_id)
+        finally:
+            connections.close_all()
+
+    def join(self, timeout=None):
+        """Ожидает завершения отложенных обновлений хешей."""
+        with self._lock:
+            pending = list(self._pending)
+        futures.wait(pending, timeout=timeout)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executors = [self._executor, self._background]
+            self._executor = self._background = self._config = None
+        for executor in executors:
+            if executor is not None:
+                executor.shutdown(wait=wait)
+
+
+hashing_pool = HashingPool()
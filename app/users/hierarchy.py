@@ -0,0 +1,184 @@
+"""
+Наследование ролей: поддержка замыкания ``RoleClosure``.
+
+Ребро ``parent -> child`` (``child.parents``) дает ``child`` права ``parent``.
+Граф — ациклический (ребро, замыкающее цикл, отклоняется), у роли может быть
+несколько родителей. Для каждой пары (предок, потомок) хранится число путей
+между ними: добавление ребра ``p -> c`` добавляет ко всем парам
+``(предок p или p, потомок c или c)`` произведение чисел путей, удаление —
+вычитает его; пары с нулем путей удаляются. Ни один из путей до ``p`` и от
+``c`` не проходит через само ребро (иначе был бы цикл), поэтому вклад
+вычисляется одинаково до и после изменения.
+
+Роли пользователя вместе с унаследованными выбираются одним запросом по
+индексу (``effective_role_ids``, для нескольких пользователей —
+``effective_role_pairs``), без рекурсии. Изменения ребер
+(``m2m_changed`` для ``Role.parents``, удаление роли) обрабатываются в
+``users/signals.py``. Проверка цикла и изменение замыкания читают граф
+целиком, поэтому изменения графа сериализуются блокировкой ``lock`` до конца
+транзакции: иначе две транзакции, добавляющие ``A -> B`` и ``B -> A``, обе
+прошли бы проверку.
+"""
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
+
+from .models import Role, RoleClosure, User
+
+
+# Ключ advisory-блокировки графа наследования на PostgreSQL.
+LOCK_KEY = 0x726f6c6573  # 'roles'
+
+
+def lock(using=None):
+    """
+    Блокировка изменений графа до конца текущей транзакции. PostgreSQL —
+    advisory-блокировка, другие СУБД с ``SELECT ... FOR UPDATE`` — строки
+    всех ролей; SQLite и так допускает одну пишущую транзакцию.
+    """
+    using = using or router.db_for_write(RoleClosure)
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [LOCK_KEY])
+    elif connection.features.has_select_for_update:
+        list(Role.objects.using(using).select_for_update().order_by('pk').values_list('pk', flat=True))
+
+
+def edges(instance, reverse, pk_set):
+    """Ребра ``(parent_id, child_id)`` из аргументов ``m2m_changed``."""
+    if reverse:
+        return [(instance.pk, child_id) for child_id in pk_set]
+    return [(parent_id, instance.pk) for parent_id in pk_set]
+
+
+def creates_cycle(parent_id, child_id):
+    """Замкнет ли ребро ``parent -> child`` цикл (``child`` — уже предок ``parent``)."""
+    return parent_id == child_id or RoleClosure.objects.filter(
+        ancestor_id=child_id, descendant_id=parent_id
+    ).exists()
+
+
+def check_edges(pairs):
+    for parent_id, child_id in pairs:
+        if creates_cycle(parent_id, child_id):
+            names = dict(Role.objects.filter(pk__in=[parent_id, child_id]).values_list('pk', 'name'))
+            raise ValidationError(
+                'Роль %(child)s уже является предком роли %(parent)s: наследование не может быть циклическим.',
+                code='cycle', params={'parent': names.get(parent_id, parent_id), 'child': names.get(child_id, child_id)},
+            )
+
+
+def _contribution(parent_id, child_id):
+    """Пути, проходящие через ребро: ``{(предок, потомок): число путей}``."""
+    ups = dict(RoleClosure.objects.filter(descendant_id=parent_id).values_list('ancestor_id', 'paths'))
+    ups[parent_id] = 1
+    downs = dict(RoleClosure.objects.filter(ancestor_id=child_id).values_list('descendant_id', 'paths'))
+    downs[child_id] = 1
+    return {
+        (ancestor, descendant): up * down
+        for ancestor, up in ups.items() for descendant, down in downs.items()
+    }
+
+
+def _apply(delta, sign):
+    ancestors = {ancestor for ancestor, _ in delta}
+    descendants = {descendant for _, descendant in delta}
+    existing = {
+        (row.ancestor_id, row.descendant_id): row
+        for row in RoleClosure.objects.select_for_update().filter(
+            ancestor_id__in=ancestors, descendant_id__in=descendants
+        )
+    }
+    created, updated, removed = [], [], []
+    for (ancestor, descendant), paths in delta.items():
+        row = existing.get((ancestor, descendant))
+        if row is None:
+            if sign > 0:
+                created.append(RoleClosure(ancestor_id=ancestor, descendant_id=descendant, paths=paths))
+            continue
+        row.paths += sign * paths
+        (updated if row.paths > 0 else removed).append(row)
+    RoleClosure.objects.bulk_create(created)
+    RoleClosure.objects.bulk_update(updated, ['paths'])
+    RoleClosure.objects.filter(pk__in=[row.pk for row in removed]).delete()
+
+
+@transaction.atomic
+def add_edges(pairs):
+    """Учет добавленных ребер в замыкании (ребра уже записаны)."""
+    for parent_id, child_id in pairs:
+        _apply(_contribution(parent_id, child_id), 1)
+
+
+@transaction.atomic
+def remove_edges(pairs):
+    """Учет удаленных ребер."""
+    for parent_id, child_id in pairs:
+        _apply(_contribution(parent_id, child_id), -1)
+
+
+def effective_role_ids(user_id):
+    """Id ролей пользователя и всех унаследованных ими — одним запросом."""
+    assigned = User.roles.through.objects.filter(user_id=user_id).values_list('role_id', flat=True)
+    inherited = RoleClosure.objects.filter(descendant_id__in=assigned).values_list('ancestor_id', flat=True)
+    return assigned.union(inherited)
+
+
+def effective_role_pairs(user_ids):
+    """Пары ``(user_id, role_id)`` для нескольких пользователей — одним запросом."""
+    assigned = User.roles.through.objects.filter(user_id__in=user_ids).values_list('user_id', 'role_id')
+    inherited = RoleClosure.objects.filter(descendant__users__in=user_ids).values_list('descendant__users', 'ancestor_id')
+    return assigned.union(inherited)
+
+
+def expected():
+    """Замыкание, вычисленное заново по ребрам: ``{(предок, потомок): число путей}``."""
+    parents, children = {}, {}
+    for parent_id, child_id in Role.parents.through.objects.values_list('to_role_id', 'from_role_id'):
+        parents.setdefault(child_id, []).append(parent_id)
+        children.setdefault(parent_id, []).append(child_id)
+
+    # Обход в топологическом порядке: число путей до предков роли — сумма по ее родителям.
+    waiting = {role_id: len(role_parents) for role_id, role_parents in parents.items()}
+    ready = [role_id for role_id in children if role_id not in parents]
+    ancestors = {}
+    while ready:
+        role_id = ready.pop()
+        counts = {}
+        for parent_id in parents.get(role_id, ()):
+            counts[parent_id] = counts.get(parent_id, 0) + 1
+            for ancestor, paths in ancestors[parent_id].items():
+                counts[ancestor] = counts.get(ancestor, 0) + paths
+        ancestors[role_id] = counts
+        for child_id in children.get(role_id, ()):
+            waiting[child_id] -= 1
+            if not waiting[child_id]:
+                ready.append(child_id)
+
+    return {
+        (ancestor, role_id): paths
+        for role_id, counts in ancestors.items() for ancestor, paths in counts.items()
+    }
+
+
+@transaction.atomic
+def rebuild(dry_run=False):
+    """
+    Сверка замыкания с ребрами и (если не ``dry_run``) замена расходящихся
+    строк. Возвращает число расходящихся пар.
+    """
+    if not dry_run:
+        lock()
+    actual = dict(
+        ((ancestor, descendant), paths)
+        for ancestor, descendant, paths in RoleClosure.objects.values_list('ancestor_id', 'descendant_id', 'paths')
+    )
+    wanted = expected()
+    stale = {pair for pair in actual.keys() | wanted.keys() if actual.get(pair) != wanted.get(pair)}
+    if stale and not dry_run:
+        RoleClosure.objects.all().delete()
+        RoleClosure.objects.bulk_create(
+            RoleClosure(ancestor_id=ancestor, descendant_id=descendant, paths=paths)
+            for (ancestor, descendant), paths in wanted.items()
+        )
+    return len(stale)
@@ -0,0 +1,62 @@
+"""
+Журнал событий в общем кэше Django.
+
+Используется для синхронизации процессных структур (список отозванных
+пользователей, фильтр отозванных токенов) между воркерами: запись получает
+последовательный номер, а каждый процесс дочитывает записи после последнего
+увиденного номера. Если записи вытеснены из кэша или отставание слишком
+велико, читатель получает ``None`` и должен перезагрузить состояние из БД.
+"""
+from django.core.cache import cache
+
+MAX_CATCH_UP = 1000
+
+
+class CacheJournal:
+    def __init__(self, prefix, timeout):
+        self.prefix = prefix
+        self.seq_key = f'{prefix}:seq'
+        self.timeout = timeout
+
+    def _entry_key(self, seq):
+        return f'{self.prefix}:{seq}'
+
+    def append(self, value):
+        """Добавляет запись и возвращает ее номер."""
+        try:
+            seq = cache.incr(self.seq_key)
+        except ValueError:
+            cache.add(self.seq_key, 0, None)
+            seq = cache.incr(self.seq_key)
+        cache.set(self._entry_key(seq), value, self.timeout)
+        return seq
+
+    def position(self):
+        """Текущий номер последней записи."""
+        return cache.get(self.seq_key) or 0
+
+    def read(self, since):
+        """
+        Возвращает ``(position, values)`` — записи после номера ``since``.
+        ``values`` равно ``None``, если записи потеряны и нужна полная перезагрузка.
+        """
+        seq = self.position()
+        if seq == since:
+            return since, []
+        if seq < since or seq - since > MAX_CATCH_UP:
+            return seq, None
+
+        keys = [self._entry_key(n) for n in range(since + 1, seq + 1)]
+        found = cache.get_many(keys)
+        values = []
+        position = since
+        for n, key in enumerate(keys, start=since + 1):
+            if key not in found:
+                break
+            values.append(found[key])
+            position = n
+        if position < seq and any(key in found for key in keys[position - since:]):
+            # Пропуск в середине журнала: запись вытеснена из кэша.
+            return seq, None
+        # Хвостовые записи могут быть еще не записаны (номер выдан, значение нет).
+        return position, values
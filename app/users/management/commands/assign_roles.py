@@ -0,0 +1,46 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users import rbac_batch
+from users.models import Role, User
+
+
+class Command(BaseCommand):
+    help = 'Назначает (или снимает с --revoke) роли пользователям из файла пакетными запросами'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--role', action='append', required=True, help='Название роли (можно несколько раз)')
+        parser.add_argument('--users-file', required=True,
+                            help='Файл с email или id пользователей, по одному в строке ("-" — stdin)')
+        parser.add_argument('--revoke', action='store_true', help='Снять роли вместо назначения')
+        parser.add_argument('--batch-size', type=int, default=None, help='Строк за один запрос')
+
+    def handle(self, *args, **options):
+        roles = dict(Role.objects.filter(name__in=options['role']).values_list('name', 'pk'))
+        missing = sorted(set(options['role']) - roles.keys())
+        if missing:
+            raise CommandError(f"Неизвестные роли: {', '.join(missing)}")
+
+        stream = sys.stdin if options['users_file'] == '-' else open(options['users_file'], encoding='utf-8')
+        with stream:
+            lines = [line.strip() for line in stream if line.strip()]
+        ids = {int(line) for line in lines if line.isdigit()}
+        emails = [line for line in lines if not line.isdigit()]
+        for start in range(0, len(emails), 1000):
+            chunk = emails[start:start + 1000]
+            found = dict(User.objects.filter(email__in=chunk).values_list('email', 'pk'))
+            unknown = [email for email in chunk if email not in found]
+            if unknown:
+                raise CommandError(f"Неизвестные пользователи: {', '.join(unknown[:20])}")
+            ids.update(found.values())
+        unknown = rbac_batch.unknown_ids(User, ids)
+        if unknown:
+            raise CommandError(f"Неизвестные пользователи: {', '.join(map(str, unknown[:20]))}")
+
+        if options['revoke']:
+            count = rbac_batch.revoke_roles(ids, roles.values(), batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Снято назначений: {count} (пользователей: {len(ids)})'))
+        else:
+            count = rbac_batch.assign_roles(ids, roles.values(), batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Новых назначений: {count} (пользователей: {len(ids)})'))
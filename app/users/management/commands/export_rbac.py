@@ -0,0 +1,23 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from users import rbac_batch
+
+
+class Command(BaseCommand):
+    help = 'Выгружает роли, ресурсы и правила доступа документом JSON или YAML'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=('json', 'yaml'), default='json')
+        parser.add_argument('-o', '--output', help='Файл (по умолчанию stdout)')
+
+    def handle(self, *args, **options):
+        try:
+            text = rbac_batch.dumps(rbac_batch.export_document(), options['format'])
+        except ImproperlyConfigured as exc:
+            raise CommandError(str(exc))
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                output.write(text)
+        else:
+            self.stdout.write(text, ending='')
@@ -0,0 +1,257 @@
+"""
+Генерация больших объемов синтетических данных для нагрузочного тестирования.
+
+Пользователи разбиваются на пакеты по ``--batch-size``; каждый пакет
+(пользователи, их роли, заказы и отчеты) вставляется одной транзакцией в
+отдельном процессе (``--workers``). На PostgreSQL строки загружаются через
+``COPY ... FROM STDIN``, на других СУБД — пакетным INSERT (``executemany``).
+
+Данные детерминированы: значения пользователя с номером ``i`` порождаются
+генератором, инициализированным ``(seed, i)``, и не зависят от размера
+пакетов и числа процессов (даты — при фиксированном ``--end-date``).
+Пароль хешируется один раз и одинаков у всех пользователей. Роль
+``Role 0`` имеет все права на все ресурсы и всегда назначается первому
+пользователю. Агрегаты заказов (``OrderRollup``) вычисляются при генерации
+и записываются вместе с заказами.
+"""
+import io
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, time as dt_time, timedelta, timezone as dt_timezone
+from multiprocessing import get_context
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from users import rbac
+from users.models import Order, OrderRollup, PermissionRule, Report, Resource, Role, User
+
+ITEMS = ('Ноутбук', 'Монитор', 'Клавиатура', 'Мышь', 'Принтер', 'Сервер', 'Кабель', 'Лицензия', 'Стол', 'Кресло')
+WORDS = ('продажи', 'выручка', 'склад', 'клиенты', 'квартал', 'план', 'расходы', 'отгрузка', 'доставка', 'маржа')
+REPORT_CODES = 200_000
+
+
+def _columns(model, names):
+    return model._meta.db_table, [model._meta.get_field(name).column for name in names]
+
+
+USER_COLUMNS = ('id', 'password', 'is_superuser', 'email', 'first_name', 'last_name', 'middle_name', 'is_active', 'is_staff')
+ORDER_COLUMNS = ('item', 'price', 'created_at', 'updated_at', 'owner')
+REPORT_COLUMNS = ('title', 'content', 'created_at', 'updated_at', 'author')
+ROLLUP_COLUMNS = ('owner', 'granularity', 'period_start', 'orders_count', 'total_price')
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if value is True:
+        return 't'
+    if value is False:
+        return 'f'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def _write_rows(table, columns, rows):
+    """Вставка строк в таблицу: COPY на PostgreSQL, executemany на остальных СУБД."""
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            buffer = io.StringIO()
+            for row in rows:
+                buffer.write('\t'.join(map(_copy_value, row)))
+                buffer.write('\n')
+            buffer.seek(0)
+            sql = f'COPY {table} ({", ".join(columns)}) FROM STDIN'
+            raw = cursor.cursor
+            if hasattr(raw, 'copy_expert'):  # psycopg2
+                raw.copy_expert(sql, buffer)
+            else:  # psycopg 3
+                with raw.copy(sql) as copy:
+                    copy.write(buffer.getvalue())
+            return
+        placeholders = ', '.join(['%s'] * len(columns))
+        cursor.executemany(f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({placeholders})', rows)
+
+
+def _datetime_formatter():
+    """
+    Дата в виде, готовом к вставке без адаптации Django: ISO 8601 с
+    часовым поясом для PostgreSQL, наивное UTC-время для остальных СУБД
+    (как ``DatabaseOperations.adapt_datetimefield_value``).
+    """
+    if connection.vendor == 'postgresql':
+        return datetime.isoformat
+    return lambda value: str(value.replace(tzinfo=None))
+
+
+def _load_chunk(task):
+    """Пакет пользователей ``[first, first + count)`` со всеми их записями."""
+    first, count, base_id, options, password, role_ids, now = task
+    seed = options['seed']
+    domain = options['email_domain']
+    horizon = options['days'] * 86400
+    as_db_datetime = _datetime_formatter()
+    tz = timezone.get_default_timezone()
+    users, assignments, orders, reports, rollups = [], [], [], [], []
+
+    for index in range(first, first + count):
+        rng = random.Random(seed * 1_000_003 + index)
+        draw = rng.random
+        user_id = base_id + index
+        users.append((
+            user_id, password, False, f'user{index}@{domain}',
+            f'Имя{index}', f'Фамилия{index}', '', True, False,
+        ))
+        if index == 0:
+            roles = role_ids[:1]
+        else:
+            roles = rng.sample(role_ids, min(len(role_ids), rng.randint(1, options['roles_per_user'])))
+        assignments.extend((user_id, role_id) for role_id in roles)
+        days = {}
+        for _ in range(options['orders_per_user']):
+            cents = 100 + int(draw() * 9_999_900)
+            item = f'{ITEMS[int(draw() * len(ITEMS))]} {1 + int(draw() * 100_000)}'
+            created_at = now - timedelta(seconds=int(draw() * horizon))
+            created = as_db_datetime(created_at)
+            orders.append((item, f'{cents // 100}.{cents % 100:02d}', created, created, user_id))
+            day = created_at.astimezone(tz).date()
+            day_orders, total = days.get(day, (0, 0))
+            days[day] = (day_orders + 1, total + cents)
+        rollups.extend(_rollup_rows(user_id, days))
+        for _ in range(options['reports_per_user']):
+            words = rng.choices(WORDS, k=rng.randint(5, 60))
+            # Редкое слово: для поиска с избирательным запросом (в среднем 5 отчетов на 1M).
+            words.insert(rng.randrange(len(words)), f'код{rng.randrange(REPORT_CODES)}')
+            created = as_db_datetime(now - timedelta(seconds=int(draw() * horizon)))
+            reports.append((f'Отчет: {" ".join(words[:3])}', ' '.join(words), created, created, user_id))
+
+    through = User.roles.through
+    with transaction.atomic():
+        _write_rows(*_columns(User, USER_COLUMNS), users)
+        _write_rows(*_columns(through, ('user', 'role')), assignments)
+        _write_rows(*_columns(Order, ORDER_COLUMNS), orders)
+        _write_rows(*_columns(Report, REPORT_COLUMNS), reports)
+        _write_rows(*_columns(OrderRollup, ROLLUP_COLUMNS), rollups)
+    return len(users), len(assignments), len(orders), len(reports)
+
+
+def _rollup_rows(user_id, days):
+    """Строки OrderRollup по дням и месяцам из ``{день: (заказов, сумма в копейках)}``."""
+    months = {}
+    for day, (count, cents) in sorted(days.items()):
+        month = day.replace(day=1)
+        month_count, month_cents = months.get(month, (0, 0))
+        months[month] = (month_count + count, month_cents + cents)
+    for granularity, periods in ((OrderRollup.DAY, days), (OrderRollup.MONTH, months)):
+        for start, (count, cents) in periods.items():
+            yield user_id, granularity, start.isoformat(), count, f'{cents // 100}.{cents % 100:02d}'
+
+
+class Command(BaseCommand):
+    help = 'Генерирует большой детерминированный набор пользователей, ролей, правил, заказов и отчетов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000, help='Число пользователей')
+        parser.add_argument('--roles', type=int, default=20, help='Число ролей')
+        parser.add_argument('--resources', type=int, default=0, help='Дополнительные ресурсы помимо orders и reports')
+        parser.add_argument('--roles-per-user', type=int, default=2, help='Максимум ролей у пользователя')
+        parser.add_argument('--orders-per-user', type=int, default=10, help='Заказов на пользователя')
+        parser.add_argument('--reports-per-user', type=int, default=1, help='Отчетов на пользователя')
+        parser.add_argument('--days', type=int, default=365, help='Период дат создания записей, дней до --end-date')
+        parser.add_argument('--end-date', type=date.fromisoformat, default=None,
+                            help='Конец периода дат (YYYY-MM-DD, по умолчанию сегодня); задайте для воспроизводимых данных')
+        parser.add_argument('--seed', type=int, default=42, help='Инициализация генератора случайных чисел')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Пользователей в одной транзакции')
+        parser.add_argument('--workers', type=int, default=1, help='Число параллельных процессов')
+        parser.add_argument('--password', default='password', help='Пароль всех пользователей')
+        parser.add_argument('--email-domain', default='load.test', help='Домен email: user<N>@<домен>')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['roles'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--users, --roles и --batch-size должны быть положительными')
+        domain = options['email_domain']
+        if User.objects.filter(email=f'user0@{domain}').exists():
+            raise CommandError(f'Данные для домена {domain} уже созданы: укажите другой --email-domain')
+
+        workers = max(options['workers'], 1)
+        if workers > 1 and connection.vendor == 'sqlite':
+            self.stdout.write('SQLite не поддерживает параллельную запись: используется один процесс')
+            workers = 1
+
+        started = time.perf_counter()
+        role_ids = self.create_rbac(options)
+        password = make_password(options['password'])
+        base_id = (User.objects.aggregate(max_id=Max('id'))['max_id'] or 0) + 1
+        end_date = options['end_date'] or datetime.now(dt_timezone.utc).date()
+        now = datetime.combine(end_date, dt_time.min, tzinfo=dt_timezone.utc)
+        params = {name: options[name] for name in (
+            'seed', 'email_domain', 'days', 'roles_per_user', 'orders_per_user', 'reports_per_user',
+        )}
+        tasks = [
+            (first, min(options['batch_size'], options['users'] - first), base_id, params, password, role_ids, now)
+            for first in range(0, options['users'], options['batch_size'])
+        ]
+
+        totals = [0, 0, 0, 0]
+        if workers == 1:
+            for done, task in enumerate(tasks, start=1):
+                self.report_progress(totals, _load_chunk(task), done, len(tasks), started)
+        else:
+            # Дочерние процессы открывают собственные соединения с БД.
+            connections.close_all()
+            with ProcessPoolExecutor(workers, mp_context=get_context('fork')) as executor:
+                futures = [executor.submit(_load_chunk, task) for task in tasks]
+                for done, future in enumerate(as_completed(futures), start=1):
+                    self.report_progress(totals, future.result(), done, len(tasks), started)
+
+        if connection.vendor == 'postgresql':
+            # Пользователи вставлены с явными id: сдвигаем последовательность.
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(no_style(), [User]):
+                    cursor.execute(sql)
+        rbac.invalidate()
+
+        users, assignments, orders, reports = totals
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: пользователей {users}, назначений ролей {assignments}, заказов {orders}, '
+            f'отчетов {reports} за {time.perf_counter() - started:.1f} с'
+        ))
+
+    def create_rbac(self, options):
+        """Ресурсы, роли и правила доступа (немного строк, обычный bulk_create)."""
+        rng = random.Random(options['seed'])
+        names = ['orders', 'reports'] + [f'resource_{i}' for i in range(options['resources'])]
+        Resource.objects.bulk_create([Resource(name=name) for name in names], ignore_conflicts=True)
+        resources = list(Resource.objects.filter(name__in=names).order_by('name'))
+
+        role_names = [f'Role {i}' for i in range(options['roles'])]
+        Role.objects.bulk_create([Role(name=name) for name in role_names], ignore_conflicts=True)
+        roles = {role.name: role for role in Role.objects.filter(name__in=role_names)}
+        rules = []
+        for index, name in enumerate(role_names):
+            for resource in resources:
+                full = index == 0
+                rules.append(PermissionRule(
+                    role=roles[name], resource=resource,
+                    can_read=full or rng.random() < 0.9,
+                    can_create=full or rng.random() < 0.5,
+                    can_update=full or rng.random() < 0.3,
+                    can_delete=full or rng.random() < 0.1,
+                ))
+        PermissionRule.objects.bulk_create(rules, ignore_conflicts=True)
+        return [roles[name].pk for name in role_names]
+
+    def report_progress(self, totals, counts, done, total, started):
+        for position, count in enumerate(counts):
+            totals[position] += count
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'[{done}/{total}] пользователей {totals[0]}, заказов {totals[2]} '
+            f'({totals[0] / elapsed:.0f} польз./с, {totals[2] / elapsed:.0f} заказов/с)'
+        )
@@ -0,0 +1,34 @@
+import sys
+
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from users import rbac_batch
+
+
+class Command(BaseCommand):
+    help = 'Приводит роли, ресурсы и правила доступа к документу JSON или YAML (одна транзакция)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл документа ("-" — stdin)')
+        parser.add_argument('--format', choices=('json', 'yaml'),
+                            help='Формат (по умолчанию по расширению файла, иначе json)')
+        parser.add_argument('--prune', action='store_true', help='Удалить роли и ресурсы, которых нет в документе')
+        parser.add_argument('--dry-run', action='store_true', help='Только подсчитать изменения')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('yaml' if path.endswith(('.yaml', '.yml')) else 'json')
+        stream = sys.stdin if path == '-' else open(path, encoding='utf-8')
+        try:
+            with stream:
+                document = rbac_batch.loads(stream.read(), fmt)
+            changes = rbac_batch.import_document(document, prune=options['prune'], dry_run=options['dry_run'])
+        except (ImproperlyConfigured, ValueError) as exc:
+            raise CommandError(str(exc))
+        except ValidationError as exc:
+            raise CommandError('\n'.join(exc.messages))
+
+        summary = ', '.join(f'{name}: {count}' for name, count in changes.items() if count) or 'изменений нет'
+        prefix = 'Будет изменено' if options['dry_run'] else 'Изменено'
+        self.stdout.write(self.style.SUCCESS(f'{prefix}: {summary}'))
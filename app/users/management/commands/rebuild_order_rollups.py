@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from users import rollups
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Сверяет агрегаты заказов (OrderRollup) с заказами и пересоздает расходящиеся'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Владельцев за одну транзакцию')
+        parser.add_argument('--check', action='store_true',
+                            help='Только сверка: ненулевой код возврата при расхождениях, без изменений')
+
+    def handle(self, *args, **options):
+        batch_size = max(options['batch_size'], 1)
+        last_id = 0
+        owners = stale = 0
+
+        while True:
+            ids = list(User.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            stale += rollups.rebuild(ids, dry_run=options['check'])
+            owners += len(ids)
+            last_id = ids[-1]
+
+        if options['check']:
+            if stale:
+                raise CommandError(f'Расходящихся периодов: {stale} (владельцев проверено: {owners})')
+            self.stdout.write(self.style.SUCCESS(f'Агрегаты согласованы (владельцев проверено: {owners})'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Исправлено периодов: {stale} (владельцев проверено: {owners})'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from users import hierarchy, rbac
+
+
+class Command(BaseCommand):
+    help = 'Сверяет замыкание наследования ролей (RoleClosure) с ребрами и пересоздает его при расхождениях'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Только сверка: ненулевой код возврата при расхождениях, без изменений')
+
+    def handle(self, *args, **options):
+        stale = hierarchy.rebuild(dry_run=options['check'])
+
+        if options['check']:
+            if stale:
+                raise CommandError(f'Расходящихся пар ролей: {stale}')
+            self.stdout.write(self.style.SUCCESS('Замыкание ролей согласовано'))
+        else:
+            if stale:
+                rbac.invalidate()
+            self.stdout.write(self.style.SUCCESS(f'Исправлено пар ролей: {stale}'))
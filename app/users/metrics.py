@@ -0,0 +1,256 @@
+"""
+Метрики запросов: число SQL-запросов, время в БД, время этапов DRF
+(аутентификация, throttling, проверка прав, сериализация) и общее время.
+
+Запрос выбирается с вероятностью ``METRICS_SAMPLE_RATE``
+(``core.middleware.RequestMetricsMiddleware``); для выбранного запроса в
+``contextvars`` кладется ``RequestMetrics``, куда пишут обертка SQL-запросов
+(устанавливается на каждое соединение с БД, см. ``users/signals.py``) и
+``stage()``. Для невыбранных запросов обертки сводятся к одной проверке
+contextvar. По завершении запроса значения попадают в гистограммы в памяти
+процесса и отдаются в формате Prometheus (``metrics_view``). Счетчики
+других модулей (аудит, throttling) добавляются в вывод функциями,
+зарегистрированными ``registry.register``.
+
+Гистограммы у каждого процесса свои: при нескольких воркерах gunicorn
+каждый опрос /metrics попадает в один из них.
+"""
+import hmac
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+# Этапы в порядке вывода в Server-Timing. Время этапов может пересекаться
+# со временем БД (например, проверка прав с запросом ролей).
+STAGES = ('auth', 'throttle', 'permission', 'serialize')
+
+current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Измерения одного запроса."""
+    __slots__ = ('started', 'queries', 'db_time', 'stages')
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.stages = {}
+
+    def add(self, name, elapsed):
+        self.stages[name] = self.stages.get(name, 0.0) + elapsed
+
+    def server_timing(self, total):
+        """Значение заголовка ``Server-Timing`` (миллисекунды)."""
+        parts = [f'total;dur={total * 1000:.1f}', f'db;desc="{self.queries} queries";dur={self.db_time * 1000:.1f}']
+        for name in STAGES:
+            if name in self.stages:
+                parts.append(f'{name};dur={self.stages[name] * 1000:.1f}')
+        return ', '.join(parts)
+
+
+class _Stage:
+    __slots__ = ('record', 'name', 'started')
+
+    def __init__(self, record, name):
+        self.record = record
+        self.name = name
+
+    def __enter__(self):
+        self.started = perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.record.add(self.name, perf_counter() - self.started)
+
+
+class _NoStage:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_no_stage = _NoStage()
+
+
+def stage(name):
+    """Контекстный менеджер, добавляющий время блока к этапу текущего запроса."""
+    record = current.get()
+    if record is None:
+        return _no_stage
+    return _Stage(record, name)
+
+
+def query_wrapper(execute, sql, params, many, context):
+    """``execute_wrapper`` соединения: считает запросы и время БД выбранного запроса."""
+    record = current.get()
+    if record is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        record.queries += 1
+        record.db_time += perf_counter() - started
+
+
+def install_query_wrapper(connection):
+    if query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_wrapper)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class MetricsRegistry:
+    """Гистограммы и счетчики запросов по представлениям."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._collectors = []
+        self.reset()
+
+    def register(self, collector):
+        """Метрики других модулей: ``collector(lines)`` дописывает строки при каждом ``render``."""
+        self._collectors.append(collector)
+        return collector
+
+    def reset(self):
+        with self._lock:
+            self._requests = {}
+            self._durations = {}
+            self._stages = {}
+            self._queries = {}
+
+    def _histogram(self, histograms, key, buckets):
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = Histogram(buckets)
+        return histogram
+
+    def observe_request(self, view, method, status_code, total, record):
+        with self._lock:
+            key = (view, method, str(status_code))
+            self._requests[key] = self._requests.get(key, 0) + 1
+            self._histogram(self._durations, (view, method), LATENCY_BUCKETS).observe(total)
+            self._histogram(self._queries, (view,), QUERY_BUCKETS).observe(record.queries)
+            self._histogram(self._stages, (view, 'db'), LATENCY_BUCKETS).observe(record.db_time)
+            for name, elapsed in record.stages.items():
+                self._histogram(self._stages, (view, name), LATENCY_BUCKETS).observe(elapsed)
+
+    def render(self):
+        """Текст в формате Prometheus (text exposition 0.0.4)."""
+        with self._lock:
+            lines = []
+            counter(lines, 'app_requests_total', 'Обработанные запросы.',
+                     ('view', 'method', 'status'), self._requests)
+            _histograms(lines, 'app_request_duration_seconds', 'Общее время обработки запроса.',
+                        ('view', 'method'), self._durations)
+            _histograms(lines, 'app_request_stage_seconds', 'Время этапов обработки запроса (db, auth, ...).',
+                        ('view', 'stage'), self._stages)
+            _histograms(lines, 'app_request_queries', 'Число SQL-запросов на запрос.',
+                        ('view',), self._queries)
+        for collector in self._collectors:
+            collector(lines)
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def counter(lines, name, help_text, label_names, values):
+    """Счетчик ``{(значения меток): число}`` в формате Prometheus."""
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} counter')
+    for key, value in sorted(values.items()):
+        lines.append(f'{name}{_labels(label_names, key)} {value}')
+
+
+def gauge(lines, name, help_text, value):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} gauge')
+    lines.append(f'{name} {value}')
+
+
+def _histograms(lines, name, help_text, label_names, histograms):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for key, histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            bucket_labels = _labels(label_names, key, 'le="%s"' % bound)
+            lines.append(f'{name}_bucket{bucket_labels} {cumulative}')
+        cumulative += histogram.counts[-1]
+        bucket_labels = _labels(label_names, key, 'le="+Inf"')
+        lines.append(f'{name}_bucket{bucket_labels} {cumulative}')
+        lines.append(f'{name}_sum{_labels(label_names, key)} {histogram.sum}')
+        lines.append(f'{name}_count{_labels(label_names, key)} {cumulative}')
+
+
+registry = MetricsRegistry()
+
+
+def view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route
+
+
+def metrics_view(request):
+    """
+    Метрики в формате Prometheus. При заданном ``METRICS_TOKEN`` требуется
+    заголовок ``Authorization: Bearer <token>``, без него эндпоинт доступен
+    только при ``DEBUG``.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        expected = f'Bearer {token}'
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), expected):
+            return HttpResponseForbidden()
+    elif not settings.DEBUG:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class InstrumentedViewMixin:
+    """Замер этапов ``APIView.initial()`` для метрик запроса."""
+
+    def perform_authentication(self, request):
+        with stage('auth'):
+            super().perform_authentication(request)
+
+    def check_throttles(self, request):
+        with stage('throttle'):
+            super().check_throttles(request)
+
+    def check_permissions(self, request):
+        with stage('permission'):
+            super().check_permissions(request)
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_order_report_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('day', 'День'), ('month', 'Месяц')], max_length=5, verbose_name='Период')),
+                ('period_start', models.DateField(verbose_name='Начало периода')),
+                ('orders_count', models.BigIntegerField(default=0, verbose_name='Число заказов')),
+                ('total_price', models.DecimalField(decimal_places=2, default=0, max_digits=20, verbose_name='Сумма')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_rollups', to=settings.AUTH_USER_MODEL, verbose_name='Владелец')),
+            ],
+            options={
+                'verbose_name': 'Агрегат заказов',
+                'verbose_name_plural': 'Агрегаты заказов',
+                'unique_together': {('owner', 'granularity', 'period_start')},
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_permission_scopes_and_teams'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='role',
+            name='parents',
+            field=models.ManyToManyField(blank=True, related_name='children', to='users.role', verbose_name='Родительские роли'),
+        ),
+        migrations.CreateModel(
+            name='RoleClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('paths', models.BigIntegerField(default=1, verbose_name='Число путей')),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.role', verbose_name='Предок')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.role', verbose_name='Потомок')),
+            ],
+            options={
+                'verbose_name': 'Наследование ролей',
+                'verbose_name_plural': 'Наследование ролей',
+                'indexes': [models.Index(fields=['ancestor', 'descendant'], name='role_closure_ancestor_idx')],
+                'unique_together': {('descendant', 'ancestor')},
+            },
+        ),
+    ]
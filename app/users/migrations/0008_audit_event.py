@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_role_hierarchy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(verbose_name='Время')),
+                ('kind', models.PositiveSmallIntegerField(choices=[(1, 'Проверка прав'), (2, 'Вход'), (3, 'Неудачный вход'), (4, 'Выход')], verbose_name='Событие')),
+                ('resource', models.CharField(blank=True, max_length=50, verbose_name='Ресурс')),
+                ('action', models.CharField(blank=True, max_length=10, verbose_name='Действие')),
+                ('allowed', models.BooleanField(null=True, verbose_name='Разрешено')),
+                ('detail', models.CharField(blank=True, max_length=255, verbose_name='Подробности')),
+                ('ip', models.GenericIPAddressField(blank=True, null=True, verbose_name='IP')),
+                ('user', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Событие аудита',
+                'verbose_name_plural': 'Журнал аудита',
+                'indexes': [models.Index(fields=['user', 'created_at'], name='audit_user_created_idx'), models.Index(fields=['resource', 'created_at'], name='audit_resource_created_idx'), models.Index(fields=['created_at'], name='audit_created_idx')],
+            },
+        ),
+    ]
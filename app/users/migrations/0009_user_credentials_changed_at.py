@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0008_audit_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='credentials_changed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Изменение учетных данных'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['credentials_changed_at'], name='user_credentials_changed_idx'),
+        ),
+    ]
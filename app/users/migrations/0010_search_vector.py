@@ -0,0 +1,96 @@
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_CONFIG = 'russian'
+
+# Поля поиска и их веса, как в users/search.py (миграция не зависит от текущего кода).
+SEARCH_FIELDS = {
+    'users_order': (('item', 'A'),),
+    'users_report': (('title', 'A'), ('content', 'B')),
+}
+
+
+class PostgreSQLOnly:
+    """Операция выполняется только на PostgreSQL и не меняет состояние моделей."""
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class AddSearchIndex(PostgreSQLOnly, migrations.AddIndex):
+    pass
+
+
+class RunPostgreSQL(PostgreSQLOnly, migrations.RunSQL):
+    pass
+
+
+def search_trigger(table, fields):
+    """Триггер, пересчитывающий ``search_vector`` при любой вставке и изменении (включая ``COPY``)."""
+    vector = ' || '.join(
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.{field}, '')), '{weight}')" for field, weight in fields
+    )
+    columns = ', '.join(field for field, _ in fields)
+    return RunPostgreSQL(
+        sql=[
+            f"""
+            CREATE FUNCTION {table}_search_vector() RETURNS trigger AS $$
+            BEGIN
+                NEW.search_vector := {vector};
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+            """,
+            f"""
+            CREATE TRIGGER {table}_search_vector_update
+            BEFORE INSERT OR UPDATE OF {columns}, search_vector ON {table}
+            FOR EACH ROW EXECUTE FUNCTION {table}_search_vector()
+            """,
+            # Заполнение существующих строк (значение вычисляет триггер).
+            f'UPDATE {table} SET search_vector = NULL',
+        ],
+        reverse_sql=[
+            f'DROP TRIGGER {table}_search_vector_update ON {table}',
+            f'DROP FUNCTION {table}_search_vector()',
+        ],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_user_credentials_changed_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        *(search_trigger(table, fields) for table, fields in SEARCH_FIELDS.items()),
+        # GIN-индекс есть только на PostgreSQL и не входит в состояние моделей: SQLite
+        # не создаст его при пересборке таблицы.
+        AddSearchIndex(
+            model_name='order',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='order_search_idx'),
+        ),
+        AddSearchIndex(
+            model_name='report',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='report_search_idx'),
+        ),
+    ]
@@ -1,9 +1,18 @@
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
+from django.contrib.postgres.search import SearchVectorField
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from .hashing import hashing_pool
+
 class Role(models.Model):
     name = models.CharField(max_length=50, unique=True, verbose_name="Название")
+    # Наследование: роль получает права родительских ролей и всех их предков
+    # (замыкание — RoleClosure, users/hierarchy.py).
+    parents = models.ManyToManyField(
+        'self', symmetrical=False, related_name='children', blank=True, verbose_name="Родительские роли"
+    )
 
     class Meta:
         verbose_name = "Роль"
@@ -12,6 +21,26 @@ class Role(models.Model):
     def __str__(self):
         return self.name
 
+class RoleClosure(models.Model):
+    """
+    Транзитивное замыкание наследования ролей: ``descendant`` получает права
+    ``ancestor`` (роль сама с собой не хранится). ``paths`` — число путей
+    между ролями: удаление ребра вычитает его вклад без пересчета графа.
+    Поддерживается сигналами (users/hierarchy.py).
+    """
+    ancestor = models.ForeignKey(Role, on_delete=models.CASCADE, related_name='+', verbose_name="Предок")
+    descendant = models.ForeignKey(Role, on_delete=models.CASCADE, related_name='+', verbose_name="Потомок")
+    paths = models.BigIntegerField(default=1, verbose_name="Число путей")
+
+    class Meta:
+        # Предки ролей пользователя — поиск по descendant.
+        unique_together = ('descendant', 'ancestor')
+        indexes = [
+            models.Index(fields=['ancestor', 'descendant'], name='role_closure_ancestor_idx'),
+        ]
+        verbose_name = "Наследование ролей"
+        verbose_name_plural = "Наследование ролей"
+
 class Resource(models.Model):
     name = models.CharField(max_length=50, unique=True, verbose_name="Название")  # например, "orders" (заказы), "reports" (отчеты)
 
@@ -22,13 +51,31 @@ class Resource(models.Model):
     def __str__(self):
         return self.name
 
+class Team(models.Model):
+    name = models.CharField(max_length=100, unique=True, verbose_name="Название")
+
+    class Meta:
+        verbose_name = "Команда"
+        verbose_name_plural = "Команды"
+
+    def __str__(self):
+        return self.name
+
 class PermissionRule(models.Model):
+    # Область записей, к которым применяется правило (users/filters.py):
+    # свои, своей команды или все. Значения упорядочены по ширине.
+    OWN = 1
+    TEAM = 2
+    ALL = 3
+    SCOPE_CHOICES = ((OWN, 'Свои'), (TEAM, 'Команды'), (ALL, 'Все'))
+
     role = models.ForeignKey(Role, on_delete=models.CASCADE, related_name='permissions', verbose_name="Роль")
     resource = models.ForeignKey(Resource, on_delete=models.CASCADE, verbose_name="Ресурс")
     can_create = models.BooleanField(default=False, verbose_name="Может создавать")
     can_read = models.BooleanField(default=False, verbose_name="Может читать")
     can_update = models.BooleanField(default=False, verbose_name="Может обновлять")
     can_delete = models.BooleanField(default=False, verbose_name="Может удалять")
+    scope = models.PositiveSmallIntegerField(choices=SCOPE_CHOICES, default=OWN, verbose_name="Область")
 
     class Meta:
         unique_together = ('role', 'resource')
@@ -61,6 +108,8 @@ class CustomUserManager(BaseUserManager):
 
         return self.create_user(email, password, **extra_fields)
 
+CREDENTIAL_FLAGS = ('is_active', 'is_staff', 'is_superuser')
+
 class User(AbstractBaseUser, PermissionsMixin):
     email = models.EmailField(_('email адрес'), unique=True)
     first_name = models.CharField(_('Имя'), max_length=150)
@@ -68,9 +117,17 @@ class User(AbstractBaseUser, PermissionsMixin):
     middle_name = models.CharField(_('Отчество'), max_length=150, blank=True)
     is_active = models.BooleanField(_('Активен'), default=True)
     is_staff = models.BooleanField(_('Персонал'), default=False)
+    # Смена пароля, активности или прав администратора: access-токены, выпущенные
+    # раньше, отзываются (users/revocation.py).
+    credentials_changed_at = models.DateTimeField(_('Изменение учетных данных'), null=True, blank=True, editable=False)
     
     # Кастомные роли RBAC
     roles = models.ManyToManyField(Role, related_name='users', blank=True, verbose_name="Роли")
+    # Команда: записи ее участников доступны по правилам с областью TEAM.
+    team = models.ForeignKey(
+        Team, on_delete=models.SET_NULL, related_name='members', null=True, blank=True,
+        db_index=False, verbose_name="Команда"
+    )
 
     objects = CustomUserManager()
 
@@ -80,10 +137,70 @@ class User(AbstractBaseUser, PermissionsMixin):
     class Meta:
         verbose_name = "Пользователь"
         verbose_name_plural = "Пользователи"
+        indexes = [
+            # Участники команды (области TEAM) без чтения таблицы.
+            models.Index(fields=['team', 'id'], name='user_team_idx'),
+            # Недавние изменения учетных данных — при загрузке списка отзыва.
+            models.Index(fields=['credentials_changed_at'], name='user_credentials_changed_idx'),
+        ]
 
     def __str__(self):
         return self.email
 
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        # Пользователь, восстановленный из JWT (users/authentication.py), догружает
+        # все отложенные поля одним запросом при первом обращении к любому из них.
+        if fields is not None and '_token_claims' in self.__dict__:
+            fields = set(fields) | self.get_deferred_fields()
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+
+    def _flags(self):
+        return {name: self.__dict__[name] for name in CREDENTIAL_FLAGS if name in self.__dict__}
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Флаги при загрузке: по ним save() определяет изменение учетных данных.
+        user = super().from_db(db, field_names, values)
+        user._loaded_flags = user._flags()
+        return user
+
+    def _credentials_changed(self, update_fields):
+        if self.__dict__.get('_password_changed'):
+            return True
+        loaded = self.__dict__.get('_loaded_flags', {})
+        return any(
+            self.__dict__[name] != value for name, value in loaded.items()
+            if update_fields is None or name in update_fields
+        )
+
+    def save(self, *args, **kwargs):
+        # Флаги из JWT могли устареть: сохраняем их, только если они были изменены.
+        claims = self.__dict__.get('_token_claims')
+        if claims and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in deferred
+                and not (field.attname in claims and getattr(self, field.attname) == claims[field.attname])
+            ]
+        update_fields = kwargs.get('update_fields')
+        changed = not self._state.adding and self._credentials_changed(update_fields)
+        if changed:
+            self.credentials_changed_at = timezone.now()
+            if update_fields is not None:
+                kwargs['update_fields'] = [*update_fields, 'credentials_changed_at']
+        # Отзыв токенов — в post_save (users/signals.py).
+        self._revoke_tokens = changed
+        super().save(*args, **kwargs)
+        self._loaded_flags = self._flags()
+        self._password_changed = False
+
+    def set_password(self, raw_password):
+        # Как AbstractBaseUser.set_password, но хеш вычисляется в пуле (users/hashing.py).
+        self.password = hashing_pool.make(raw_password)
+        self._password = raw_password
+        self._password_changed = True
+
     def soft_delete(self):
         """Мягкое удаление пользователя."""
         self.is_active = False
@@ -93,11 +210,21 @@ class Order(models.Model):
     item = models.CharField(max_length=255, verbose_name="Товар")
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Цена")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders', verbose_name="Владелец", null=True, blank=True)
+    # Заполняется триггером на PostgreSQL, GIN-индекс создается миграцией 0010 (users/search.py).
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
+        indexes = [
+            # Keyset-пагинация списка заказов владельца (users/pagination.py).
+            # include делает индекс покрывающим на PostgreSQL, другие СУБД его игнорируют.
+            models.Index(fields=['owner', 'created_at', 'id'], include=['item', 'price', 'updated_at'], name='order_owner_created_idx'),
+            # Списки с областью ALL (users/filters.py): тот же порядок без владельца.
+            models.Index(fields=['created_at', 'id'], name='order_created_idx'),
+        ]
     
     def __str__(self):
         return f"Order #{self.id} - {self.item}"
@@ -106,11 +233,78 @@ class Report(models.Model):
     title = models.CharField(max_length=255, verbose_name="Заголовок")
     content = models.TextField(verbose_name="Содержание")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reports', verbose_name="Автор", null=True, blank=True)
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         verbose_name = "Отчет"
         verbose_name_plural = "Отчеты"
+        indexes = [
+            models.Index(fields=['author', 'created_at', 'id'], name='report_author_created_idx'),
+            models.Index(fields=['created_at', 'id'], name='report_created_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+class OrderRollup(models.Model):
+    """
+    Агрегаты заказов владельца по дням и месяцам (количество и сумма цен).
+    Поддерживаются инкрементально (users/rollups.py), перестраиваются
+    командой rebuild_order_rollups.
+    """
+    DAY = 'day'
+    MONTH = 'month'
+    GRANULARITY_CHOICES = ((DAY, 'День'), (MONTH, 'Месяц'))
+
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='order_rollups', verbose_name="Владелец")
+    granularity = models.CharField(max_length=5, choices=GRANULARITY_CHOICES, verbose_name="Период")
+    period_start = models.DateField(verbose_name="Начало периода")
+    orders_count = models.BigIntegerField(default=0, verbose_name="Число заказов")
+    total_price = models.DecimalField(max_digits=20, decimal_places=2, default=0, verbose_name="Сумма")
+
+    class Meta:
+        unique_together = ('owner', 'granularity', 'period_start')
+        verbose_name = "Агрегат заказов"
+        verbose_name_plural = "Агрегаты заказов"
+
+    def __str__(self):
+        return f"{self.owner_id} {self.granularity} {self.period_start}"
+
+class AuditEvent(models.Model):
+    """
+    Журнал аудита: решения CustomRBACPermission, входы и выходы. Записи
+    добавляются пакетами фоновым потоком (users/audit.py) и не изменяются.
+    """
+    DECISION = 1
+    LOGIN = 2
+    LOGIN_FAILED = 3
+    LOGOUT = 4
+    KIND_CHOICES = ((DECISION, 'Проверка прав'), (LOGIN, 'Вход'), (LOGIN_FAILED, 'Неудачный вход'), (LOGOUT, 'Выход'))
+
+    created_at = models.DateTimeField(verbose_name="Время")
+    kind = models.PositiveSmallIntegerField(choices=KIND_CHOICES, verbose_name="Событие")
+    # Без ограничения внешнего ключа: запись переживает пользователя, пакетная вставка не проверяет ссылки.
+    user = models.ForeignKey(
+        User, null=True, blank=True, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False,
+        related_name='+', verbose_name="Пользователь",
+    )
+    resource = models.CharField(max_length=50, blank=True, verbose_name="Ресурс")
+    action = models.CharField(max_length=10, blank=True, verbose_name="Действие")
+    allowed = models.BooleanField(null=True, verbose_name="Разрешено")
+    # Путь запроса для решений, email для неудачного входа.
+    detail = models.CharField(max_length=255, blank=True, verbose_name="Подробности")
+    ip = models.GenericIPAddressField(null=True, blank=True, verbose_name="IP")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='audit_user_created_idx'),
+            models.Index(fields=['resource', 'created_at'], name='audit_resource_created_idx'),
+            models.Index(fields=['created_at'], name='audit_created_idx'),
+        ]
+        verbose_name = "Событие аудита"
+        verbose_name_plural = "Журнал аудита"
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.user_id} {self.created_at:%Y-%m-%d %H:%M:%S}"
@@ -0,0 +1,209 @@
+"""
+Keyset (cursor) пагинация для списков заказов и отчетов.
+
+Страница выбирается условием ``(created_at, id) < (курсор)`` по составному
+индексу ``(владелец, created_at, id)``, поэтому стоимость любой страницы
+пропорциональна ее размеру, а не глубине (нет ``OFFSET``). ``COUNT(*)`` по
+умолчанию не выполняется; общее число записей возвращается только по
+запросу ``?count=true``.
+"""
+import base64
+import binascii
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _position(item, field):
+    """Значения ключа пагинации для объекта модели или строки ``.values()``."""
+    if isinstance(item, dict):
+        return item[field], item['id']
+    return getattr(item, field), item.pk
+
+
+class KeysetPagination(BasePagination):
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    count_query_param = 'count'
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 100
+    ordering_field = 'created_at'
+    invalid_cursor_message = _('Invalid cursor')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if self._wants_count(request):
+            self.count = queryset.count()
+        queryset = self._page_queryset(queryset, request)
+        return self._set_page(list(queryset[:self._page_size + 1]))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """``paginate_queryset`` для ASGI-представлений (async ORM)."""
+        self.count = None
+        if self._wants_count(request):
+            self.count = await queryset.acount()
+        queryset = self._page_queryset(queryset, request)
+        return self._set_page([item async for item in queryset[:self._page_size + 1]])
+
+    def _wants_count(self, request):
+        return request.query_params.get(self.count_query_param) in ('1', 'true', 'True')
+
+    def _page_queryset(self, queryset, request):
+        """Запрос страницы (без среза): фильтр по курсору и порядок."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self._page_size = self.get_page_size(request)
+        self._cursor = position = self.decode_cursor(request)
+        field = self.ordering_field
+
+        reverse = False
+        if position is not None:
+            value, pk, reverse = position
+            # (field, pk) < (value, pk0) записано как field <= value AND (field < value OR pk < pk0):
+            # первое условие дает диапазонное сканирование составного индекса.
+            if reverse:
+                queryset = queryset.filter(
+                    Q(**{f'{field}__gte': value}), Q(**{f'{field}__gt': value}) | Q(pk__gt=pk)
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(**{f'{field}__lte': value}), Q(**{f'{field}__lt': value}) | Q(pk__lt=pk)
+                )
+
+        if reverse:
+            return queryset.order_by(field, 'pk')
+        return queryset.order_by(f'-{field}', '-pk')
+
+    def _set_page(self, results):
+        page_size, position = self._page_size, self._cursor
+        reverse = position is not None and position[2]
+        has_more = len(results) > page_size
+        page = results[:page_size]
+        if reverse:
+            page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.page = page
+        return page
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii')
+            direction, value, pk = raw.split('|')
+            value = self.parse_value(value)
+            pk = int(pk)
+        except (TypeError, ValueError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if value is None or direction not in ('n', 'p'):
+            raise NotFound(self.invalid_cursor_message)
+        return value, pk, direction == 'p'
+
+    def parse_value(self, raw):
+        """Значение поля упорядочивания из курсора (None — курсор недействителен)."""
+        return parse_datetime(raw)
+
+    def format_value(self, value):
+        return value.isoformat()
+
+    def cursor_for(self, item, reverse=False):
+        """Значение курсора, указывающего на позицию после (или до) объекта."""
+        value, pk = _position(item, self.ordering_field)
+        raw = '|'.join(('p' if reverse else 'n', self.format_value(value), str(pk)))
+        return base64.urlsafe_b64encode(raw.encode('ascii')).decode('ascii')
+
+    def encode_cursor(self, item, reverse):
+        url = remove_query_param(self.base_url, self.count_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.cursor_for(item, reverse))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        payload = OrderedDict()
+        if self.count is not None:
+            payload['count'] = self.count
+        payload['next'] = self.get_next_link()
+        payload['previous'] = self.get_previous_link()
+        payload['results'] = data
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {'type': 'integer', 'example': 123, 'description': 'Только при ?count=true'},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Курсор страницы (из ссылок next/previous).',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Размер страницы.',
+                'schema': {'type': 'integer'},
+            },
+            {
+                'name': self.count_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Вернуть общее число записей (выполняет COUNT).',
+                'schema': {'type': 'boolean'},
+            },
+        ]
+
+
+class RankedKeysetPagination(KeysetPagination):
+    """
+    Keyset-пагинация результатов полнотекстового поиска (``users/search.py``):
+    порядок по убыванию релевантности ``search_rank``, затем ``id``.
+    """
+    ordering_field = 'search_rank'
+
+    def parse_value(self, raw):
+        return float(raw)
+
+    def format_value(self, value):
+        return repr(float(value))
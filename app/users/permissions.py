@@ -1,5 +1,17 @@
 from rest_framework.permissions import BasePermission
 
+from . import audit, rbac
+from .tokens import RBAC_CLAIM, claim_mask
+
+# Действие, требуемое HTTP-методом.
+METHOD_ACTIONS = {
+    'GET': 'can_read',
+    'POST': 'can_create',
+    'PUT': 'can_update',
+    'PATCH': 'can_update',
+    'DELETE': 'can_delete'
+}
+
 class CustomRBACPermission(BasePermission):
     """
     Кастомный класс разрешений, реализующий логику управления доступом на основе ролей (RBAC).
@@ -7,42 +19,85 @@ class CustomRBACPermission(BasePermission):
     """
 
     def has_permission(self, request, view):
+        allowed = self._has_permission(request, view)
+        # Каждое решение попадает в журнал аудита (запись — в фоновом потоке, users/audit.py).
+        audit.decision(request, getattr(view, 'required_resource', None), self._action(request), allowed)
+        return allowed
+
+    async def ahas_permission(self, request, view):
+        """
+        Асинхронная версия для ASGI-представлений (``users/async_api.py``):
+        те же шаги, но без блокирующих обращений к БД и кэшу в event loop.
+        """
+        allowed = await self._ahas_permission(request, view)
+        audit.decision(request, getattr(view, 'required_resource', None), self._action(request), allowed, wait=False)
+        return allowed
+
+    @staticmethod
+    def _action(request):
+        action = METHOD_ACTIONS.get(request.method)
+        return action and action[len('can_'):]
+
+    def _has_permission(self, request, view):
+        decision, resource_name, action_bit = self._check_request(request, view)
+        if decision is not None:
+            return decision
+
+        # 5. Если access-токен содержит актуальную маску прав (claim 'rbac'), решаем по ней.
+        # При несовпадении поколения или после изменения ролей пользователя claim
+        # игнорируется и права проверяются заново.
+        claim = self._rbac_claim(request)
+        if claim is not None:
+            mask = claim_mask(claim, resource_name, rbac.claim_versions(request.user.pk))
+            if mask is not None:
+                return bool(mask & action_bit)
+
+        # 6. Проверка наличия у пользователя роли, разрешающей это действие с ресурсом.
+        # Права берутся из скомпилированной матрицы RBAC (роль × ресурс -> битовая маска),
+        # которая кэшируется в процессе и инвалидируется сигналами (см. users/rbac.py).
+        return rbac.has_access(request.user, resource_name, action_bit)
+
+    async def _ahas_permission(self, request, view):
+        decision, resource_name, action_bit = self._check_request(request, view)
+        if decision is not None:
+            return decision
+
+        claim = self._rbac_claim(request)
+        if claim is not None:
+            mask = claim_mask(claim, resource_name, await rbac.aclaim_versions(request.user.pk))
+            if mask is not None:
+                return bool(mask & action_bit)
+
+        return await rbac.ahas_access(request.user, resource_name, action_bit)
+
+    def _check_request(self, request, view):
+        """
+        Шаги 1-4, не требующие обращения к правам. Возвращает
+        ``(решение или None, ресурс, бит действия)``.
+        """
         # 1. Проверка аутентификации
         if not request.user or not request.user.is_authenticated:
-            return False
+            return False, None, None
 
         # 2. Пропуск для суперпользователя
         if request.user.is_superuser:
-            return True
+            return True, None, None
 
         # 3. Получение требуемого ресурса из представления
         resource_name = getattr(view, 'required_resource', None)
         if not resource_name:
             # Если view не определяет ресурс, доступ блокируется по умолчанию для безопасности.
-            return False
+            return False, None, None
 
         # 4. Сопоставление HTTP метода с действием
-        method_map = {
-            'GET': 'can_read',
-            'POST': 'can_create',
-            'PUT': 'can_update',
-            'PATCH': 'can_update',
-            'DELETE': 'can_delete'
-        }
-        
-        required_action = method_map.get(request.method)
+        required_action = METHOD_ACTIONS.get(request.method)
         if not required_action:
-            return False
-
-        # 5. Проверка наличия у пользователя роли, разрешающей это действие с ресурсом
-        # Используем обратную связь: Role.users -> user.roles
-        # Мы запрашиваем роли, связанные с пользователем, которые удовлетворяют правилу доступа.
-        
-        filter_kwargs = {
-            'permissions__resource__name': resource_name,
-            f'permissions__{required_action}': True
-        }
-
-        has_permission = request.user.roles.filter(**filter_kwargs).exists()
-        
-        return has_permission
+            return False, None, None
+
+        return None, resource_name, rbac.ACTION_BITS[required_action]
+
+    def _rbac_claim(self, request):
+        token = request.auth
+        if token is None or not hasattr(token, 'get'):
+            return None
+        return token.get(RBAC_CLAIM)
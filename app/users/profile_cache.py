@@ -0,0 +1,105 @@
+"""
+Кэш ответа профиля (``GET /api/v1/profile/``).
+
+В общем кэше Django по id пользователя хранится готовое JSON-тело ответа
+(с названиями ролей) и его ETag вместе с отметкой версии: поколением всех
+профилей и версией профиля пользователя. Запись действительна, пока обе
+отметки совпадают с текущими; отметки и запись читаются одним
+``get_many``. При совпадении ``If-None-Match`` отдается 304.
+
+Версия пользователя увеличивается при сохранении и удалении пользователя и
+изменении его ролей, поколение — при переименовании и удалении роли
+(``users/signals.py``). Отметка читается до загрузки пользователя из БД,
+поэтому изменение, произошедшее во время построения ответа, не попадет в
+кэш как актуальное. Отсутствующий счетчик (вытеснение, очистка кэша)
+создается со значением текущего времени в наносекундах, как в
+``users/versions.py``: новая отметка не совпадет с отметкой записи,
+сохраненной до вытеснения.
+
+Запись и счетчики должны быть общими для всех воркеров (проверка
+``users.E001``, ``users/checks.py``), иначе изменение через один воркер не
+сбрасывает ответ остальных.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import quote_etag
+
+from core import db_router
+
+from .models import User
+from .renderers import FastJSONRenderer
+from .serializers import UserProfileSerializer
+
+GENERATION_KEY = 'profile:generation'
+
+
+def _entry_key(user_id):
+    return f'profile:{user_id}'
+
+
+def _version_key(user_id):
+    return f'profile:version:{user_id}'
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, time.time_ns(), timeout=None):
+            cache.incr(key)
+
+
+def _current(values, key):
+    value = values.get(key)
+    if value is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        value = cache.get(key)
+    return value
+
+
+def lookup(user_id):
+    """
+    ``((etag, тело) или None, отметка)``. Отметку нужно передать в ``store``,
+    если записи нет.
+    """
+    entry_key, version_key = _entry_key(user_id), _version_key(user_id)
+    values = cache.get_many([GENERATION_KEY, version_key, entry_key])
+    stamp = (_current(values, GENERATION_KEY), _current(values, version_key))
+    entry = values.get(entry_key)
+    if entry is not None and entry[0] == stamp:
+        return entry[1], stamp
+    return None, stamp
+
+
+def render(user):
+    """Тело ответа профиля и его ETag."""
+    body = FastJSONRenderer().render(UserProfileSerializer(user).data)
+    return quote_etag(hashlib.md5(body).hexdigest()), body
+
+
+def store(user_id, stamp):
+    """Загрузка профиля из БД, рендеринг и запись в кэш с отметкой ``stamp``."""
+    user = User.objects.prefetch_related('roles').get(pk=user_id)
+    etag, body = render(user)
+    cache.set(_entry_key(user_id), (stamp, (etag, body)), settings.PROFILE_CACHE_TIMEOUT)
+    return etag, body
+
+
+def refresh(user_id):
+    """Запись актуального профиля после изменения (write-through)."""
+    _, stamp = lookup(user_id)
+    return store(user_id, stamp)
+
+
+def invalidate_user(user_id):
+    # Новый ответ строится из основной БД, а не из отстающей реплики (core/db_router.py).
+    db_router.pin([user_id])
+    _bump(_version_key(user_id))
+
+
+def invalidate_all():
+    db_router.pin_all()
+    _bump(GENERATION_KEY)
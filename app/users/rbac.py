@@ -0,0 +1,463 @@
+"""
+Скомпилированная матрица RBAC.
+
+Вместо join'а User -> Role -> PermissionRule -> Resource на каждый запрос
+права хранятся в памяти процесса в виде матрицы
+``role_id -> {resource_name: битовая маска действий}``, а для каждого
+пользователя кэшируется множество id его ролей. В установившемся режиме
+проверка доступа не делает ни одного SQL-запроса.
+
+Согласованность между воркерами обеспечивает счетчик поколений в общем кэше
+Django (``CACHES['default']``): любое изменение правил, ресурсов или ролей
+увеличивает счетчик, и каждый процесс, заметив новое поколение,
+перекомпилирует матрицу.
+
+Назначение и снятие ролей матрицу не меняет: затронутые пользователи
+получают в кэше отметку изменения (``invalidate_users``) — значение общего
+счетчика изменений ролей. Роли пользователя, загруженные в процесс до
+отметки, перечитываются при следующей проверке, а claim ``rbac`` (``r`` —
+счетчик на момент выпуска) перестает действовать; кэш ролей остальных
+пользователей и их claim'ы не затрагиваются. Отсутствие отметки (вытеснена
+или истекла) считается изменением на текущем значении счетчика: роли,
+загруженные до последнего изменения чьих-либо ролей, перечитываются, и
+отметка ставится заново.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from core import db_router
+
+CREATE = 1
+READ = 2
+UPDATE = 4
+DELETE = 8
+
+ACTION_BITS = {
+    'can_create': CREATE,
+    'can_read': READ,
+    'can_update': UPDATE,
+    'can_delete': DELETE,
+}
+
+# Действия в пакетной проверке (``check_many``).
+ACTIONS = {
+    'create': CREATE,
+    'read': READ,
+    'update': UPDATE,
+    'delete': DELETE,
+}
+
+GENERATION_KEY = 'rbac:generation'
+ROLES_SEQ_KEY = 'rbac:roles:seq'
+
+# Сбросы, отложенные до конца блока ``batch``.
+_deferred = ContextVar('rbac_deferred', default=None)
+
+
+def roles_key(user_id):
+    return f'rbac:roles:{user_id}'
+
+
+def _stamp_timeout():
+    # Отметка должна пережить claim'ы, выпущенные до нее.
+    return settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME'].total_seconds()
+
+
+def _counter(values, key):
+    value = values.get(key)
+    if value is None:
+        # Начальное значение — время: после очистки кэша счетчик не повторяется.
+        cache.add(key, time.time_ns(), None)
+        value = cache.get(key)
+    return value
+
+
+def _user_stamps(values, keys, seq):
+    """
+    ``({user_id: отметка}, {ключ: отметка для записи})``. Вместо отсутствующей
+    отметки — текущий счетчик ``seq``: если он не менялся с загрузки ролей, роли
+    актуальны, иначе перечитываются. Отметка записывается до чтения ролей,
+    поэтому перезаписать она может только отметку, поставленную раньше.
+    """
+    changed, missing = {}, {}
+    for key, user_id in keys.items():
+        stamp = values.get(key)
+        if stamp is None:
+            stamp = missing[key] = seq
+        changed[user_id] = stamp
+    return changed, missing
+
+
+class PermissionMatrix:
+    """
+    Процессный кэш матрицы прав и множеств ролей пользователей.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = None
+        self._roles = {}
+        self._scopes = {}
+        self._user_roles = {}
+
+    def refresh(self, user_ids=()):
+        """
+        Сверка с общим кэшем одним запросом: при смене поколения матрица
+        перекомпилируется, роли ``user_ids``, загруженные до их изменения,
+        сбрасываются. Возвращает ``(поколение, счетчик изменений ролей,
+        {user_id: отметка изменения ролей})``.
+        """
+        keys = {roles_key(user_id): user_id for user_id in user_ids}
+        values = cache.get_many([GENERATION_KEY, ROLES_SEQ_KEY, *keys])
+        generation = _counter(values, GENERATION_KEY)
+        seq = _counter(values, ROLES_SEQ_KEY)
+        changed, missing = _user_stamps(values, keys, seq)
+        if missing:
+            cache.set_many(missing, _stamp_timeout())
+        self._apply(generation, changed)
+        return generation, seq, changed
+
+    def sync(self):
+        """Сверяет локальное поколение с общим и при расхождении перекомпилирует матрицу."""
+        return self.refresh()[0]
+
+    def _apply(self, generation, changed):
+        if generation != self._generation:
+            with self._lock:
+                if generation != self._generation:
+                    # Поколение считывается до компиляции: если правила изменятся
+                    # во время компиляции, следующий sync() увидит новое поколение.
+                    self._roles, self._scopes = self._compile()
+                    self._user_roles = {}
+                    self._generation = generation
+        user_roles = self._user_roles
+        for user_id, stamp in changed.items():
+            entry = user_roles.get(user_id)
+            if entry is not None and entry[1] < stamp:
+                user_roles.pop(user_id, None)
+
+    def forget(self, user_ids):
+        """Сброс ролей ``user_ids`` в этом процессе."""
+        user_roles = self._user_roles
+        for user_id in user_ids:
+            user_roles.pop(user_id, None)
+
+    def _compile(self):
+        from .models import PermissionRule
+
+        matrix = {}
+        scopes = {}
+        rows = PermissionRule.objects.values_list(
+            'role_id', 'resource__name', 'scope', *ACTION_BITS
+        )
+        for role_id, resource_name, scope, *flags in rows:
+            mask = 0
+            for bit, flag in zip(ACTION_BITS.values(), flags):
+                if flag:
+                    mask |= bit
+            if mask:
+                matrix.setdefault(role_id, {})[resource_name] = mask
+                scopes.setdefault(role_id, {})[resource_name] = scope
+        return matrix, scopes
+
+    def _cached_roles(self, user_roles, user_id):
+        entry = user_roles.get(user_id)
+        # Запись старше отметки изменения могла бы пережить ее (отметки истекают).
+        if entry is None or time.monotonic() - entry[2] > _stamp_timeout() / 2:
+            return None
+        return entry[0]
+
+    def role_ids(self, user_id, seq=None):
+        """
+        Множество id ролей пользователя с унаследованными (из кэша или одним
+        запросом). ``seq`` — счетчик изменений ролей, прочитанный до запроса
+        (``refresh``).
+        """
+        user_roles = self._user_roles
+        roles = self._cached_roles(user_roles, user_id)
+        if roles is None:
+            if seq is None:
+                seq = self.refresh([user_id])[1]
+            roles = frozenset(self._user_roles_query(user_id))
+            self._remember_roles(user_roles, user_id, roles, seq)
+        return roles
+
+    async def arole_ids(self, user_id, seq):
+        """Асинхронный ``role_ids``: при промахе кэша роли читаются async ORM."""
+        user_roles = self._user_roles
+        roles = self._cached_roles(user_roles, user_id)
+        if roles is None:
+            roles = frozenset([role_id async for role_id in self._user_roles_query(user_id)])
+            self._remember_roles(user_roles, user_id, roles, seq)
+        return roles
+
+    def role_ids_many(self, user_ids, seq):
+        """``{user_id: множество id ролей}``; роли пользователей вне кэша читаются одним запросом."""
+        user_roles = self._user_roles
+        result = {user_id: self._cached_roles(user_roles, user_id) for user_id in user_ids}
+        missing = [user_id for user_id, roles in result.items() if roles is None]
+        if missing:
+            loaded = {user_id: set() for user_id in missing}
+            for user_id, role_id in self._users_roles_query(missing):
+                loaded[user_id].add(role_id)
+            for user_id, roles in loaded.items():
+                result[user_id] = frozenset(roles)
+                self._remember_roles(user_roles, user_id, result[user_id], seq)
+        return result
+
+    @staticmethod
+    def _users_roles_query(user_ids):
+        from .hierarchy import effective_role_pairs
+
+        return effective_role_pairs(user_ids)
+
+    @staticmethod
+    def _user_roles_query(user_id):
+        # Назначенные роли и унаследованные ими (users/hierarchy.py).
+        from .hierarchy import effective_role_ids
+
+        return effective_role_ids(user_id)
+
+    @staticmethod
+    def _remember_roles(user_roles, user_id, roles, seq):
+        # Запись идет в тот словарь, который был актуален до запроса: если за это
+        # время поколение сменилось, устаревшее значение не попадет в новый кэш.
+        # Отметка изменения ролей больше seq — роли перечитаются.
+        limit = getattr(settings, 'RBAC_USER_CACHE_SIZE', 10000)
+        while len(user_roles) >= limit:
+            try:
+                user_roles.pop(next(iter(user_roles)))
+            except (KeyError, StopIteration, RuntimeError):
+                break
+        user_roles[user_id] = (roles, seq, time.monotonic())
+
+    def masks(self, user_id):
+        """Эффективные маски пользователя по всем ресурсам."""
+        seq = self.refresh([user_id])[1]
+        result = {}
+        roles = self._roles
+        for role_id in self.role_ids(user_id, seq):
+            for resource_name, mask in roles.get(role_id, {}).items():
+                result[resource_name] = result.get(resource_name, 0) | mask
+        return result
+
+    def masks_many(self, user_ids):
+        """``masks`` для нескольких пользователей: ``{user_id: {ресурс: маска}}``."""
+        seq = self.refresh(user_ids)[1]
+        roles = self._roles
+        result = {}
+        for user_id, role_ids in self.role_ids_many(user_ids, seq).items():
+            masks = result[user_id] = {}
+            for role_id in role_ids:
+                for resource_name, mask in roles.get(role_id, {}).items():
+                    masks[resource_name] = masks.get(resource_name, 0) | mask
+        return result
+
+    def mask(self, user_id, resource_name):
+        """Эффективная маска пользователя для одного ресурса."""
+        seq = self.refresh([user_id])[1]
+        mask = 0
+        roles = self._roles
+        for role_id in self.role_ids(user_id, seq):
+            mask |= roles.get(role_id, {}).get(resource_name, 0)
+        return mask
+
+    def scope(self, user_id, resource_name, action_bit):
+        """
+        Наибольшая область (``PermissionRule.OWN/TEAM/ALL``) среди правил ролей
+        пользователя, разрешающих действие с ресурсом; 0 — таких правил нет.
+        """
+        seq = self.refresh([user_id])[1]
+        return self._scope(self.role_ids(user_id, seq), resource_name, action_bit)
+
+    async def ascope(self, user_id, resource_name, action_bit):
+        """Асинхронный ``scope``."""
+        seq = (await self.arefresh([user_id]))[1]
+        return self._scope(await self.arole_ids(user_id, seq), resource_name, action_bit)
+
+    def _scope(self, role_ids, resource_name, action_bit):
+        roles, scopes = self._roles, self._scopes
+        scope = 0
+        for role_id in role_ids:
+            if roles.get(role_id, {}).get(resource_name, 0) & action_bit:
+                # Во время перекомпиляции словари могут быть из разных поколений.
+                scope = max(scope, scopes.get(role_id, {}).get(resource_name, 0))
+        return scope
+
+    async def arefresh(self, user_ids=()):
+        """
+        Асинхронный ``refresh``: значения читаются из кэша, а перекомпиляция
+        матрицы (редкая) выполняется в потоке, вне event loop.
+        """
+        keys = {roles_key(user_id): user_id for user_id in user_ids}
+        values = await cache.aget_many([GENERATION_KEY, ROLES_SEQ_KEY, *keys])
+        generation, seq = values.get(GENERATION_KEY), values.get(ROLES_SEQ_KEY)
+        if generation is None or seq is None or generation != self._generation:
+            return await sync_to_async(self.refresh)(user_ids)
+        changed, missing = _user_stamps(values, keys, seq)
+        if missing:
+            await cache.aset_many(missing, _stamp_timeout())
+        self._apply(generation, changed)
+        return generation, seq, changed
+
+    async def amask(self, user_id, resource_name):
+        """
+        Асинхронный ``mask`` для ASGI-представлений: в установившемся режиме
+        без запросов к БД и без блокирующих вызовов в event loop.
+        """
+        seq = (await self.arefresh([user_id]))[1]
+        mask = 0
+        roles = self._roles
+        for role_id in await self.arole_ids(user_id, seq):
+            mask |= roles.get(role_id, {}).get(resource_name, 0)
+        return mask
+
+    def reset(self):
+        """Сбрасывает локальное состояние процесса."""
+        with self._lock:
+            self._generation = None
+            self._roles = {}
+            self._scopes = {}
+            self._user_roles = {}
+
+
+matrix = PermissionMatrix()
+
+
+def has_access(user, resource_name, action_bit):
+    """Проверяет, разрешено ли пользователю действие над ресурсом."""
+    return bool(matrix.mask(user.pk, resource_name) & action_bit)
+
+
+async def ahas_access(user, resource_name, action_bit):
+    """Асинхронный ``has_access``."""
+    return bool(await matrix.amask(user.pk, resource_name) & action_bit)
+
+
+def check_many(users, checks):
+    """
+    Пакетная проверка прав: ``checks`` — пары ``(ресурс, действие)``, где
+    действие — ключ ``ACTIONS``. Возвращает для каждого пользователя из
+    ``users`` список решений в порядке ``checks``. Как и в
+    ``CustomRBACPermission``, суперпользователю разрешено все, неактивному
+    пользователю — ничего. В установившемся режиме запросов к БД нет, роли
+    пользователей вне кэша читаются одним запросом.
+    """
+    bits = [(resource_name, ACTIONS[action]) for resource_name, action in checks]
+    masks = matrix.masks_many([user.pk for user in users if user.is_active and not user.is_superuser])
+    rows = []
+    for user in users:
+        if not user.is_active or user.is_superuser:
+            rows.append([user.is_active] * len(bits))
+            continue
+        user_masks = masks[user.pk]
+        rows.append([bool(user_masks.get(resource_name, 0) & bit) for resource_name, bit in bits])
+    return rows
+
+
+def current_generation():
+    """Текущее глобальное поколение (версия) правил RBAC."""
+    return matrix.sync()
+
+
+async def acurrent_generation():
+    """Асинхронный ``current_generation``."""
+    return (await matrix.arefresh())[0]
+
+
+def claim_versions(user_id):
+    """
+    ``(поколение, отметка изменения ролей пользователя)`` для проверки claim'а
+    ``rbac``: claim, выпущенный до отметки, не действует.
+    """
+    generation, _, changed = matrix.refresh([user_id])
+    return generation, changed[user_id]
+
+
+async def aclaim_versions(user_id):
+    generation, _, changed = await matrix.arefresh([user_id])
+    return generation, changed[user_id]
+
+
+def _bump_generation():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, time.time_ns(), None)
+
+
+def invalidate():
+    """
+    Инвалидирует матрицу во всех процессах.
+
+    Счетчик увеличивается сразу (чтобы текущий процесс видел изменения внутри
+    транзакции) и повторно после коммита, чтобы другие воркеры не закэшировали
+    состояние, прочитанное до фиксации транзакции. Перекомпиляция в любом
+    процессе читает правила из основной БД, а не из отстающей реплики.
+    """
+    deferred = _deferred.get()
+    if deferred is not None:
+        deferred['all'] = True
+        return
+    db_router.pin_all()
+    _bump_generation()
+    if connection.in_atomic_block:
+        transaction.on_commit(_bump_generation)
+
+
+def _stamp_users(user_ids):
+    matrix.forget(user_ids)
+    try:
+        seq = cache.incr(ROLES_SEQ_KEY)
+    except ValueError:
+        _counter({}, ROLES_SEQ_KEY)
+        seq = cache.incr(ROLES_SEQ_KEY)
+    cache.set_many({roles_key(user_id): seq for user_id in user_ids}, _stamp_timeout())
+
+
+def invalidate_users(user_ids):
+    """
+    Сброс кэша ролей пользователей ``user_ids`` во всех процессах (назначение
+    и снятие ролей). Как и в ``invalidate``, отметка ставится сразу и повторно
+    после коммита; за основной БД закрепляются только эти пользователи.
+    """
+    user_ids = set(user_ids) - {None}
+    if not user_ids:
+        return
+    deferred = _deferred.get()
+    if deferred is not None:
+        deferred['users'] |= user_ids
+        return
+    db_router.pin(user_ids)
+    _stamp_users(user_ids)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _stamp_users(user_ids))
+
+
+@contextmanager
+def batch():
+    """
+    Блок массовых изменений: ``invalidate`` и ``invalidate_users`` внутри
+    него (из сигналов на каждую строку) откладываются и выполняются один раз
+    по выходе; общий сброс заменяет сброс ролей пользователей.
+    """
+    if _deferred.get() is not None:
+        yield
+        return
+    token = _deferred.set({'all': False, 'users': set()})
+    try:
+        yield
+    finally:
+        requested = _deferred.get()
+        _deferred.reset(token)
+        if requested['all']:
+            invalidate()
+        elif requested['users']:
+            invalidate_users(requested['users'])
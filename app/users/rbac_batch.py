@@ -0,0 +1,278 @@
+"""
+Массовые операции RBAC: назначение и снятие ролей у многих пользователей и
+импорт/экспорт ролей, ресурсов и правил одним документом.
+
+Назначения пишутся в through-таблицу ``User.roles`` пакетными вставками и
+удалениями без ``m2m_changed`` на каждую строку; после пакета кэш ролей
+затронутых пользователей (``rbac.invalidate_users``) и кэш профилей
+сбрасываются один раз.
+
+Документ RBAC (JSON или YAML) описывает роли по названиям::
+
+    version: 1
+    resources: [orders, reports]
+    roles:
+      Manager:
+        parents: [Employee]
+        rules:
+          orders: {actions: [create, read], scope: own}
+
+Ключи упорядочены, поэтому выгрузки удобно хранить в репозитории и
+сравнивать. Импорт применяется в одной транзакции и записывает только
+отличия: правила перечисленных ролей и их родители приводятся к документу
+в точности, роли и ресурсы, которых нет в документе, удаляются только с
+``prune`` (вместе с ролями удаляются и их назначения пользователям).
+Изменения сбрасывают матрицу RBAC один раз (``rbac.batch``).
+"""
+import json
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db import transaction
+
+from . import profile_cache, rbac
+from .models import PermissionRule, Resource, Role, User
+
+VERSION = 1
+SCOPES = {'own': PermissionRule.OWN, 'team': PermissionRule.TEAM, 'all': PermissionRule.ALL}
+SCOPE_NAMES = {value: name for name, value in SCOPES.items()}
+# Действие документа -> поле правила.
+ACTION_FIELDS = {action: f'can_{action}' for action in rbac.ACTIONS}
+RULE_FIELDS = [*ACTION_FIELDS.values(), 'scope']
+
+
+def _chunks(values, size):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def unknown_ids(model, ids):
+    """Id из ``ids``, которых нет в таблице ``model`` (проверка пачками)."""
+    ids = sorted(set(ids))
+    found = set()
+    for chunk in _chunks(ids, settings.BULK_CREATE_BATCH_SIZE):
+        found.update(model.objects.filter(pk__in=chunk).values_list('pk', flat=True))
+    return [pk for pk in ids if pk not in found]
+
+
+def _roles_changed(user_ids):
+    rbac.invalidate_users(user_ids)
+    # Профили содержат названия ролей; одно поколение вместо версии каждого пользователя.
+    profile_cache.invalidate_all()
+
+
+@transaction.atomic
+def assign_roles(user_ids, role_ids, batch_size=None):
+    """
+    Назначение ролей ``role_ids`` пользователям ``user_ids``: вставляются
+    только недостающие пары. Возвращает их число.
+    """
+    through = User.roles.through
+    role_ids = sorted(set(role_ids))
+    batch_size = batch_size or settings.BULK_CREATE_BATCH_SIZE
+    created, changed = 0, set()
+    for chunk in _chunks(sorted(set(user_ids)), max(batch_size // max(len(role_ids), 1), 1)):
+        existing = set(through.objects.filter(user_id__in=chunk, role_id__in=role_ids).values_list('user_id', 'role_id'))
+        rows = [
+            through(user_id=user_id, role_id=role_id)
+            for user_id in chunk for role_id in role_ids if (user_id, role_id) not in existing
+        ]
+        # ignore_conflicts — на случай параллельного назначения тех же пар.
+        through.objects.bulk_create(rows, batch_size=batch_size, ignore_conflicts=True)
+        created += len(rows)
+        changed.update(row.user_id for row in rows)
+    if changed:
+        _roles_changed(changed)
+    return created
+
+
+@transaction.atomic
+def revoke_roles(user_ids, role_ids, batch_size=None):
+    """Снятие ролей ``role_ids`` с пользователей ``user_ids``; возвращает число удаленных назначений."""
+    through = User.roles.through
+    role_ids = sorted(set(role_ids))
+    removed, changed = 0, set()
+    for chunk in _chunks(sorted(set(user_ids)), batch_size or settings.BULK_CREATE_BATCH_SIZE):
+        rows = through.objects.filter(user_id__in=chunk, role_id__in=role_ids)
+        changed.update(rows.values_list('user_id', flat=True))
+        removed += rows.delete()[0]
+    if changed:
+        _roles_changed(changed)
+    return removed
+
+
+def export_document():
+    """Все роли, ресурсы и правила в виде документа RBAC."""
+    roles = {name: {'parents': [], 'rules': {}} for name in Role.objects.values_list('name', flat=True)}
+    names = dict(Role.objects.values_list('pk', 'name'))
+    for parent_id, child_id in Role.parents.through.objects.values_list('to_role_id', 'from_role_id'):
+        roles[names[child_id]]['parents'].append(names[parent_id])
+    rules = PermissionRule.objects.values_list('role__name', 'resource__name', *RULE_FIELDS)
+    for role_name, resource_name, *flags, scope in rules:
+        roles[role_name]['rules'][resource_name] = {
+            'actions': [action for action, flag in zip(ACTION_FIELDS, flags) if flag],
+            'scope': SCOPE_NAMES[scope],
+        }
+    for role in roles.values():
+        role['parents'].sort()
+    return {
+        'version': VERSION,
+        'resources': sorted(Resource.objects.values_list('name', flat=True)),
+        'roles': roles,
+    }
+
+
+def _names(value):
+    """Пустое значение или список непустых строк (названий)."""
+    return not value or isinstance(value, list) and all(isinstance(name, str) and name for name in value)
+
+
+def _parse(document):
+    """Проверка документа: ``(ресурсы, {роль: (родители, {ресурс: значения полей правила})})``."""
+    errors = []
+    if not isinstance(document, dict) or document.get('version') != VERSION:
+        raise ValidationError(f'Ожидается документ RBAC версии {VERSION}.', code='invalid')
+    resources = document.get('resources') or []
+    roles = document.get('roles') or {}
+    if not _names(resources):
+        raise ValidationError('resources: ожидается список названий.', code='invalid')
+    if not isinstance(roles, dict):
+        raise ValidationError('roles: ожидается словарь ролей по названиям.', code='invalid')
+
+    parsed = {}
+    for role_name, role in roles.items():
+        role = role or {}
+        if (not isinstance(role, dict) or not _names(role.get('parents'))
+                or not isinstance(role.get('rules') or {}, dict)):
+            errors.append(f'{role_name}: ожидается словарь с parents (список названий) и rules (словарь).')
+            continue
+        parents = set(role.get('parents') or [])
+        for parent in sorted(parents - roles.keys()):
+            errors.append(f'{role_name}: родительской роли {parent} нет в документе.')
+        rules = {}
+        for resource_name, rule in (role.get('rules') or {}).items():
+            rule = rule or {}
+            if (not isinstance(rule, dict) or not _names(rule.get('actions'))
+                    or not isinstance(rule.get('scope', 'own'), str)):
+                errors.append(f'{role_name}.{resource_name}: ожидается словарь с actions (список названий) и scope (строка).')
+                continue
+            if resource_name not in resources:
+                errors.append(f'{role_name}: ресурса {resource_name} нет в документе.')
+            actions = set(rule.get('actions') or [])
+            for action in sorted(actions - ACTION_FIELDS.keys()):
+                errors.append(f'{role_name}.{resource_name}: неизвестное действие {action}.')
+            scope = rule.get('scope', 'own')
+            if scope not in SCOPES:
+                errors.append(f'{role_name}.{resource_name}: неизвестная область {scope}.')
+            values = {field: action in actions for action, field in ACTION_FIELDS.items()}
+            values['scope'] = SCOPES.get(scope)
+            rules[resource_name] = values
+        parsed[role_name] = (parents, rules)
+    if errors:
+        raise ValidationError(errors, code='invalid')
+    return set(resources), parsed
+
+
+@transaction.atomic
+def import_document(document, prune=False, dry_run=False):
+    """
+    Приведение ролей, ресурсов и правил к документу. Возвращает число
+    изменений по видам; с ``dry_run`` изменения откатываются.
+    """
+    resources, roles = _parse(document)
+    changes = dict.fromkeys((
+        'resources_created', 'resources_deleted', 'roles_created', 'roles_deleted',
+        'rules_created', 'rules_updated', 'rules_deleted', 'parents_added', 'parents_removed',
+    ), 0)
+
+    with rbac.batch():
+        existing = set(Resource.objects.values_list('name', flat=True))
+        Resource.objects.bulk_create(Resource(name=name) for name in sorted(resources - existing))
+        changes['resources_created'] = len(resources - existing)
+        existing = set(Role.objects.values_list('name', flat=True))
+        Role.objects.bulk_create(Role(name=name) for name in sorted(roles.keys() - existing))
+        changes['roles_created'] = len(roles.keys() - existing)
+        if prune:
+            changes['roles_deleted'] = len(existing - roles.keys())
+            Role.objects.filter(name__in=existing - roles.keys()).delete()
+
+        role_ids = dict(Role.objects.filter(name__in=roles.keys()).values_list('name', 'pk'))
+        resource_ids = dict(Resource.objects.filter(name__in=resources).values_list('name', 'pk'))
+
+        # Правила: создаются недостающие, изменяются отличающиеся, удаляются лишние.
+        current = {
+            (rule.role_id, rule.resource_id): rule
+            for rule in PermissionRule.objects.filter(role_id__in=role_ids.values())
+        }
+        created, updated = [], {}
+        for role_name, (_, rules) in roles.items():
+            for resource_name, values in rules.items():
+                key = (role_ids[role_name], resource_ids[resource_name])
+                rule = current.pop(key, None)
+                if rule is None:
+                    created.append(PermissionRule(role_id=key[0], resource_id=key[1], **values))
+                elif any(getattr(rule, field) != value for field, value in values.items()):
+                    # Изменения группируются по новым значениям: один UPDATE на набор значений.
+                    updated.setdefault(tuple(values.items()), []).append(rule.pk)
+        PermissionRule.objects.bulk_create(created)
+        for values, pks in updated.items():
+            for chunk in _chunks(pks, settings.BULK_CREATE_BATCH_SIZE):
+                PermissionRule.objects.filter(pk__in=chunk).update(**dict(values))
+        PermissionRule.objects.filter(pk__in=[rule.pk for rule in current.values()]).delete()
+        changes.update(
+            rules_created=len(created), rules_updated=sum(map(len, updated.values())), rules_deleted=len(current),
+        )
+
+        # Родители: сначала удаления, затем добавления — промежуточный граф
+        # остается подграфом итогового и не содержит циклов.
+        edges = set(Role.parents.through.objects.filter(
+            from_role_id__in=role_ids.values()
+        ).values_list('to_role_id', 'from_role_id'))
+        wanted = {
+            (role_ids[parent], role_ids[role_name])
+            for role_name, (parents, _) in roles.items() for parent in parents
+        }
+        for pairs, method, key in ((edges - wanted, 'remove', 'parents_removed'), (wanted - edges, 'add', 'parents_added')):
+            by_child = {}
+            for parent_id, child_id in pairs:
+                by_child.setdefault(child_id, []).append(parent_id)
+            for child_id, parent_ids in by_child.items():
+                getattr(Role(pk=child_id).parents, method)(*parent_ids)
+            changes[key] = len(pairs)
+
+        if prune:
+            stale = Resource.objects.exclude(name__in=resources)
+            changes['resources_deleted'] = stale.count()
+            stale.delete()
+
+        if any(changes.values()):
+            # Пакетные вставки и изменения правил сигналов не отправляют.
+            rbac.invalidate()
+    if dry_run:
+        transaction.set_rollback(True)
+    return changes
+
+
+def dumps(document, fmt='json'):
+    if fmt == 'yaml':
+        return _yaml().safe_dump(document, allow_unicode=True, sort_keys=True)
+    return json.dumps(document, ensure_ascii=False, indent=2, sort_keys=True) + '\n'
+
+
+def loads(text, fmt='json'):
+    """Разбор документа; ошибка синтаксиса — ``ValueError``."""
+    if fmt == 'yaml':
+        yaml = _yaml()
+        try:
+            return yaml.safe_load(text)
+        except yaml.YAMLError as exc:
+            raise ValueError(f'Некорректный YAML: {exc}')
+    return json.loads(text)
+
+
+def _yaml():
+    try:
+        import yaml
+    except ImportError:  # pragma: no cover - PyYAML необязателен
+        raise ImproperlyConfigured('Для формата YAML нужен PyYAML: pip install pyyaml')
+    return yaml
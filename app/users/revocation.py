@@ -0,0 +1,132 @@
+"""
+Список отзыва access-токенов для stateless-аутентификации.
+
+``StatelessJWTAuthentication`` не загружает пользователя из БД, поэтому
+смена учетных данных — деактивация (``User.soft_delete``), смена пароля,
+``is_staff``/``is_superuser`` — и удаление учетной записи должны отзывать
+уже выданные access-токены иначе. ``User.save`` записывает время изменения
+в ``credentials_changed_at``, access-токен несет это время на момент
+выпуска (claim ``cred``, ``users/tokens.py``), и токен с более ранним
+временем отклоняется.
+
+Каждый процесс держит в памяти время последнего изменения только для
+пользователей, изменившихся за время жизни access-токена (более старые
+токены уже истекли), поэтому размер списка ограничен числом изменений за
+это окно. Изменения распространяются между воркерами через журнал в общем
+кэше (``users/journal.py``). Удаленных пользователей в БД нет, поэтому журнал
+не заменить перечитыванием ``credentials_changed_at``: кэш в памяти процесса
+при ``DEBUG=False`` отклоняет проверка ``users.E001`` (``users/checks.py``).
+"""
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from .journal import CacheJournal
+
+
+def stamp(changed_at):
+    """Время изменения учетных данных в claim'е и списке отзыва (секунды epoch, 0 — не менялись)."""
+    return changed_at.timestamp() if changed_at is not None else 0
+
+
+class RevokedUsers:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._changed = None
+        self._position = 0
+        self._synced_at = 0.0
+        self._pruned_at = 0.0
+        self._journal = None
+
+    @property
+    def window(self):
+        return settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME'].total_seconds()
+
+    @property
+    def journal(self):
+        if self._journal is None:
+            self._journal = CacheJournal('auth:revoked', int(self.window))
+        return self._journal
+
+    def _load(self):
+        from .models import User
+
+        position = self.journal.position()
+        recent = User.objects.filter(
+            credentials_changed_at__gte=timezone.now() - settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME']
+        ).values_list('id', 'credentials_changed_at')
+        self._changed = {user_id: stamp(changed_at) for user_id, changed_at in recent}
+        self._position = position
+        self._pruned_at = time.time()
+
+    def _prune(self):
+        # Токены, выпущенные до начала окна, уже истекли.
+        now = time.time()
+        if now - self._pruned_at < self.window:
+            return
+        horizon = now - self.window
+        self._changed = {user_id: changed for user_id, changed in self._changed.items() if changed >= horizon}
+        self._pruned_at = now
+
+    def _due(self, now):
+        interval = getattr(settings, 'AUTH_REVOCATION_SYNC_INTERVAL', 1.0)
+        return self._changed is None or now - self._synced_at >= interval
+
+    def _sync(self):
+        now = time.monotonic()
+        if not self._due(now):
+            return
+        with self._lock:
+            if self._changed is None:
+                self._load()
+            else:
+                position, changes = self.journal.read(self._position)
+                if changes is None:
+                    self._load()
+                else:
+                    for user_id, changed in changes:
+                        self._remember(user_id, changed)
+                    self._position = position
+                    self._prune()
+            self._synced_at = now
+
+    def _remember(self, user_id, changed):
+        if changed > self._changed.get(user_id, 0):
+            self._changed[user_id] = changed
+
+    def is_revoked(self, user_id, issued_for=0):
+        """
+        Отозван ли токен пользователя, выпущенный при времени изменения
+        учетных данных ``issued_for`` (claim ``cred``; 0 у старых токенов).
+        """
+        self._sync()
+        return issued_for < self._changed.get(user_id, 0)
+
+    async def ais_revoked(self, user_id, issued_for=0):
+        """Асинхронный ``is_revoked``: синхронизация (с обращением к кэшу и БД) идет в потоке."""
+        if self._due(time.monotonic()):
+            await sync_to_async(self._sync)()
+        return issued_for < self._changed.get(user_id, 0)
+
+    def revoke(self, user_id, changed_at=None):
+        """
+        Отзывает во всех процессах токены пользователя, выпущенные до
+        ``changed_at`` (по умолчанию — до текущего момента).
+        """
+        changed = stamp(changed_at or timezone.now())
+        if self._changed is not None:
+            self._remember(user_id, changed)
+        self.journal.append((user_id, changed))
+
+    def reset(self):
+        with self._lock:
+            self._changed = None
+            self._position = 0
+            self._synced_at = 0.0
+            self._pruned_at = 0.0
+
+
+revoked_users = RevokedUsers()
@@ -0,0 +1,178 @@
+"""
+Агрегаты заказов (``OrderRollup``): количество и сумма цен по владельцу за
+день и за месяц.
+
+Статистика (``GET /api/v1/resources/orders/stats/``) читает только строки
+агрегатов, поэтому стоимость ответа зависит от числа периодов, а не заказов.
+Агрегаты поддерживаются инкрементально:
+
+* сохранение и удаление заказа — сигналы ``users/signals.py``
+  (``create_order``, представления, админка);
+* массовое создание — ``services.bulk_create_orders`` (одно обновление на
+  период, а не на заказ);
+* ``generate_data`` записывает агрегаты вместе с заказами.
+
+``QuerySet.update()`` и SQL в обход ORM агрегаты не обновляют: расхождения
+находит и исправляет команда ``rebuild_order_rollups``.
+
+Границы дней и месяцев считаются в часовом поясе ``TIME_ZONE``.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .exports import format_decimal
+from .models import Order, OrderRollup
+
+GRANULARITIES = (OrderRollup.DAY, OrderRollup.MONTH)
+STATE_FIELDS = ('owner_id', 'created_at', 'price')
+DEFERRED = object()
+
+_total = DecimalField(max_digits=20, decimal_places=2)
+
+
+def periods(created_at):
+    """Начала дня и месяца заказа в часовом поясе по умолчанию."""
+    day = timezone.localtime(created_at, timezone.get_default_timezone()).date()
+    return ((OrderRollup.DAY, day), (OrderRollup.MONTH, day.replace(day=1)))
+
+
+def order_state(order, previous=None):
+    """
+    Значения заказа, от которых зависят агрегаты: ``(owner_id, created_at, price)``.
+    Отложенные (deferred) поля берутся из ``previous``, без него — ``DEFERRED``.
+    """
+    values = order.__dict__
+    return tuple(
+        values[name] if name in values else (previous[position] if previous else DEFERRED)
+        for position, name in enumerate(STATE_FIELDS)
+    )
+
+
+def buckets(states, sign=1):
+    """Изменения агрегатов ``{(owner_id, период, начало): [заказов, сумма]}`` для состояний заказов."""
+    changes = defaultdict(lambda: [0, Decimal(0)])
+    for state in states:
+        if None in state or DEFERRED in state:
+            continue
+        owner_id, created_at, price = state
+        for granularity, start in periods(created_at):
+            change = changes[owner_id, granularity, start]
+            change[0] += sign
+            change[1] += sign * Decimal(str(price))
+    return changes
+
+
+def apply(changes):
+    """
+    Применение изменений атомарными UPDATE ... SET x = x + delta. Строка
+    создается только для добавленных заказов: ее нет при вычитании, если
+    агрегаты удалены каскадом вместе с владельцем (удаление пользователя).
+    """
+    for (owner_id, granularity, start), (count, amount) in changes.items():
+        if not count and not amount:
+            continue
+        rows = OrderRollup.objects.filter(owner_id=owner_id, granularity=granularity, period_start=start)
+        delta = {'orders_count': F('orders_count') + count, 'total_price': F('total_price') + amount}
+        if rows.update(**delta) or count <= 0:
+            continue
+        try:
+            with transaction.atomic():
+                OrderRollup.objects.create(
+                    owner_id=owner_id, granularity=granularity, period_start=start,
+                    orders_count=count, total_price=amount,
+                )
+        except IntegrityError:
+            # Строку успел создать параллельный запрос.
+            rows.update(**delta)
+
+
+def record_orders(orders):
+    """Учет новых заказов (bulk_create не отправляет сигналы)."""
+    apply(buckets(order_state(order) for order in orders))
+
+
+def record_change(old_state, new_state):
+    """Учет изменения заказа: вычитание старого состояния и добавление нового."""
+    if old_state == new_state:
+        return
+    changes = buckets([old_state], sign=-1)
+    for key, (count, amount) in buckets([new_state]).items():
+        changes[key][0] += count
+        changes[key][1] += amount
+    apply(changes)
+
+
+# --- Чтение ---
+
+def stats(user, granularity=OrderRollup.MONTH, date_from=None, date_to=None):
+    """
+    Итоги и ряд по периодам для заказов пользователя. ``date_from``/``date_to``
+    ограничивают начала периодов (для месяцев ``date_from`` приводится к
+    началу месяца).
+    """
+    rows = OrderRollup.objects.filter(owner=user, granularity=granularity, orders_count__gt=0)
+    if date_from is not None:
+        if granularity == OrderRollup.MONTH:
+            date_from = date_from.replace(day=1)
+        rows = rows.filter(period_start__gte=date_from)
+    if date_to is not None:
+        rows = rows.filter(period_start__lte=date_to)
+
+    series, count, total = [], 0, Decimal(0)
+    for start, orders_count, total_price in rows.order_by('period_start').values_list(
+        'period_start', 'orders_count', 'total_price'
+    ):
+        count += orders_count
+        total += total_price
+        series.append({'period': start.isoformat(), 'count': orders_count, 'total': format_decimal(total_price, 2)})
+    return {'granularity': granularity, 'count': count, 'total': format_decimal(total, 2), 'periods': series}
+
+
+# --- Перестроение ---
+
+def expected(owner_ids):
+    """Агрегаты, вычисленные по самим заказам: ``{(owner_id, период, начало): (заказов, сумма)}``."""
+    days = (
+        Order.objects.filter(owner_id__in=owner_ids)
+        .values('owner_id', day=TruncDate('created_at', tzinfo=timezone.get_default_timezone()))
+        .annotate(count=Count('id'), total=Sum('price', output_field=_total))
+        .order_by()
+    )
+    result = defaultdict(lambda: [0, Decimal(0)])
+    for row in days:
+        day = row['day']
+        for key in ((row['owner_id'], OrderRollup.DAY, day), (row['owner_id'], OrderRollup.MONTH, day.replace(day=1))):
+            result[key][0] += row['count']
+            result[key][1] += row['total']
+    return {key: tuple(value) for key, value in result.items()}
+
+
+def rebuild(owner_ids, dry_run=False):
+    """
+    Сверка агрегатов владельцев с заказами. Агрегаты владельцев с
+    расхождениями пересоздаются (кроме ``dry_run``). Возвращает число
+    расходящихся периодов.
+    """
+    with transaction.atomic():
+        target = expected(owner_ids)
+        actual = {
+            (owner_id, granularity, start): (count, total)
+            for owner_id, granularity, start, count, total in OrderRollup.objects.filter(
+                owner_id__in=owner_ids, orders_count__gt=0
+            ).values_list('owner_id', 'granularity', 'period_start', 'orders_count', 'total_price')
+        }
+        stale = {key for key in target.keys() | actual.keys() if target.get(key) != actual.get(key)}
+        if stale and not dry_run:
+            owners = {key[0] for key in stale}
+            OrderRollup.objects.filter(owner_id__in=owners).delete()
+            OrderRollup.objects.bulk_create(
+                OrderRollup(owner_id=owner_id, granularity=granularity, period_start=start,
+                            orders_count=count, total_price=total)
+                for (owner_id, granularity, start), (count, total) in target.items() if owner_id in owners
+            )
+    return len(stale)
@@ -0,0 +1,157 @@
+"""
+Полнотекстовый поиск по заказам (``item``) и отчетам (``title``, ``content``).
+
+PostgreSQL: поле ``search_vector`` (tsvector, вес A — заголовок/товар,
+B — текст) заполняется триггером при любой вставке и изменении, включая
+``bulk_create``, ``QuerySet.update()`` и ``COPY``, и индексируется GIN.
+Триггер и индекс создает миграция ``0010_search_vector``. Запрос
+разбирается ``websearch_to_tsquery`` (кавычки, ``or``, ``-слово``),
+релевантность — ``ts_rank``.
+
+SQLite (локальный запуск): внешняя FTS5-таблица ``<таблица>_fts`` с
+триггерами синхронизации, запрос — все слова (без морфологии),
+релевантность — сумма весов полей, содержащих все слова. Таблица и
+триггеры создаются ``install`` после каждого ``migrate`` (сигнал
+``post_migrate``, повторный вызов ничего не меняет): SQLite удаляет
+триггеры при пересборке таблицы в миграциях. На остальных СУБД —
+``icontains`` без ранжирования.
+"""
+import logging
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import OperationalError, connections
+from django.db.models import BooleanField, F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+
+from .models import Order, Report
+
+logger = logging.getLogger(__name__)
+
+SEARCH_CONFIG = 'russian'
+RANK_FIELD = 'search_rank'
+
+# Поля поиска и их веса (A — самый значимый).
+SEARCH_FIELDS = {
+    Report: (('title', 'A'), ('content', 'B')),
+    Order: (('item', 'A'),),
+}
+# Вклад поля в ранг по весу (SQLite).
+RANK_WEIGHTS = {'A': 1.0, 'B': 0.4}
+
+_WORD = re.compile(r'\w+')
+
+
+def search(queryset, query, scoped=True):
+    """
+    Записи ``queryset``, соответствующие запросу, с релевантностью в
+    аннотации ``search_rank`` (больше — релевантнее). Порядок не задается.
+
+    ``scoped`` — ``queryset`` уже ограничен небольшим числом строк (записи
+    пользователя): на SQLite совпадение проверяется для каждой из них, иначе
+    строки выбираются из индекса. На PostgreSQL план выбирает СУБД.
+    """
+    model = queryset.model
+    connection = connections[queryset.db]
+    table = connection.ops.quote_name(model._meta.db_table)
+    if connection.vendor == 'postgresql':
+        tsquery = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+        # ts_rank возвращает real: без приведения к double precision значение в курсоре
+        # пагинации (float Python) не совпадает с рангом строки при сравнении.
+        rank = Cast(SearchRank(F('search_vector'), tsquery), FloatField())
+        return queryset.filter(search_vector=tsquery).annotate(**{RANK_FIELD: rank})
+
+    words = _WORD.findall(query)
+    if not words:
+        return queryset.annotate(**{RANK_FIELD: Value(0.0, output_field=FloatField())}).none()
+    if connection.vendor == 'sqlite' and _has_fts(connection, model):
+        fts = connection.ops.quote_name(f'{model._meta.db_table}_fts')
+        pk = connection.ops.quote_name(model._meta.pk.column)
+        row = f'{fts}.rowid = {table}.{pk}'
+        # Слова в кавычках: спецсимволы синтаксиса FTS5 в запросе пользователя не интерпретируются.
+        match = ' '.join(f'"{word}"' for word in words)
+        if scoped:
+            # Проверка по rowid для каждой строки пользователя.
+            matches = f'EXISTS (SELECT 1 FROM {fts} WHERE {fts} MATCH %s AND {row})'
+        else:
+            # Множество rowid совпадений строится один раз на запрос.
+            matches = f'{table}.{pk} IN (SELECT rowid FROM {fts} WHERE {fts} MATCH %s)'
+        queryset = queryset.filter(RawSQL(matches, [match], output_field=BooleanField()))
+        # bm25 пересчитывает частоту слова по всему индексу при каждом вызове, то есть
+        # для каждой строки стоит как полный просмотр. Ранг — сумма весов полей,
+        # содержащих все слова запроса.
+        fields = SEARCH_FIELDS[model]
+        if len(fields) == 1:
+            rank = Value(RANK_WEIGHTS[fields[0][1]], output_field=FloatField())
+        else:
+            rank = RawSQL(' + '.join(
+                f'(CASE WHEN {matches} THEN {RANK_WEIGHTS[weight]} ELSE 0 END)' for _, weight in fields
+            ), [f'{field} : ({match})' for field, _ in fields], output_field=FloatField())
+        return queryset.annotate(**{RANK_FIELD: rank})
+
+    condition = Q()
+    for word in words:
+        condition &= Q(*(Q(**{f'{field}__icontains': word}) for field, _ in SEARCH_FIELDS[model]), _connector=Q.OR)
+    return queryset.filter(condition).annotate(**{RANK_FIELD: Value(0.0, output_field=FloatField())})
+
+
+# --- Установка ---
+
+_fts_tables = {}
+
+
+def _has_fts(connection, model):
+    key = (connection.alias, connection.settings_dict['NAME'], model)
+    if key not in _fts_tables:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [f'{model._meta.db_table}_fts']
+            )
+            _fts_tables[key] = cursor.fetchone() is not None
+    return _fts_tables[key]
+
+
+def install(connection):
+    """Создание (при отсутствии) FTS5-таблиц и триггеров на SQLite."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for model, fields in SEARCH_FIELDS.items():
+            _install_sqlite(cursor, model._meta.db_table, fields)
+    _fts_tables.clear()
+
+
+def _install_sqlite(cursor, table, fields):
+    fts = f'{table}_fts'
+    columns = ', '.join(field for field, _ in fields)
+    new = ', '.join(f'new.{field}' for field, _ in fields)
+    old = ', '.join(f'old.{field}' for field, _ in fields)
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [fts])
+    if cursor.fetchone() is None:
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {fts} USING fts5({columns}, content='{table}', content_rowid='id', "
+                f"tokenize='unicode61 remove_diacritics 2')"
+            )
+        except OperationalError as exc:
+            logger.warning('FTS5 недоступен (%s): поиск по %s выполняется через LIKE', exc, table)
+            return
+        cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+    # Триггеры пересоздаются после миграций, перестраивающих таблицу на SQLite.
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new});
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old});
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {columns} ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old});
+            INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new});
+        END
+    """)
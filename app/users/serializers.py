@@ -1,6 +1,10 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.conf import settings
 from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError as DjangoValidationError
+from drf_spectacular.utils import extend_schema_field
+from . import hierarchy, rbac, rbac_batch
 from .models import Role, Resource, PermissionRule, Order, Report
 
 User = get_user_model()
@@ -8,8 +12,8 @@ User = get_user_model()
 class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
-        fields = '__all__'
-        read_only_fields = ('owner', 'created_at')
+        exclude = ('search_vector',)
+        read_only_fields = ('owner', 'created_at', 'updated_at')
 
 class ReportSerializer(serializers.ModelSerializer):
     summary = serializers.CharField(source='content', read_only=True)
@@ -17,8 +21,8 @@ class ReportSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Report
-        fields = '__all__'
-        read_only_fields = ('author', 'created_at', 'summary', 'report_id')
+        exclude = ('search_vector',)
+        read_only_fields = ('author', 'created_at', 'updated_at', 'summary', 'report_id')
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
@@ -51,6 +55,15 @@ class RoleSerializer(serializers.ModelSerializer):
         model = Role
         fields = '__all__'
 
+    def validate_parents(self, parents):
+        # Новая роль еще не имеет потомков — цикл возможен только при изменении.
+        if self.instance is not None:
+            try:
+                hierarchy.check_edges([(parent.pk, self.instance.pk) for parent in parents])
+            except DjangoValidationError as exc:
+                raise serializers.ValidationError(exc.messages)
+        return parents
+
 class ResourceSerializer(serializers.ModelSerializer):
     class Meta:
         model = Resource
@@ -60,3 +73,67 @@ class PermissionRuleSerializer(serializers.ModelSerializer):
     class Meta:
         model = PermissionRule
         fields = '__all__'
+
+@extend_schema_field({
+    'type': 'array',
+    'items': {'type': 'array', 'items': {'type': 'string'}, 'minItems': 2, 'maxItems': 2},
+})
+class PermissionChecksField(serializers.Field):
+    """
+    Список пар ``[ресурс, действие]``. Пары проверяются одним проходом, без
+    вложенных полей DRF на каждый элемент: сотня проверок в запросе иначе
+    занимает больше времени, чем само решение.
+    """
+    default_error_messages = {
+        'invalid': 'Ожидается непустой список пар [ресурс, действие].',
+        'max_length': 'Не более {max_length} проверок в запросе.',
+        'action': 'Неизвестные действия: {actions}. Допустимые: {allowed}.',
+    }
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list) or not data:
+            self.fail('invalid')
+        if len(data) > settings.AUTHZ_MAX_CHECKS:
+            self.fail('max_length', max_length=settings.AUTHZ_MAX_CHECKS)
+        checks = []
+        for item in data:
+            if not isinstance(item, list) or len(item) != 2 or not all(isinstance(part, str) for part in item):
+                self.fail('invalid')
+            checks.append(tuple(item))
+        unknown = sorted({action for _, action in checks if action not in rbac.ACTIONS})
+        if unknown:
+            self.fail('action', actions=', '.join(unknown), allowed=', '.join(rbac.ACTIONS))
+        return checks
+
+    def to_representation(self, value):
+        return [list(check) for check in value]
+
+class PermissionCheckSerializer(serializers.Serializer):
+    """Пакетная проверка прав: пары ``[ресурс, действие]`` и (для администратора) id пользователей."""
+    checks = PermissionChecksField()
+    users = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=False, allow_empty=False,
+        max_length=settings.AUTHZ_MAX_USERS,
+    )
+
+    def validate_users(self, users):
+        return list(dict.fromkeys(users))
+
+class RoleAssignmentSerializer(serializers.Serializer):
+    """Массовое назначение или снятие ролей: id пользователей и id ролей."""
+    users = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=settings.RBAC_BULK_MAX_USERS,
+    )
+    roles = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=100)
+
+    def validate_users(self, users):
+        unknown = rbac_batch.unknown_ids(User, users)
+        if unknown:
+            raise serializers.ValidationError(f"Неизвестные пользователи: {', '.join(map(str, unknown[:20]))}.")
+        return users
+
+    def validate_roles(self, roles):
+        unknown = rbac_batch.unknown_ids(Role, roles)
+        if unknown:
+            raise serializers.ValidationError(f"Неизвестные роли: {', '.join(map(str, unknown))}.")
+        return roles
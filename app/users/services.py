@@ -1,5 +1,7 @@
+from django.conf import settings
 from django.db import transaction
 from .models import Order, Report
+from . import rollups, versions
 
 def get_user_orders(user):
     """
@@ -7,21 +9,62 @@ def get_user_orders(user):
     """
     # Если пользователь суперюзер или имеет глобальные права - можно менять логику.
     # Пока возвращаем только свои.
-    return Order.objects.filter(owner=user)
+    # Порядок совпадает с индексом (owner, created_at, id) и keyset-пагинацией.
+    return Order.objects.filter(owner=user).order_by('-created_at', '-id')
+
+def get_orders():
+    """
+    Все заказы в порядке списков. Доступные пользователю записи выбирает
+    область его прав (users/filters.py).
+    """
+    return Order.objects.order_by('-created_at', '-id')
 
 @transaction.atomic
 def create_order(user, data):
     """
     Создание заказа для пользователя.
+    Агрегаты заказов обновляются сигналом post_save в той же транзакции.
     """
     order = Order.objects.create(owner=user, **data)
     return order
 
+async def acreate_order(user, data):
+    """
+    Асинхронное создание заказа (ASGI-представления).
+    """
+    return await Order.objects.acreate(owner=user, **data)
+
+@transaction.atomic
+def bulk_create_orders(user, items, batch_size=None):
+    """
+    Массовое создание заказов пользователя в одной транзакции.
+    Строки вставляются пакетами по batch_size (bulk_create).
+    bulk_create не отправляет сигналы: агрегаты обновляются здесь, по одному
+    обновлению на период, как и версия коллекции (users/versions.py).
+    """
+    orders = [Order(owner=user, **data) for data in items]
+    orders = Order.objects.bulk_create(orders, batch_size=batch_size or settings.BULK_CREATE_BATCH_SIZE)
+    rollups.record_orders(orders)
+    versions.bump(Order, [user.pk])
+    return orders
+
+def get_order_stats(user, granularity, date_from=None, date_to=None):
+    """
+    Статистика заказов пользователя по агрегатам (users/rollups.py).
+    """
+    return rollups.stats(user, granularity, date_from, date_to)
+
 def get_user_reports(user):
     """
     Получение отчетов.
     """
-    return Report.objects.filter(author=user)
+    return Report.objects.filter(author=user).order_by('-created_at', '-id')
+
+def get_reports():
+    """
+    Все отчеты в порядке списков (область прав — users/filters.py).
+    """
+    return Report.objects.order_by('-created_at', '-id')
 
 @transaction.atomic
 def create_report(user, data):
@@ -30,3 +73,19 @@ def create_report(user, data):
     """
     report = Report.objects.create(author=user, **data)
     return report
+
+async def acreate_report(user, data):
+    """
+    Асинхронное создание отчета.
+    """
+    return await Report.objects.acreate(author=user, **data)
+
+@transaction.atomic
+def bulk_create_reports(user, items, batch_size=None):
+    """
+    Массовое создание отчетов (bulk_create без сигналов, версия коллекции обновляется здесь).
+    """
+    reports = [Report(author=user, **data) for data in items]
+    reports = Report.objects.bulk_create(reports, batch_size=batch_size or settings.BULK_CREATE_BATCH_SIZE)
+    versions.bump(Report, [user.pk])
+    return reports
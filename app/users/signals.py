@@ -0,0 +1,171 @@
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_migrate, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import hierarchy, metrics, profile_cache, rbac, rollups, search, versions
+from .revocation import revoked_users
+from .models import Order, PermissionRule, Report, Resource, Role, User
+
+
+@receiver(post_delete, sender=Role)
+@receiver(post_save, sender=Resource)
+@receiver(post_delete, sender=Resource)
+@receiver(post_save, sender=PermissionRule)
+@receiver(post_delete, sender=PermissionRule)
+def invalidate_rbac_matrix(sender, **kwargs):
+    """
+    Сброс матрицы RBAC при изменении правил, ресурсов или удалении ролей.
+    Создание и переименование роли на матрицу не влияют (она индексируется по id).
+    """
+    rbac.invalidate()
+
+
+@receiver(m2m_changed, sender=User.roles.through)
+def invalidate_user_roles(sender, instance, action, reverse, pk_set, **kwargs):
+    """Сброс кэша ролей только затронутых пользователей при назначении/снятии ролей."""
+    if action == 'pre_clear' and reverse:
+        # После очистки пользователи роли уже неизвестны.
+        instance._cleared_users = list(instance.users.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        rbac.invalidate_users(pk_set if reverse else [instance.pk])
+    elif action == 'post_clear':
+        rbac.invalidate_users(instance.__dict__.pop('_cleared_users', ()) if reverse else [instance.pk])
+
+
+@receiver(m2m_changed, sender=Role.parents.through)
+def maintain_role_closure(sender, instance, action, reverse, pk_set, using, **kwargs):
+    """Замыкание наследования ролей (users/hierarchy.py) и сброс матрицы RBAC."""
+    if action in ('pre_add', 'pre_remove', 'pre_clear'):
+        # m2m-менеджер выполняет изменение в транзакции: блокировка держится до ее конца.
+        hierarchy.lock(using)
+    if action == 'pre_add':
+        hierarchy.check_edges(hierarchy.edges(instance, reverse, pk_set))
+    elif action == 'post_add':
+        hierarchy.add_edges(hierarchy.edges(instance, reverse, pk_set))
+    elif action == 'post_remove':
+        hierarchy.remove_edges(hierarchy.edges(instance, reverse, pk_set))
+    elif action == 'pre_clear':
+        # После очистки список удаленных ребер уже недоступен.
+        related = instance.children if reverse else instance.parents
+        instance._cleared_edges = hierarchy.edges(instance, reverse, related.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        hierarchy.remove_edges(instance.__dict__.pop('_cleared_edges', ()))
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        rbac.invalidate()
+
+
+@receiver(pre_delete, sender=Role)
+def detach_deleted_role(sender, instance, **kwargs):
+    """Ребра удаляемой роли удаляются каскадом без m2m_changed: убираем их из замыкания заранее."""
+    instance.parents.clear()
+    instance.children.clear()
+
+
+@receiver(m2m_changed, sender=User.roles.through)
+def invalidate_profiles_on_roles(sender, instance, action, reverse, pk_set, **kwargs):
+    """Профили (users/profile_cache.py) содержат названия ролей."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        profile_cache.invalidate_user(instance.pk)
+    elif pk_set:
+        for user_id in pk_set:
+            profile_cache.invalidate_user(user_id)
+    else:
+        # role.users.clear(): список пользователей неизвестен.
+        profile_cache.invalidate_all()
+
+
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+def invalidate_profiles_on_role_change(sender, created=False, **kwargs):
+    """Переименование или удаление роли меняет профили всех ее пользователей."""
+    if not created:
+        profile_cache.invalidate_all()
+
+
+@receiver(post_save, sender=User)
+def sync_user_revocation(sender, instance, **kwargs):
+    """Отзыв access-токенов при смене пароля, активности или флагов администратора (User.save)."""
+    if instance.__dict__.pop('_revoke_tokens', False):
+        revoked_users.revoke(instance.pk, instance.credentials_changed_at)
+
+
+@receiver(post_delete, sender=User)
+def revoke_deleted_user(sender, instance, **kwargs):
+    revoked_users.revoke(instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_profile(sender, instance, update_fields=None, **kwargs):
+    # Обновление только last_login (при входе) профиль не меняет.
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    profile_cache.invalidate_user(instance.pk)
+
+
+@receiver(post_migrate)
+def install_search(sender, using, **kwargs):
+    """FTS5-индексы и триггеры SQLite (users/search.py) после миграций приложения."""
+    if sender.name == 'users':
+        search.install(connections[using])
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    """Подсчет SQL-запросов и времени БД для метрик запроса (users/metrics.py)."""
+    metrics.install_query_wrapper(connection)
+
+
+@receiver(post_init, sender=Order)
+def remember_order_state(sender, instance, **kwargs):
+    """Значения заказа при загрузке: по ним post_save вычисляет изменение агрегатов."""
+    instance._rollup_state = rollups.order_state(instance)
+
+
+@receiver(pre_save, sender=Order)
+def load_order_state(sender, instance, update_fields=None, **kwargs):
+    # Заказ загружен с отложенными полями (only/defer): прежние значения читаются из БД.
+    if not instance._state.adding and rollups.DEFERRED in instance._rollup_state:
+        row = Order.objects.filter(pk=instance.pk).values_list(*rollups.STATE_FIELDS).first()
+        if row is not None:
+            instance._rollup_state = row
+
+
+@receiver(post_save, sender=Order)
+def update_order_rollups(sender, instance, created, **kwargs):
+    """Обновление агрегатов заказов (users/rollups.py) при создании и изменении заказа."""
+    state = rollups.order_state(instance, instance._rollup_state)
+    if created:
+        rollups.record_orders([instance])
+    else:
+        rollups.record_change(instance._rollup_state, state)
+    instance._rollup_state = state
+
+
+@receiver(post_delete, sender=Order)
+def remove_order_from_rollups(sender, instance, **kwargs):
+    rollups.apply(rollups.buckets([rollups.order_state(instance, instance._rollup_state)], sign=-1))
+
+
+@receiver(post_init, sender=Order)
+@receiver(post_init, sender=Report)
+def remember_collection_owner(sender, instance, **kwargs):
+    """Владелец при загрузке: при его смене меняются обе коллекции."""
+    instance._collection_owner = instance.__dict__.get(versions.OWNER_FIELDS[sender])
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_save, sender=Report)
+@receiver(post_delete, sender=Order)
+@receiver(post_delete, sender=Report)
+def bump_collection_version(sender, instance, using, **kwargs):
+    """Новая версия коллекции владельца (users/versions.py): ETag списков и записей меняется."""
+    field = versions.OWNER_FIELDS[sender]
+    owners = {instance._collection_owner, instance.__dict__.get(field)} - {None}
+    if not owners and field in instance.get_deferred_fields():
+        owners = {getattr(instance, field)}
+    versions.bump(sender, owners, using)
+    instance._collection_owner = instance.__dict__.get(field)
@@ -1,12 +1,64 @@
+import csv
+import json
 import pytest
+import queue
+from asgiref.sync import async_to_sync
+from types import SimpleNamespace
+from urllib.parse import urlencode
 from django.contrib.auth import get_user_model
+from datetime import timedelta
+from django.core.cache import cache
+from django.db import connection
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from django.test import AsyncClient, Client
 from rest_framework.test import APIClient
 from rest_framework import status
-from .models import Role, Resource, PermissionRule, Order
-from .services import create_order, get_user_orders
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+from .audit import AuditWriter, audit_log
+from .models import AuditEvent, Role, RoleClosure, Resource, PermissionRule, Order, OrderRollup, Report, Team
+from .serializers import OrderSerializer, ReportSerializer
+from .services import bulk_create_orders, create_order, get_user_orders
+from .authentication import StatelessJWTAuthentication
+from .blacklist import revoked_tokens
+from .fast_serializers import RowEncoder
+from .hashing import hashing_pool
+from .metrics import registry as metrics_registry
+from .throttles import LoginEmailThrottle, local_buckets, throttle_counters
+from .renderers import FastJSONRenderer
+from .permissions import CustomRBACPermission
+from .revocation import revoked_users
+from .tokens import RBAC_CLAIM, RBACRefreshToken, RBACTokenRefreshSerializer, claim_mask
+from . import hierarchy, profile_cache, rbac, rbac_batch
+from core import db_router
 
 User = get_user_model()
 
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """Сброс кэшей между тестами (откат транзакции теста не вызывает сигналы)"""
+    cache.clear()
+    rbac.matrix.reset()
+    revoked_users.reset()
+    revoked_tokens.reset()
+    local_buckets.reset()
+    yield
+    cache.clear()
+    rbac.matrix.reset()
+    revoked_users.reset()
+    revoked_tokens.reset()
+    local_buckets.reset()
+
+@pytest.fixture(autouse=True)
+def no_audit(settings):
+    """Журнал аудита выключен: фоновый поток писал бы в БД теста (включается в TestAudit)"""
+    settings.AUDIT_LOG = False
+
 @pytest.fixture
 def user():
     """Фикстура для создания пользователя"""
@@ -98,3 +150,1263 @@ class TestAPI:
         assert response.status_code == status.HTTP_201_CREATED
         assert Order.objects.count() == 1
         assert Order.objects.first().owner == user
+
+class TestRBACMatrix:
+    @pytest.mark.django_db
+    def test_steady_state_without_queries(self, user_with_role, permission_rule, django_assert_num_queries):
+        """Повторная проверка прав не обращается к БД"""
+        assert rbac.has_access(user_with_role, 'orders', rbac.READ)
+        with django_assert_num_queries(0):
+            assert rbac.has_access(user_with_role, 'orders', rbac.READ)
+            assert not rbac.has_access(user_with_role, 'orders', rbac.CREATE)
+            assert not rbac.has_access(user_with_role, 'reports', rbac.READ)
+
+    @pytest.mark.django_db
+    def test_rule_change_invalidates(self, user_with_role, permission_rule):
+        """Изменение правила увеличивает поколение и перекомпилирует матрицу"""
+        generation = rbac.current_generation()
+        assert not rbac.has_access(user_with_role, 'orders', rbac.CREATE)
+        permission_rule.can_create = True
+        permission_rule.save()
+        assert rbac.current_generation() != generation
+        assert rbac.has_access(user_with_role, 'orders', rbac.CREATE)
+
+    @pytest.mark.django_db
+    def test_role_assignment_invalidates(self, user, tester_role, permission_rule, django_assert_num_queries):
+        """Назначение и снятие роли сбрасывают кэш ролей только этого пользователя, матрица не перекомпилируется"""
+        other = User.objects.create_user(email='other@example.com')
+        other.roles.add(tester_role)
+        assert rbac.has_access(other, 'orders', rbac.READ)
+        generation = rbac.current_generation()
+
+        assert not rbac.has_access(user, 'orders', rbac.READ)
+        user.roles.add(tester_role)
+        assert rbac.has_access(user, 'orders', rbac.READ)
+        with django_assert_num_queries(0):
+            assert rbac.has_access(other, 'orders', rbac.READ)
+        tester_role.users.remove(other)
+        assert not rbac.has_access(other, 'orders', rbac.READ)
+        tester_role.users.clear()
+        assert not rbac.has_access(user, 'orders', rbac.READ)
+        assert rbac.current_generation() == generation
+
+    @pytest.mark.django_db
+    def test_evicted_stamp_fails_closed(self, user_with_role, permission_rule):
+        """Роли, снятые в другом процессе, не остаются в силе, если отметка вытеснена из кэша"""
+        claim = RBACRefreshToken.for_user(user_with_role).access_token[RBAC_CLAIM]
+        assert rbac.has_access(user_with_role, 'orders', rbac.READ)
+        # Другой воркер снял роль и поставил отметку, которую затем вытеснил кэш.
+        User.roles.through.objects.filter(user=user_with_role).delete()
+        cache.incr(rbac.ROLES_SEQ_KEY)
+        cache.delete(rbac.roles_key(user_with_role.pk))
+
+        assert not rbac.has_access(user_with_role, 'orders', rbac.READ)
+        assert claim_mask(claim, 'orders', rbac.claim_versions(user_with_role.pk)) is None
+        # Отметка поставлена заново, роли снова кэшируются.
+        assert cache.get(rbac.roles_key(user_with_role.pk)) == cache.get(rbac.ROLES_SEQ_KEY)
+
+class TestRBACClaims:
+    @pytest.mark.django_db
+    def test_access_token_contains_masks(self, user_with_role, permission_rule):
+        """Access-токен содержит маски прав, текущее поколение RBAC и счетчик изменений ролей"""
+        access = RBACRefreshToken.for_user(user_with_role).access_token
+        assert access[RBAC_CLAIM] == {
+            'v': rbac.current_generation(), 'r': cache.get(rbac.ROLES_SEQ_KEY), 'p': {'orders': rbac.READ},
+        }
+
+    @pytest.mark.django_db
+    def test_refresh_restamps_claim(self, user_with_role, permission_rule):
+        """При обновлении токена claim пересчитывается по текущим правилам"""
+        refresh = RBACRefreshToken.for_user(user_with_role)
+        assert RBAC_CLAIM not in refresh
+        permission_rule.can_create = True
+        permission_rule.save()
+        serializer = RBACTokenRefreshSerializer(data={'refresh': str(refresh)})
+        assert serializer.is_valid(), serializer.errors
+        access = AccessToken(serializer.validated_data['access'])
+        assert access[RBAC_CLAIM]['p'] == {'orders': rbac.READ | rbac.CREATE}
+
+    @pytest.mark.django_db
+    def test_permission_uses_claim(self, user_with_role, permission_rule, django_assert_num_queries):
+        """Актуальный claim используется без запросов к БД, устаревший игнорируется"""
+        access = RBACRefreshToken.for_user(user_with_role).access_token
+        rbac.matrix.reset()
+        rbac.current_generation()
+        request = SimpleNamespace(user=user_with_role, auth=access, method='GET')
+        view = SimpleNamespace(required_resource='orders')
+        with django_assert_num_queries(0):
+            assert CustomRBACPermission().has_permission(request, view)
+
+        # Снятие роли у другого пользователя claim не затрагивает, у владельца токена — делает устаревшим.
+        User.objects.create_user(email='other@example.com').roles.add(permission_rule.role)
+        with django_assert_num_queries(0):
+            assert CustomRBACPermission().has_permission(request, view)
+        user_with_role.roles.clear()
+        assert not CustomRBACPermission().has_permission(request, view)
+
+        user_with_role.roles.add(permission_rule.role)
+        request.auth = RBACRefreshToken.for_user(user_with_role).access_token
+        permission_rule.can_read = False
+        permission_rule.save()
+        assert not CustomRBACPermission().has_permission(request, view)
+
+class TestStatelessAuthentication:
+    @pytest.mark.django_db
+    def test_user_built_from_claims(self, user, django_assert_num_queries):
+        """Пользователь восстанавливается из токена без запроса, остальные поля догружаются одним запросом"""
+        access = RBACRefreshToken.for_user(user).access_token
+        revoked_users.is_revoked(user.pk)
+        with django_assert_num_queries(0):
+            token_user = StatelessJWTAuthentication().get_user(access)
+            assert token_user.pk == user.pk
+            assert not token_user.is_superuser
+        with django_assert_num_queries(1):
+            assert token_user.email == 'test@example.com'
+            assert token_user.last_name == ''
+
+    @pytest.mark.django_db
+    def test_soft_delete_revokes_token(self, user):
+        """Мягкое удаление отзывает уже выданные access-токены"""
+        access = RBACRefreshToken.for_user(user).access_token
+        token_user = StatelessJWTAuthentication().get_user(access)
+        token_user.soft_delete()
+        assert not User.objects.get(pk=user.pk).is_active
+        with pytest.raises(AuthenticationFailed):
+            StatelessJWTAuthentication().get_user(access)
+
+    @pytest.mark.django_db
+    def test_privilege_change_revokes_token(self, user, settings):
+        """Снятие прав администратора и смена пароля отзывают выданные access-токены, новые токены действуют"""
+        user.is_staff = user.is_superuser = True
+        user.save()
+        access = RBACRefreshToken.for_user(User.objects.get(pk=user.pk)).access_token
+        assert StatelessJWTAuthentication().get_user(access).is_superuser
+
+        demoted = User.objects.get(pk=user.pk)
+        demoted.is_superuser = False
+        demoted.save(update_fields=['is_superuser'])
+        with pytest.raises(AuthenticationFailed):
+            StatelessJWTAuthentication().get_user(access)
+        access = RBACRefreshToken.for_user(User.objects.get(pk=user.pk)).access_token
+        token_user = StatelessJWTAuthentication().get_user(access)
+        assert token_user.is_staff and not token_user.is_superuser
+
+        # Сохранение без изменения флагов токены не отзывает.
+        token_user.first_name = 'Ivan'
+        token_user.save()
+        assert StatelessJWTAuthentication().get_user(access)
+        token_user.set_password('new-password')
+        token_user.save()
+        with pytest.raises(AuthenticationFailed):
+            StatelessJWTAuthentication().get_user(access)
+
+        # В процесс загружаются только изменения за время жизни access-токена.
+        User.objects.filter(pk=user.pk).update(
+            credentials_changed_at=timezone.now() - settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME'] - timedelta(seconds=1)
+        )
+        revoked_users.reset()
+        cache.clear()
+        assert not revoked_users.is_revoked(user.pk)
+        assert revoked_users._changed == {}
+
+    @pytest.mark.django_db
+    def test_save_keeps_stale_flags(self, user):
+        """Сохранение не перезаписывает флаги из устаревшего токена"""
+        access = RBACRefreshToken.for_user(user).access_token
+        User.objects.filter(pk=user.pk).update(is_staff=True)
+        token_user = StatelessJWTAuthentication().get_user(access)
+        token_user.first_name = 'Ivan'
+        token_user.save()
+        user.refresh_from_db()
+        assert user.first_name == 'Ivan'
+        assert user.is_staff
+
+class TestTokenBlacklist:
+    @pytest.mark.django_db
+    def test_rotated_token_rejected(self, client, user):
+        """После ротации старый refresh-токен попадает в черный список"""
+        resp = client.post('/api/v1/auth/login/', {'email': 'test@example.com', 'password': 'password'})
+        refresh = resp.data['refresh']
+        resp = client.post('/api/v1/auth/token/refresh/', {'refresh': refresh})
+        assert resp.status_code == status.HTTP_200_OK
+        resp = client.post('/api/v1/auth/token/refresh/', {'refresh': refresh})
+        assert resp.status_code == status.HTTP_401_UNAUTHORIZED
+
+    @pytest.mark.django_db
+    def test_not_revoked_without_queries(self, user, django_assert_num_queries):
+        """Проверка неотозванного токена отвечает из фильтра Блума"""
+        revoked_tokens.is_revoked('warm-up')
+        with django_assert_num_queries(0):
+            assert not revoked_tokens.is_revoked('unknown-jti')
+
+    @pytest.mark.django_db
+    def test_prune_tokens_in_batches(self, user):
+        """Команда удаляет только истекшие токены пакетами"""
+        now = timezone.now()
+        for i in range(5):
+            token = OutstandingToken.objects.create(
+                user=user, jti=f'expired-{i}', token='x', created_at=now - timedelta(days=2),
+                expires_at=now - timedelta(days=1),
+            )
+            BlacklistedToken.objects.create(token=token)
+        OutstandingToken.objects.create(
+            user=user, jti='alive', token='x', created_at=now, expires_at=now + timedelta(days=1),
+        )
+        call_command('prune_tokens', batch_size=2, max_batches=2)
+        assert OutstandingToken.objects.count() == 2
+        call_command('prune_tokens', batch_size=2)
+        assert list(OutstandingToken.objects.values_list('jti', flat=True)) == ['alive']
+        assert BlacklistedToken.objects.count() == 0
+
+class TestKeysetPagination:
+    @pytest.mark.django_db
+    def test_walk_pages(self, client, auth_token, permission_rule, user):
+        """Курсорная пагинация обходит все заказы без повторов и пропусков"""
+        Order.objects.bulk_create(Order(owner=user, item=f'Item {i}', price=i) for i in range(25))
+        expected = list(get_user_orders(user).values_list('id', flat=True))
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {auth_token}')
+
+        seen, pages, url = [], [], '/api/v1/resources/orders/'
+        while url:
+            response = client.get(url)
+            assert response.status_code == status.HTTP_200_OK
+            assert 'count' not in response.data
+            pages.append(response.data)
+            seen.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        assert seen == expected
+        assert [len(page['results']) for page in pages] == [10, 10, 5]
+
+        response = client.get(pages[2]['previous'])
+        assert [item['id'] for item in response.data['results']] == expected[10:20]
+
+    @pytest.mark.django_db
+    def test_count_on_request(self, client, auth_token, permission_rule, user):
+        """Общее число записей возвращается только по ?count=true"""
+        create_order(user, {'item': 'Item', 'price': 10})
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {auth_token}')
+        response = client.get('/api/v1/resources/orders/?count=true')
+        assert response.data['count'] == 1
+
+class TestBulkCreate:
+    @pytest.fixture
+    def writer_token(self, client, auth_token, permission_rule):
+        permission_rule.can_create = True
+        permission_rule.save()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {auth_token}')
+        return auth_token
+
+    @pytest.mark.django_db
+    def test_bulk_json(self, client, writer_token, user):
+        """JSON-массив создается одной операцией с результатами по элементам"""
+        items = [{'item': f'Item {i}', 'price': i} for i in range(5)]
+        response = client.post('/api/v1/resources/orders/bulk/?batch_size=2', items, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['created'] == 5
+        ids = [result['id'] for result in response.data['results']]
+        assert list(Order.objects.filter(owner=user).order_by('id').values_list('id', flat=True)) == sorted(ids)
+
+    @pytest.mark.django_db
+    def test_bulk_ndjson(self, client, writer_token, user):
+        """NDJSON-поток разбирается построчно"""
+        body = '{"item": "A", "price": "1.50"}\n\n{"item": "B", "price": 2}\n'
+        response = client.post('/api/v1/resources/orders/bulk/', body, content_type='application/x-ndjson')
+        assert response.status_code == status.HTTP_201_CREATED
+        assert sorted(Order.objects.values_list('item', flat=True)) == ['A', 'B']
+
+    @pytest.mark.django_db
+    def test_bulk_invalid_item_rejects_batch(self, client, writer_token):
+        """Ошибка в одном элементе отклоняет весь пакет с указанием индекса"""
+        items = [{'item': 'Ok', 'price': 1}, {'item': 'Bad', 'price': 'abc'}]
+        response = client.post('/api/v1/resources/orders/bulk/', items, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert [result['index'] for result in response.data['results']] == [1]
+        assert Order.objects.count() == 0
+
+    @pytest.mark.django_db
+    def test_bulk_requires_create_permission(self, client, auth_token, permission_rule):
+        """Без can_create массовое создание запрещено"""
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {auth_token}')
+        response = client.post('/api/v1/resources/orders/bulk/', [{'item': 'A', 'price': 1}], format='json')
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+class TestExport:
+    @pytest.mark.django_db
+    def test_export_ndjson(self, client, auth_token, permission_rule, user):
+        """NDJSON-выгрузка содержит все заказы пользователя и только их"""
+        create_order(user, {'item': 'Item 1', 'price': 10})
+        create_order(user, {'item': 'Товар 2', 'price': '20.5'})
+        other = User.objects.create_user(email='other@example.com', password='password')
+        create_order(other, {'item': 'Foreign', 'price': 1})
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {auth_token}')
+
+        response = client.get('/api/v1/resources/orders/export/')
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'application/x-ndjson'
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        assert [row['item'] for row in rows] == ['Товар 2', 'Item 1']
+        assert rows[0]['price'] == '20.50'
+        assert rows[0]['created_at'] == OrderSerializer(Order.objects.get(item='Товар 2')).data['created_at']
+
+    @pytest.mark.django_db
+    def test_export_csv(self, client, auth_token, permission_rule, user):
+        """CSV-выгрузка начинается с заголовка"""
+        create_order(user, {'item': 'Item, with comma', 'price': 10})
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {auth_token}')
+        response = client.get('/api/v1/resources/orders/export/?fmt=csv')
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        assert rows[0] == ['id', 'item', 'price', 'created_at', 'updated_at', 'owner']
+        assert rows[1][1:3] == ['Item, with comma', '10.00']
+
+    @pytest.mark.django_db
+    def test_export_requires_read(self, client, auth_token, permission_rule):
+        """Выгрузка отчетов без can_read запрещена"""
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {auth_token}')
+        response = client.get('/api/v1/resources/reports/export/')
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+class TestFastSerializers:
+    @pytest.mark.django_db
+    def test_orders_bytes_identical(self, user):
+        """Быстрый путь дает те же байты, что ModelSerializer + JSONRenderer"""
+        create_order(user, {'item': 'Товар  "кавычки"', 'price': '20.5'})
+        create_order(user, {'item': 'Item', 'price': 10})
+        Order.objects.create(owner=None, item='Ничей', price='0.01')
+        queryset = Order.objects.order_by('id')
+
+        encoder = RowEncoder(OrderSerializer)
+        fast = FastJSONRenderer().render(encoder.encode_many(queryset.values(*encoder.fields)))
+        assert fast == JSONRenderer().render(OrderSerializer(queryset, many=True).data)
+
+    @pytest.mark.django_db
+    def test_reports_bytes_identical(self, user):
+        """Поля с source (summary, report_id) кодируются так же"""
+        Report.objects.create(author=user, title='Отчет', content='Текст\nс переводом строки')
+        queryset = Report.objects.order_by('id')
+
+        encoder = RowEncoder(ReportSerializer)
+        fast = FastJSONRenderer().render(encoder.encode_many(queryset.values(*encoder.fields)))
+        assert fast == JSONRenderer().render(ReportSerializer(queryset, many=True).data)
+
+    @pytest.mark.django_db
+    def test_api_list_and_retrieve_identical(self, client, auth_token, permission_rule, user, settings):
+        """Ответы list/retrieve совпадают с обычной сериализацией"""
+        for i in range(3):
+            create_order(user, {'item': f'Item {i}', 'price': f'{i}.5'})
+        order_id = Order.objects.first().pk
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {auth_token}')
+
+        fast = [client.get('/api/v1/resources/orders/').content, client.get(f'/api/v1/resources/orders/{order_id}/').content]
+        settings.FAST_SERIALIZERS = False
+        slow = [client.get('/api/v1/resources/orders/').content, client.get(f'/api/v1/resources/orders/{order_id}/').content]
+        assert fast == slow
+
+    def test_floats_rendered_as_drf(self):
+        """Float рендерится стандартным JSONRenderer: та же запись чисел и отказ на NaN"""
+        data = {'values': [1e16, 1e-7, 0.5, {'nested': 2.0}], 'name': 'x'}
+        assert FastJSONRenderer().render(data) == JSONRenderer().render(data)
+        with pytest.raises(ValueError):
+            FastJSONRenderer().render({'value': float('nan')})
+
+class TestPasswordHashing:
+    def test_argon2_cost_from_settings(self, settings):
+        """Параметры argon2 берутся из настроек"""
+        settings.PASSWORD_ARGON2_TIME_COST = 1
+        settings.PASSWORD_ARGON2_MEMORY_COST = 8192
+        settings.PASSWORD_ARGON2_PARALLELISM = 1
+        assert make_password('password').startswith('argon2$argon2id$v=19$m=8192,t=1,p=1$')
+
+    @pytest.mark.django_db(transaction=True)
+    def test_login_upgrades_legacy_hash_in_background(self, client, user, settings):
+        """После входа с устаревшим хешем он пересчитывается в фоне"""
+        settings.PASSWORD_PBKDF2_ITERATIONS = 1000
+        User.objects.filter(pk=user.pk).update(password=make_password('password', hasher='pbkdf2_sha256'))
+
+        response = client.post('/api/v1/auth/login/', {'email': 'test@example.com', 'password': 'password'})
+        assert response.status_code == status.HTTP_200_OK
+        hashing_pool.join(timeout=10)
+        user.refresh_from_db()
+        assert user.password.startswith('argon2$')
+        assert user.check_password('password')
+
+    @pytest.mark.django_db
+    def test_saturated_pool_returns_503(self, client, user, settings):
+        """Если все слоты пула заняты, логин получает 503, а не ждет бесконечно"""
+        settings.PASSWORD_HASHING_POOL = 'thread'
+        settings.PASSWORD_HASHING_WORKERS = 1
+        settings.PASSWORD_HASHING_QUEUE_SIZE = 0
+        settings.PASSWORD_HASHING_QUEUE_TIMEOUT = 0.01
+        _, slots = hashing_pool._get_pool()
+        slots.acquire()
+        try:
+            response = client.post('/api/v1/auth/login/', {'email': 'test@example.com', 'password': 'password'})
+        finally:
+            slots.release()
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+    def test_cancelled_async_hashing_keeps_slots(self, settings):
+        """Отмена при ожидании слота его не теряет, отмена при хешировании не освобождает слот раньше времени"""
+        import asyncio
+        import threading
+
+        settings.PASSWORD_HASHING_POOL = 'thread'
+        settings.PASSWORD_HASHING_WORKERS = 1
+        settings.PASSWORD_HASHING_QUEUE_SIZE = 0
+        settings.PASSWORD_HASHING_QUEUE_TIMEOUT = 5
+        _, slots = hashing_pool._get_pool()
+        hashing, finish = threading.Event(), threading.Event()
+
+        def work():
+            hashing.set()
+            finish.wait(5)
+
+        async def scenario():
+            task = asyncio.ensure_future(hashing_pool.arun(work))
+            await asyncio.to_thread(hashing.wait, 5)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            # Хеширование еще идет: слот занят.
+            assert not slots.acquire(blocking=False)
+
+            waiting = asyncio.ensure_future(hashing_pool.arun(len, ''))
+            await asyncio.sleep(0.05)
+            waiting.cancel()
+            await asyncio.gather(waiting, return_exceptions=True)
+            finish.set()
+            # Слот, полученный ожидавшим потоком после отмены, возвращается.
+            for _ in range(100):
+                if slots.acquire(blocking=False):
+                    slots.release()
+                    return True
+                await asyncio.sleep(0.01)
+            return False
+
+        try:
+            assert asyncio.run(scenario())
+        finally:
+            finish.set()
+
+class TestLoginThrottling:
+    @pytest.mark.django_db
+    def test_email_bucket_rejects_before_hashing(self, client, user, monkeypatch):
+        """После исчерпания корзины email логин отклоняется без проверки пароля"""
+        monkeypatch.setattr(LoginEmailThrottle, 'rate', '2/min', raising=False)
+        credentials = {'email': 'Test@Example.com', 'password': 'wrong'}
+        for _ in range(2):
+            assert client.post('/api/v1/auth/login/', credentials).status_code == status.HTTP_401_UNAUTHORIZED
+
+        monkeypatch.setattr(hashing_pool, 'verify', lambda *args: pytest.fail('password was hashed'))
+        response = client.post('/api/v1/auth/login/', {'email': 'test@example.com', 'password': 'password'})
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert int(response['Retry-After']) > 0
+        assert throttle_counters.snapshot()[('login_email', 'throttled')] >= 1
+
+    @pytest.mark.django_db
+    def test_shared_cache_bucket(self, client, user, monkeypatch, settings):
+        """С общим хранилищем лимит действует и после сброса локальных корзин"""
+        settings.AUTH_THROTTLE_BACKEND = 'cache'
+        monkeypatch.setattr(LoginEmailThrottle, 'rate', '1/min', raising=False)
+        credentials = {'email': 'test@example.com', 'password': 'password'}
+        assert client.post('/api/v1/auth/login/', credentials).status_code == status.HTTP_200_OK
+        local_buckets.reset()  # как будто запрос пришел в другой воркер
+        assert client.post('/api/v1/auth/login/', credentials).status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+class TestAsyncAPI:
+    @pytest.fixture
+    def async_client(self):
+        client = AsyncClient()
+        return lambda method, *args, **kwargs: async_to_sync(getattr(client, method))(*args, **kwargs)
+
+    @pytest.mark.django_db
+    def test_login_and_list_match_sync(self, async_client, client, user_with_role, permission_rule):
+        """Async-логин выдает рабочие токены, список совпадает с синхронным"""
+        for i in range(3):
+            create_order(user_with_role, {'item': f'Товар {i}', 'price': i})
+        response = async_client(
+            'post', '/api/v1/async/auth/login/',
+            {'email': 'test@example.com', 'password': 'password'}, content_type='application/json'
+        )
+        assert response.status_code == status.HTTP_200_OK
+        token = response.json()['access']
+
+        fast = async_client('get', '/api/v1/async/resources/orders/?page_size=2', headers={'Authorization': f'Bearer {token}'})
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        slow = client.get('/api/v1/resources/orders/?page_size=2')
+        assert fast.status_code == status.HTTP_200_OK
+        assert fast.content.replace(b'/async', b'') == slow.content
+
+    @pytest.mark.django_db
+    def test_permissions_and_errors(self, async_client, auth_token, permission_rule):
+        """Ошибки аутентификации и прав совпадают по кодам с DRF"""
+        assert async_client('get', '/api/v1/async/resources/orders/').status_code == status.HTTP_401_UNAUTHORIZED
+        headers = {'headers': {'Authorization': f'Bearer {auth_token}'}}
+        response = async_client(
+            'post', '/api/v1/async/resources/orders/', {'item': 'A', 'price': 1},
+            content_type='application/json', **headers
+        )
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+        assert async_client('get', '/api/v1/async/resources/orders/999/', **headers).status_code == status.HTTP_404_NOT_FOUND
+
+    @pytest.mark.django_db
+    def test_register_and_profile(self, async_client):
+        """Регистрация и профиль через async-эндпоинты"""
+        response = async_client('post', '/api/v1/async/auth/register/', {
+            'email': 'new@example.com', 'first_name': 'Иван', 'last_name': 'Иванов',
+            'password': 'Str0ng-pass!', 'password_confirm': 'Str0ng-pass!',
+        }, content_type='application/json')
+        assert response.status_code == status.HTTP_201_CREATED
+        assert User.objects.get(email='new@example.com').check_password('Str0ng-pass!')
+
+        token = async_client(
+            'post', '/api/v1/async/auth/login/',
+            {'email': 'new@example.com', 'password': 'Str0ng-pass!'}, content_type='application/json'
+        ).json()['access']
+        response = async_client('get', '/api/v1/async/profile/', headers={'Authorization': f'Bearer {token}'})
+        assert response.json()['first_name'] == 'Иван'
+
+class TestRequestMetrics:
+    @pytest.fixture(autouse=True)
+    def reset_registry(self):
+        metrics_registry.reset()
+        yield
+        metrics_registry.reset()
+
+    @pytest.mark.django_db
+    def test_stages_and_queries_exported(self, client, auth_token, permission_rule, user, settings):
+        """Гистограммы по представлению и заголовок Server-Timing"""
+        settings.METRICS_SERVER_TIMING = True
+        settings.METRICS_TOKEN = 'secret'
+        create_order(user, {'item': 'Item', 'price': 10})
+        api = APIClient()
+        api.credentials(HTTP_AUTHORIZATION=f'Bearer {auth_token}')
+        response = api.get('/api/v1/resources/orders/')
+        assert response.status_code == status.HTTP_200_OK
+        timing = response['Server-Timing']
+        assert timing.startswith('total;dur=')
+        for name in ('db;desc=', 'auth;dur=', 'permission;dur=', 'serialize;dur='):
+            assert name in timing
+
+        assert api.get('/metrics').status_code == status.HTTP_403_FORBIDDEN
+        body = client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').content.decode()
+        assert 'app_requests_total{view="orders-list",method="GET",status="200"} 1' in body
+        assert 'app_request_stage_seconds_count{view="orders-list",stage="permission"} 1' in body
+        assert 'app_request_queries_count{view="orders-list"} 1' in body
+        assert 'app_request_queries_bucket{view="orders-list",le="0"} 0' in body
+        assert 'auth_throttle_requests_total{scope="login_ip",result="allowed"}' in body
+
+    @pytest.mark.django_db
+    def test_sampling_disabled(self, client, auth_token, permission_rule, settings):
+        """При METRICS_SAMPLE_RATE=0 middleware не подключается"""
+        settings.METRICS_SAMPLE_RATE = 0
+        settings.METRICS_SERVER_TIMING = True
+        api = APIClient()
+        api.credentials(HTTP_AUTHORIZATION=f'Bearer {auth_token}')
+        response = api.get('/api/v1/resources/orders/')
+        assert response.status_code == status.HTTP_200_OK
+        assert 'Server-Timing' not in response
+        assert 'orders-list' not in metrics_registry.render()
+
+class TestGenerateData:
+    @pytest.mark.django_db
+    def test_deterministic_and_usable(self, client):
+        """Одинаковый seed дает одинаковые данные независимо от размера пакета; пользователи могут войти"""
+        options = dict(users=30, roles=4, orders_per_user=3, reports_per_user=1, end_date=timezone.now().date(), stdout=None)
+        call_command('generate_data', email_domain='a.test', batch_size=7, **options)
+        call_command('generate_data', email_domain='b.test', batch_size=30, **options)
+
+        def snapshot(domain):
+            orders = Order.objects.filter(owner__email__endswith=domain).order_by('owner__email', 'item', 'price')
+            return [(email.split('@')[0], item, price, created_at) for email, item, price, created_at
+                    in orders.values_list('owner__email', 'item', 'price', 'created_at')]
+
+        assert len(snapshot('a.test')) == 90
+        assert snapshot('a.test') == snapshot('b.test')
+        assert Report.objects.filter(author__email__endswith='a.test').count() == 30
+
+        response = client.post('/api/v1/auth/login/', {'email': 'user0@a.test', 'password': 'password'})
+        assert response.status_code == status.HTTP_200_OK
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        assert client.get('/api/v1/resources/orders/').data['results'][0]['owner'] == User.objects.get(email='user0@a.test').pk
+        assert client.post('/api/v1/resources/orders/', {'item': 'New', 'price': 5}).status_code == status.HTTP_201_CREATED
+        call_command('rebuild_order_rollups', check=True, stdout=None)
+
+class TestOrderRollups:
+    @pytest.mark.django_db
+    def test_incremental_rollups_match_rebuild(self, user):
+        """Создание, изменение, массовое создание и удаление заказов поддерживают агрегаты"""
+        now = timezone.now()
+        first = create_order(user, {'item': 'A', 'price': '10.50'})
+        second = create_order(user, {'item': 'B', 'price': 5})
+        bulk_create_orders(user, [{'item': f'C{i}', 'price': 1} for i in range(3)])
+        second.price = 7
+        second.save()
+        Order.objects.filter(pk=first.pk).defer('price', 'created_at').get().save()
+        first.created_at = now - timedelta(days=40)
+        first.save(update_fields=['created_at'])
+        Order.objects.filter(item='C0').get().delete()
+
+        month = OrderRollup.objects.filter(owner=user, granularity=OrderRollup.MONTH)
+        assert sum(month.values_list('orders_count', flat=True)) == 4
+        assert str(sum(month.values_list('total_price', flat=True))) == '19.50'
+        call_command('rebuild_order_rollups', check=True, stdout=None)
+
+        Order.objects.filter(pk=second.pk).update(price=100)
+        with pytest.raises(CommandError):
+            call_command('rebuild_order_rollups', check=True, stdout=None)
+        call_command('rebuild_order_rollups', stdout=None)
+        call_command('rebuild_order_rollups', check=True, stdout=None)
+
+    @pytest.mark.django_db
+    def test_delete_owner(self, user):
+        """Удаление пользователя с заказами: агрегаты удаляются каскадом и не создаются заново"""
+        create_order(user, {'item': 'A', 'price': 1})
+        user.delete()
+        assert not OrderRollup.objects.exists()
+        # Отложенные внешние ключи SQLite проверяются только при фиксации транзакции.
+        connection.check_constraints()
+
+    @pytest.mark.django_db
+    def test_stats_endpoint(self, client, auth_token, permission_rule, user, django_assert_num_queries):
+        """Статистика читается из агрегатов и требует can_read на orders"""
+        bulk_create_orders(user, [{'item': f'Item {i}', 'price': '2.25'} for i in range(4)])
+        create_order(User.objects.create_user(email='other@example.com'), {'item': 'Other', 'price': 1000})
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {auth_token}')
+        client.get('/api/v1/resources/orders/stats/')
+
+        with django_assert_num_queries(2):  # пользователь из JWT и строки агрегатов
+            response = client.get('/api/v1/resources/orders/stats/?period=day')
+        assert response.status_code == status.HTTP_200_OK
+        today = timezone.localdate().isoformat()
+        assert response.json() == {
+            'granularity': 'day', 'count': 4, 'total': '9.00',
+            'periods': [{'period': today, 'count': 4, 'total': '9.00'}],
+        }
+        assert client.get(f'/api/v1/resources/orders/stats/?from={today}').data['count'] == 4
+        assert client.get('/api/v1/resources/orders/stats/?to=2000-01-01').data['count'] == 0
+        assert client.get('/api/v1/resources/orders/stats/?period=year').status_code == status.HTTP_400_BAD_REQUEST
+        assert client.get('/api/v1/resources/orders/stats/?from=2026-13-01').status_code == status.HTTP_400_BAD_REQUEST
+
+        permission_rule.can_read = False
+        permission_rule.save()
+        assert client.get('/api/v1/resources/orders/stats/').status_code == status.HTTP_403_FORBIDDEN
+
+class TestSearch:
+    @pytest.fixture
+    def reports_token(self, client, auth_token, tester_role):
+        resource, _ = Resource.objects.get_or_create(name='reports')
+        PermissionRule.objects.create(role=tester_role, resource=resource, can_read=True)
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {auth_token}')
+        return auth_token
+
+    @pytest.mark.django_db
+    def test_ranked_scoped_and_paginated(self, client, reports_token, user):
+        """?q= ищет только среди записей пользователя, совпадение в заголовке выше совпадения в тексте"""
+        other = User.objects.create_user(email='other@example.com')
+        Report.objects.create(author=other, title='Квартальная выручка', content='выручка')
+        in_content = Report.objects.create(author=user, title='Отчет', content='рост: выручка и маржа')
+        in_title = Report.objects.create(author=user, title='Выручка за квартал', content='итоги')
+        Report.objects.create(author=user, title='Склад', content='остатки')
+        for i in range(3):
+            Report.objects.create(author=user, title=f'Выручка {i}', content='план')
+
+        response = client.get('/api/v1/resources/reports/', {'q': 'выручка'})
+        assert response.status_code == status.HTTP_200_OK
+        ids = [row['id'] for row in response.data['results']]
+        assert len(ids) == 5 and ids[-1] == in_content.pk and in_title.pk in ids
+
+        walked, url = [], '/api/v1/resources/reports/?' + urlencode({'q': 'выручка', 'page_size': 2})
+        while url:
+            response = client.get(url)
+            walked += [row['id'] for row in response.data['results']]
+            url = response.data['next']
+        assert walked == ids
+
+        in_title.title = 'Без совпадений'
+        in_title.save()
+        in_content.delete()
+        response = client.get('/api/v1/resources/reports/', {'q': 'Выручка'})
+        assert len(response.data['results']) == 3
+        assert client.get('/api/v1/resources/reports/', {'q': 'маржа'}).data['results'] == []
+        assert client.get('/api/v1/resources/reports/', {'q': '"*'}).data['results'] == []
+
+    @pytest.mark.django_db
+    def test_orders_and_admin(self, client, auth_token, permission_rule, user):
+        """Поиск заказов через API и в админке использует тот же индекс"""
+        bulk_create_orders(user, [{'item': 'Ноутбук Pro', 'price': 1}, {'item': 'Мышь', 'price': 1}])
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {auth_token}')
+        response = client.get('/api/v1/resources/orders/', {'q': 'ноутбук'})
+        assert [row['item'] for row in response.data['results']] == ['Ноутбук Pro']
+
+        admin = User.objects.create_superuser(email='admin@example.com', password='password')
+        browser = Client()
+        browser.force_login(admin)
+        response = browser.get('/admin/users/order/', {'q': 'ноутбук'})
+        assert response.status_code == status.HTTP_200_OK
+        assert list(response.context['cl'].result_list) == list(Order.objects.filter(item='Ноутбук Pro'))
+        response = browser.get('/admin/users/order/', {'q': 'test@example.com'})
+        assert response.context['cl'].result_count == 2
+
+class TestProfileCache:
+    @pytest.mark.django_db
+    def test_cached_payload_and_not_modified(self, client, auth_token, django_assert_num_queries):
+        """Повторный GET профиля читает только пользователя из JWT, совпавший ETag дает 304"""
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {auth_token}')
+        first = client.get('/api/v1/profile/')
+        assert first.status_code == status.HTTP_200_OK
+        assert first.json()['roles'] == ['Tester']
+
+        with django_assert_num_queries(1):
+            cached = client.get('/api/v1/profile/')
+        assert cached.content == first.content and cached['ETag'] == first['ETag']
+        with django_assert_num_queries(1):
+            response = client.get('/api/v1/profile/', HTTP_IF_NONE_MATCH=first['ETag'])
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response['ETag'] == first['ETag']
+
+    @pytest.mark.django_db
+    def test_invalidation(self, client, auth_token, user, tester_role):
+        """Переименование роли, назначение ролей и PUT профиля меняют ответ и ETag"""
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {auth_token}')
+        etags = [client.get('/api/v1/profile/')['ETag']]
+
+        tester_role.name = 'QA'
+        tester_role.save()
+        response = client.get('/api/v1/profile/', HTTP_IF_NONE_MATCH=etags[-1])
+        assert response.status_code == status.HTTP_200_OK and response.json()['roles'] == ['QA']
+        etags.append(response['ETag'])
+
+        Role.objects.create(name='Manager').users.add(user)
+        response = client.get('/api/v1/profile/')
+        assert sorted(response.json()['roles']) == ['Manager', 'QA']
+        etags.append(response['ETag'])
+
+        response = client.put('/api/v1/profile/', {'first_name': 'Иван'}, format='json')
+        assert response.status_code == status.HTTP_200_OK and response.json()['first_name'] == 'Иван'
+        assert client.get('/api/v1/profile/', HTTP_IF_NONE_MATCH=response['ETag']).status_code == status.HTTP_304_NOT_MODIFIED
+        etags.append(response['ETag'])
+        assert len(set(etags)) == 4
+
+    @pytest.mark.django_db
+    def test_evicted_version_not_reused(self, client, auth_token, user):
+        """После вытеснения счетчика версии новая версия не совпадает с отметкой сохраненного ответа"""
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {auth_token}')
+        client.get('/api/v1/profile/')
+        version = cache.get(profile_cache._version_key(user.pk))
+        cache.delete(profile_cache._version_key(user.pk))
+        User.objects.filter(pk=user.pk).update(first_name='Петр')
+        profile_cache.invalidate_user(user.pk)
+        # Счетчик не начинается заново: версия, совпадающая с отметкой записи, невозможна.
+        assert cache.get(profile_cache._version_key(user.pk)) > version
+        assert client.get('/api/v1/profile/').json()['first_name'] == 'Петр'
+
+class TestConditionalGet:
+    @pytest.mark.django_db
+    def test_not_modified_until_write(self, client, auth_token, permission_rule, user, django_assert_num_queries):
+        """Совпавший ETag дает 304 без запроса списка; создание, изменение и удаление меняют ETag"""
+        order = create_order(user, {'item': 'A', 'price': 1})
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {auth_token}')
+        url, detail = '/api/v1/resources/orders/', f'/api/v1/resources/orders/{order.pk}/'
+        etag = client.get(url)['ETag']
+        assert client.get(detail)['ETag'] != etag
+
+        with django_assert_num_queries(1):  # только пользователь из JWT
+            response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED and response['ETag'] == etag
+        assert client.get(url + '?page_size=1', HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_200_OK
+
+        def changed(write):
+            nonlocal etag
+            write()
+            response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+            assert response.status_code == status.HTTP_200_OK and response['ETag'] != etag
+            etag = response['ETag']
+            return response.data['results']
+
+        assert len(changed(lambda: create_order(user, {'item': 'B', 'price': 2}))) == 2
+        assert len(changed(lambda: bulk_create_orders(user, [{'item': 'C', 'price': 3}]))) == 3
+        order.item = 'A2'
+        results = changed(order.save)
+        assert results[-1]['item'] == 'A2' and results[-1]['updated_at'] > results[-1]['created_at']
+        assert len(changed(order.delete)) == 2
+        assert client.get(detail, HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_404_NOT_FOUND
+
+        other = User.objects.create_user(email='other@example.com')
+        create_order(other, {'item': 'Other', 'price': 1})
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_304_NOT_MODIFIED
+        Order.objects.filter(owner=other).get().save()
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_304_NOT_MODIFIED
+        moved = Order.objects.filter(owner=other).get()
+        moved.owner = user
+        moved.save()
+        assert len(changed(lambda: None)) == 3
+
+class TestReplicaRouting:
+    @pytest.fixture
+    def reads(self, settings, monkeypatch):
+        """Реплика — та же тестовая БД; записываются модели чтений, отправленных на реплику"""
+        settings.DATABASE_REPLICAS = ['default']
+        routed = []
+        db_for_read = db_router.PrimaryReplicaRouter.db_for_read
+
+        def spy(router, model, **hints):
+            if db_router.replica_allowed.get():
+                routed.append(model)
+            return db_for_read(router, model, **hints)
+        monkeypatch.setattr(db_router.PrimaryReplicaRouter, 'db_for_read', spy)
+        return routed
+
+    @pytest.mark.django_db
+    def test_reads_use_replica_until_own_write(self, client, auth_token, permission_rule, user, reads):
+        """GET читает с реплики (кроме пользователя из JWT), после своей записи — из основной БД"""
+        permission_rule.can_create = True
+        permission_rule.save()
+        cache.clear()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {auth_token}')
+        assert client.get('/api/v1/resources/orders/').status_code == status.HTTP_200_OK
+        assert Order in reads and User.roles.through in reads and User not in reads
+        assert client.get('/api/v1/profile/').status_code == status.HTTP_200_OK
+        assert User in reads
+
+        reads.clear()
+        assert client.post('/api/v1/resources/orders/', {'item': 'New', 'price': 5}).status_code == status.HTTP_201_CREATED
+        assert client.get('/api/v1/resources/orders/').data['results'][0]['item'] == 'New'
+        assert reads == []
+        cache.delete(f'db:pinned:{user.pk}')
+        client.get('/api/v1/resources/orders/')
+        assert Order in reads
+
+        # Назначение роли другому пользователю закрепляет только его, изменение правил — всех.
+        reads.clear()
+        Role.objects.create(name='Other').users.add(User.objects.create_user(email='other@example.com'))
+        client.get('/api/v1/resources/orders/')
+        assert Order in reads
+        reads.clear()
+        permission_rule.save()
+        client.get('/api/v1/resources/orders/')
+        assert reads == []
+
+    @pytest.mark.django_db
+    def test_without_replicas(self, settings, user):
+        """Без реплик чтения и записи идут в основную БД, закрепление не пишется в кэш"""
+        settings.DATABASE_REPLICAS = []
+        router = db_router.PrimaryReplicaRouter()
+        with db_router.primary_reads():
+            db_router.use_replica(user.pk)
+            assert router.db_for_read(Order) == 'default'
+        create_order(user, {'item': 'A', 'price': 1})
+        assert cache.get(f'db:pinned:{user.pk}') is None
+
+class TestPermissionScopes:
+    @pytest.fixture
+    def teams(self, user):
+        """Пользователь и коллега в одной команде, посторонний — в другой, у каждого по заказу и отчету"""
+        team, other_team = Team.objects.create(name='Продажи'), Team.objects.create(name='Склад')
+        colleague = User.objects.create_user(email='colleague@example.com', team=team)
+        outsider = User.objects.create_user(email='outsider@example.com', team=other_team)
+        user.team = team
+        user.save()
+        for owner in (user, colleague, outsider):
+            create_order(owner, {'item': owner.email, 'price': 1})
+            Report.objects.create(author=owner, title=owner.email, content='-')
+        return colleague, outsider
+
+    @staticmethod
+    def grant(role_name, resource_name, scope, **actions):
+        role, _ = Role.objects.get_or_create(name=role_name)
+        resource, _ = Resource.objects.get_or_create(name=resource_name)
+        PermissionRule.objects.update_or_create(role=role, resource=resource, defaults={'scope': scope, **actions})
+        return role
+
+    @staticmethod
+    def items(client, url):
+        return sorted(row.get('item') or row['title'] for row in client.get(url).json()['results'])
+
+    @pytest.mark.django_db
+    def test_scope_combinations(self, client, auth_token, user, teams, django_assert_num_queries):
+        """Итоговая область действия — наибольшая среди ролей; список — один запрос при любом числе ролей"""
+        colleague, outsider = teams
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {auth_token}')
+        user.roles.add(self.grant('Reader', 'orders', PermissionRule.OWN, can_read=True))
+        assert self.items(client, '/api/v1/resources/orders/') == ['test@example.com']
+
+        user.roles.add(
+            self.grant('TeamLead', 'orders', PermissionRule.TEAM, can_read=True),
+            self.grant('Editor', 'orders', PermissionRule.ALL, can_update=True),
+            self.grant('Auditor', 'reports', PermissionRule.ALL, can_read=True),
+        )
+        client.get('/api/v1/resources/orders/')
+        with django_assert_num_queries(2):  # пользователь из JWT и список
+            assert self.items(client, '/api/v1/resources/orders/') == ['colleague@example.com', 'test@example.com']
+        assert self.items(client, '/api/v1/resources/reports/') == sorted(
+            ['test@example.com', 'colleague@example.com', 'outsider@example.com']
+        )
+
+        # Область зависит от действия: изменять можно все заказы, читать — только командные.
+        foreign = Order.objects.get(owner=outsider)
+        assert client.get(f'/api/v1/resources/orders/{foreign.pk}/').status_code == status.HTTP_404_NOT_FOUND
+        response = client.patch(f'/api/v1/resources/orders/{foreign.pk}/', {'item': 'Изменен'})
+        assert response.status_code == status.HTTP_200_OK
+        assert client.get(f'/api/v1/resources/orders/{Order.objects.get(owner=colleague).pk}/').status_code == status.HTTP_200_OK
+
+        # Без команды область TEAM сужается до своих записей.
+        user.team = None
+        user.save()
+        assert self.items(client, '/api/v1/resources/orders/') == ['test@example.com']
+        assert len(self.items(client, '/api/v1/async/resources/reports/')) == 3
+
+    @pytest.mark.django_db
+    def test_async_and_superuser(self, client, auth_token, user, teams):
+        """Асинхронные эндпоинты применяют ту же область, суперпользователь видит все"""
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {auth_token}')
+        user.roles.add(self.grant('TeamLead', 'orders', PermissionRule.TEAM, can_read=True))
+        assert self.items(client, '/api/v1/async/resources/orders/') == ['colleague@example.com', 'test@example.com']
+
+        User.objects.create_superuser(email='admin@example.com', password='password')
+        response = client.post('/api/v1/auth/login/', {'email': 'admin@example.com', 'password': 'password'})
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["access"]}')
+        assert len(self.items(client, '/api/v1/resources/orders/')) == 3
+
+class TestRoleHierarchy:
+    @staticmethod
+    def roles(*names):
+        return [Role.objects.get_or_create(name=name)[0] for name in names]
+
+    @pytest.mark.django_db
+    def test_inherited_permissions(self, client, auth_token, user, permission_rule, tester_role):
+        """Права родительской роли действуют для роли-потомка и ее пользователей"""
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {auth_token}')
+        junior, = self.roles('Junior')
+        user.roles.set([junior])
+        assert client.get('/api/v1/resources/orders/').status_code == status.HTTP_403_FORBIDDEN
+
+        junior.parents.add(tester_role)
+        rbac.matrix.sync()
+        assert rbac.matrix.role_ids(user.pk) == {junior.pk, tester_role.pk}
+        assert client.get('/api/v1/resources/orders/').status_code == status.HTTP_200_OK
+
+        junior.parents.remove(tester_role)
+        assert client.get('/api/v1/resources/orders/').status_code == status.HTTP_403_FORBIDDEN
+
+    @pytest.mark.django_db
+    def test_closure_matches_edges(self):
+        """Замыкание после добавления, удаления и очистки ребер совпадает с пересчитанным заново"""
+        root, left, right, leaf, extra = self.roles('Root', 'Left', 'Right', 'Leaf', 'Extra')
+        left.parents.add(root)
+        right.parents.add(root)
+        leaf.parents.add(left, right)  # ромб: два пути от Root к Leaf
+        extra.children.add(root)
+        assert RoleClosure.objects.get(ancestor=root, descendant=leaf).paths == 2
+        assert RoleClosure.objects.get(ancestor=extra, descendant=leaf).paths == 2
+        assert hierarchy.rebuild(dry_run=True) == 0
+
+        leaf.parents.remove(right)
+        assert RoleClosure.objects.get(ancestor=root, descendant=leaf).paths == 1
+        assert hierarchy.rebuild(dry_run=True) == 0
+
+        root.parents.clear()
+        left.delete()
+        assert not RoleClosure.objects.filter(descendant=leaf).exists()
+        assert hierarchy.rebuild(dry_run=True) == 0
+
+        RoleClosure.objects.create(ancestor=root, descendant=leaf)
+        with pytest.raises(CommandError):
+            call_command('rebuild_role_closure', '--check')
+        call_command('rebuild_role_closure')
+        assert hierarchy.rebuild(dry_run=True) == 0
+
+    @pytest.mark.django_db
+    def test_cycles_rejected(self, client):
+        """Ребро, замыкающее цикл, отклоняется при изменении связей и через API"""
+        from django.core.exceptions import ValidationError
+        from django.db import transaction
+
+        top, middle, bottom = self.roles('Top', 'Middle', 'Bottom')
+        middle.parents.add(top)
+        bottom.parents.add(middle)
+        with pytest.raises(ValidationError), transaction.atomic():
+            top.parents.add(bottom)
+        with pytest.raises(ValidationError), transaction.atomic():
+            top.children.add(top)
+        assert not top.parents.exists()
+
+        admin = User.objects.create_superuser(email='admin@example.com', password='password')
+        client.force_authenticate(admin)
+        response = client.patch(f'/api/v1/admin/roles/{top.pk}/', {'parents': [bottom.pk]}, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        response = client.patch(f'/api/v1/admin/roles/{bottom.pk}/', {'parents': [top.pk]}, format='json')
+        assert response.status_code == status.HTTP_200_OK
+        assert hierarchy.rebuild(dry_run=True) == 0
+
+    @pytest.mark.django_db(transaction=True)
+    def test_concurrent_cycle_rejected(self):
+        """Встречные ребра из двух транзакций не образуют цикл: вторая ждет блокировку графа"""
+        import threading
+        from django.core.exceptions import ValidationError
+        from django.db import transaction
+
+        if connection.vendor != 'postgresql':
+            pytest.skip('SQLite и так допускает одну пишущую транзакцию')
+        top, bottom = self.roles('Top', 'Bottom')
+        added, release = threading.Event(), threading.Event()
+        errors = queue.Queue()
+
+        def first():
+            try:
+                with transaction.atomic():
+                    bottom.parents.add(top)
+                    added.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        def second():
+            added.wait(5)
+            try:
+                with transaction.atomic():
+                    top.parents.add(bottom)
+            except ValidationError as exc:
+                errors.put(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=first), threading.Thread(target=second)]
+        for thread in threads:
+            thread.start()
+        threads[1].join(0.5)
+        assert threads[1].is_alive()
+        release.set()
+        for thread in threads:
+            thread.join(10)
+        assert errors.qsize() == 1
+        assert not top.parents.exists()
+        assert hierarchy.rebuild(dry_run=True) == 0
+
+class TestPermissionCheck:
+    URL = '/api/v1/authz/check/'
+    CHECKS = [['orders', 'read'], ['orders', 'delete'], ['reports', 'read'], ['unknown', 'read']]
+
+    @pytest.mark.django_db
+    def test_current_user(self, client, auth_token, permission_rule, tester_role, django_assert_num_queries):
+        """Решения совпадают с CustomRBACPermission, в том числе для унаследованных прав"""
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {auth_token}')
+        response = client.post(self.URL, {'checks': self.CHECKS}, format='json')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == {'users': [response.wsgi_request.user.pk], 'allowed': [[True, False, False, False]]}
+
+        parent, _ = Role.objects.get_or_create(name='Auditor')
+        PermissionRule.objects.create(role=parent, resource=Resource.objects.create(name='reports'), can_read=True)
+        tester_role.parents.add(parent)
+        client.post(self.URL, {'checks': self.CHECKS}, format='json')
+        with django_assert_num_queries(1):  # пользователь из JWT
+            response = client.post(self.URL, {'checks': self.CHECKS * 25}, format='json')
+        assert response.json()['allowed'] == [[True, False, True, False] * 25]
+
+        response = client.post(self.URL, {'checks': [['orders', 'approve']]}, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    @pytest.mark.django_db
+    def test_other_users(self, client, auth_token, user, permission_rule, django_assert_num_queries):
+        """Права других пользователей проверяет только администратор; роли читаются одним запросом"""
+        other = User.objects.create_user(email='other@example.com')
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {auth_token}')
+        response = client.post(self.URL, {'checks': self.CHECKS, 'users': [other.pk]}, format='json')
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+        admin = User.objects.create_superuser(email='admin@example.com', password='password')
+        inactive = User.objects.create_user(email='inactive@example.com', is_active=False)
+        inactive.roles.set(user.roles.all())
+        client.force_authenticate(admin)
+        rbac.matrix.sync()
+        payload = {'checks': self.CHECKS[:2], 'users': [user.pk, other.pk, admin.pk, inactive.pk, 999999]}
+        with django_assert_num_queries(2):  # пользователи и их роли
+            response = client.post(self.URL, payload, format='json')
+        assert response.json()['allowed'] == [[True, False], [False, False], [True, True], [False, False], [False, False]]
+
+class TestRBACBatch:
+    DOCUMENT = {
+        'version': 1,
+        'resources': ['orders', 'reports'],
+        'roles': {
+            'Employee': {'parents': [], 'rules': {'reports': {'actions': ['read'], 'scope': 'own'}}},
+            'Manager': {'parents': ['Employee'], 'rules': {
+                'orders': {'actions': ['create', 'read'], 'scope': 'team'},
+                'reports': {'actions': ['create', 'read', 'update'], 'scope': 'all'},
+            }},
+        },
+    }
+
+    @staticmethod
+    def generation():
+        return cache.get(rbac.GENERATION_KEY)
+
+    @pytest.mark.django_db
+    def test_assign_and_revoke(self, client, permission_rule, tester_role, django_assert_max_num_queries):
+        """Назначение и снятие ролей пакетом: недостающие пары одной вставкой, сброс ролей только затронутых пользователей"""
+        users = User.objects.bulk_create(User(email=f'bulk{i}@example.com') for i in range(50))
+        ids = [user.pk for user in User.objects.filter(email__startswith='bulk')]
+        users[0].roles.add(tester_role)
+        client.force_authenticate(User.objects.create_superuser(email='admin@example.com', password='password'))
+        rbac.current_generation()
+
+        generation = self.generation()
+        with django_assert_max_num_queries(8):
+            response = client.post('/api/v1/admin/roles/assign/', {'users': ids, 'roles': [tester_role.pk]}, format='json')
+        assert response.json() == {'assigned': 49}
+        assert self.generation() == generation
+        stamps = cache.get_many([rbac.roles_key(pk) for pk in ids if pk != users[0].pk])
+        assert len(stamps) == 49 and len(set(stamps.values())) == 1
+        assert all(rbac.has_access(user, 'orders', rbac.READ) for user in User.objects.filter(pk__in=ids))
+
+        response = client.post('/api/v1/admin/roles/assign/', {'users': ids, 'roles': [tester_role.pk]}, format='json')
+        assert response.json() == {'assigned': 0}
+        response = client.post('/api/v1/admin/roles/revoke/', {'users': ids[:10], 'roles': [tester_role.pk]}, format='json')
+        assert response.json() == {'revoked': 10}
+        assert tester_role.users.count() == 40
+        response = client.post('/api/v1/admin/roles/assign/', {'users': [999999], 'roles': [tester_role.pk]}, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    @pytest.mark.django_db
+    def test_import_export(self, client, user, tmp_path):
+        """Импорт записывает только отличия одним сбросом матрицы, выгрузка воспроизводит документ"""
+        client.force_authenticate(User.objects.create_superuser(email='admin@example.com', password='password'))
+        rbac.current_generation()
+        generation = self.generation()
+        response = client.put('/api/v1/admin/rbac/', self.DOCUMENT, format='json')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()['rules_created'] == 3 and response.json()['parents_added'] == 1
+        assert self.generation() == generation + 1
+        assert client.get('/api/v1/admin/rbac/').json() == self.DOCUMENT
+        assert not any(client.put('/api/v1/admin/rbac/', self.DOCUMENT, format='json').json().values())
+
+        user.roles.add(Role.objects.get(name='Manager'))
+        document = json.loads(json.dumps(self.DOCUMENT))
+        document['roles']['Manager'] = {'parents': [], 'rules': {'orders': {'actions': ['read'], 'scope': 'own'}}}
+        del document['roles']['Employee']
+        generation = self.generation()
+        changes = rbac_batch.import_document(document, prune=True)
+        # Ребро Employee -> Manager удаляется вместе с ролью.
+        assert changes == {
+            'resources_created': 0, 'resources_deleted': 0, 'roles_created': 0, 'roles_deleted': 1,
+            'rules_created': 0, 'rules_updated': 1, 'rules_deleted': 1, 'parents_added': 0, 'parents_removed': 0,
+        }
+        assert self.generation() == generation + 1
+        assert rbac.matrix.masks(user.pk) == {'orders': rbac.READ}
+        assert hierarchy.rebuild(dry_run=True) == 0
+
+        path = tmp_path / 'rbac.yaml'
+        call_command('export_rbac', '--format', 'yaml', '--output', str(path))
+        call_command('import_rbac', str(path), '--dry-run')
+        assert rbac_batch.loads(path.read_text(encoding='utf-8'), 'yaml') == document
+
+        # Цикл наследования и ссылки на отсутствующие роли отклоняются без изменений.
+        document['roles']['Employee'] = {'parents': ['Manager'], 'rules': {}}
+        document['roles']['Manager']['parents'] = ['Employee']
+        response = client.put('/api/v1/admin/rbac/', document, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'Manager' in response.json()['detail'][0] and 'Employee' in response.json()['detail'][0]
+        document['roles']['Manager']['parents'] = ['Unknown']
+        assert client.put('/api/v1/admin/rbac/', document, format='json').status_code == status.HTTP_400_BAD_REQUEST
+        assert not Role.objects.filter(name='Employee').exists()
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize('role', [
+        {'parents': [['Employee']], 'rules': {}},
+        {'parents': [], 'rules': {'orders': {'actions': [{'read': True}]}}},
+        {'parents': [], 'rules': {'orders': {'actions': ['read'], 'scope': ['all']}}},
+    ])
+    def test_import_rejects_malformed(self, client, role):
+        """Элементы не строками отклоняются с 400, а не падением"""
+        client.force_authenticate(User.objects.create_superuser(email='admin@example.com', password='password'))
+        document = {'version': 1, 'resources': ['orders'], 'roles': {'Employee': {}, 'Manager': role}}
+        response = client.put('/api/v1/admin/rbac/', document, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json()['detail'][0].startswith('Manager')
+        assert not Role.objects.exists()
+
+
+class TestSystemChecks:
+    def test_shared_cache_required(self, settings):
+        """Кэш в памяти процесса без DEBUG — ошибка: отзывы токенов и версии ETag не доходят до других воркеров"""
+        from .checks import check_shared_cache
+
+        settings.DEBUG = False
+        settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        assert [error.id for error in check_shared_cache(None)] == ['users.E001']
+        settings.DEBUG = True
+        assert check_shared_cache(None) == []
+        settings.DEBUG = False
+        settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://'}}
+        assert check_shared_cache(None) == []
+
+class TestAudit:
+    @pytest.fixture
+    def audit_file(self, settings, tmp_path):
+        settings.AUDIT_LOG = True
+        settings.AUDIT_BACKEND = 'file'
+        settings.AUDIT_FILE = str(tmp_path / 'audit.jsonl')
+        audit_log.reset()
+        return tmp_path / 'audit.jsonl'
+
+    @pytest.mark.django_db
+    def test_file_backend(self, client, user_with_role, permission_rule, audit_file):
+        """Решения, входы и выход пишутся пакетом в файл строками JSON"""
+        assert client.post('/api/v1/auth/login/', {'email': 'test@example.com', 'password': 'wrong'}).status_code == 401
+        tokens = client.post('/api/v1/auth/login/', {'email': 'test@example.com', 'password': 'password'}).data
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}')
+        assert client.get('/api/v1/resources/orders/').status_code == status.HTTP_200_OK
+        assert client.post('/api/v1/resources/orders/', {'item': 'x', 'price': 1}).status_code == status.HTTP_403_FORBIDDEN
+        assert client.post('/api/v1/auth/logout/', {'refresh': tokens['refresh']}).status_code == status.HTTP_205_RESET_CONTENT
+        assert audit_log.flush(timeout=5)
+
+        events = [json.loads(line) for line in audit_file.read_text(encoding='utf-8').splitlines()]
+        assert [(e['kind'], e['user_id'], e['resource'], e['action'], e['allowed']) for e in events] == [
+            ('login_failed', None, '', '', False),
+            ('login', user_with_role.pk, '', '', True),
+            ('decision', user_with_role.pk, 'orders', 'read', True),
+            ('decision', user_with_role.pk, 'orders', 'create', False),
+            ('logout', user_with_role.pk, '', '', True),
+        ]
+        assert events[0]['detail'] == 'test@example.com'
+        assert events[2]['detail'] == '/api/v1/resources/orders/' and events[2]['ip'] == '127.0.0.1'
+        counts, queued = audit_log.snapshot()
+        assert counts == {('written',): 5} and queued == 0
+        assert 'audit_events_total{result="written"} 5' in metrics_registry.render()
+
+    def test_rotation_and_overflow(self, settings, audit_file):
+        """Файл ротируется по размеру; при заполненной очереди события отбрасываются и учитываются"""
+        settings.AUDIT_FILE_MAX_BYTES = 2000
+        settings.AUDIT_FILE_BACKUPS = 2
+        settings.AUDIT_BATCH_SIZE = 5
+        for i in range(20):
+            audit_log.record(AuditEvent.DECISION, i, 'orders', 'read', True)
+        assert audit_log.flush(timeout=5)
+        assert (audit_file.parent / 'audit.jsonl.1').exists()
+        # Пакет не разрывается между файлами.
+        for path in audit_file.parent.iterdir():
+            assert len(path.read_text(encoding='utf-8').splitlines()) % 5 == 0
+
+        writer = AuditWriter()
+        writer._queue = queue.Queue(3)  # очередь без потока записи
+        for policy in ('drop', 'drop_oldest', 'block'):
+            settings.AUDIT_OVERFLOW = policy
+            settings.AUDIT_BLOCK_TIMEOUT = 0.01
+            for i in range(5):
+                writer.record(AuditEvent.DECISION, i, 'orders', 'read', True)
+        assert writer.snapshot() == ({('dropped',): 2 + 5 + 5}, 3)
+        # drop_oldest вытесняет старые события: в очереди последние.
+        assert [writer._queue.get_nowait()[2] for _ in range(3)] == [2, 3, 4]
+
+    @pytest.mark.django_db(transaction=True)
+    def test_db_backend(self, client, user_with_role, permission_rule, settings):
+        """Решения записываются одной вставкой в AuditEvent и выбираются по пользователю и ресурсу"""
+        settings.AUDIT_LOG = True
+        settings.AUDIT_BACKEND = 'db'
+        client.force_authenticate(user_with_role)
+        for _ in range(3):
+            client.get('/api/v1/resources/orders/')
+        client.delete('/api/v1/resources/orders/1/')
+        assert audit_log.flush(timeout=5)
+
+        events = AuditEvent.objects.filter(user_id=user_with_role.pk, resource='orders').order_by('created_at', 'pk')
+        assert [(event.kind, event.action, event.allowed) for event in events] == [
+            (AuditEvent.DECISION, 'read', True)] * 3 + [(AuditEvent.DECISION, 'delete', False)]
@@ -0,0 +1,159 @@
+"""
+Ограничение частоты логина и регистрации (token bucket).
+
+Классы подключаются как обычные DRF-throttles и срабатывают в ``initial()``,
+до валидации сериализатора, то есть до дорогого хеширования пароля. Частоты
+задаются в ``REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']`` в формате DRF
+(``'10/min'``): число — емкость корзины (допустимый всплеск), корзина
+пополняется равномерно за период.
+
+Корзины всегда проверяются в памяти процесса (``LocalBuckets``) — отказ
+атакующему не стоит даже обращения к кэшу. При ``AUTH_THROTTLE_BACKEND='cache'``
+разрешенные локально запросы дополнительно проверяются по общей корзине
+в кэше Django (``CacheBuckets``), чтобы лимит действовал на все воркеры.
+"""
+import hashlib
+import math
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import SimpleRateThrottle
+
+from .metrics import counter, registry
+
+
+class LocalBuckets:
+    """Корзины в памяти процесса с вытеснением давно не использованных ключей."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def consume(self, key, capacity, refill_rate, now):
+        """Возвращает ``(разрешено, секунд до следующего токена)``."""
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * refill_rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > settings.AUTH_THROTTLE_LOCAL_MAX_KEYS:
+                self._buckets.popitem(last=False)
+        return allowed, 0 if allowed else (1 - tokens) / refill_rate
+
+    def reset(self):
+        with self._lock:
+            self._buckets = OrderedDict()
+
+
+class CacheBuckets:
+    """
+    Общие корзины в кэше Django (GCRA: в кэше хранится только "теоретическое
+    время прибытия" следующего запроса). Чтение и запись не атомарны, поэтому
+    при гонке лимит может быть превышен на несколько запросов.
+    """
+
+    def consume(self, key, capacity, refill_rate, now):
+        interval = 1 / refill_rate
+        tolerance = capacity * interval
+        cache_key = f'throttle:{key}'
+        tat = max(cache.get(cache_key, now), now) + interval
+        if tat - now > tolerance:
+            return False, tat - now - tolerance
+        cache.set(cache_key, tat, math.ceil(tolerance) + 1)
+        return True, 0
+
+
+class ThrottleCounters:
+    """Счетчики разрешенных и отклоненных запросов по scope."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def incr(self, scope, allowed):
+        with self._lock:
+            self._counts[(scope, 'allowed' if allowed else 'throttled')] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+    def reset(self):
+        with self._lock:
+            self._counts = Counter()
+
+
+local_buckets = LocalBuckets()
+cache_buckets = CacheBuckets()
+throttle_counters = ThrottleCounters()
+
+
+@registry.register
+def collect_metrics(lines):
+    counter(lines, 'auth_throttle_requests_total', 'Проверки ограничения частоты логина и регистрации.',
+            ('scope', 'result'), throttle_counters.snapshot())
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    timer = time.time
+
+    def get_ident_key(self, request):
+        raise NotImplementedError('.get_ident_key() must be overridden')
+
+    def get_cache_key(self, request, view):
+        ident = self.get_ident_key(request)
+        if ident is None:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+
+        refill_rate = self.num_requests / self.duration
+        now = self.timer()
+        allowed, self._wait = local_buckets.consume(key, self.num_requests, refill_rate, now)
+        if allowed and settings.AUTH_THROTTLE_BACKEND == 'cache':
+            allowed, self._wait = cache_buckets.consume(key, self.num_requests, refill_rate, now)
+        throttle_counters.incr(self.scope, allowed)
+        return allowed
+
+    def wait(self):
+        return self._wait
+
+
+class IPThrottle(TokenBucketThrottle):
+    def get_ident_key(self, request):
+        return self.get_ident(request)
+
+
+class EmailThrottle(TokenBucketThrottle):
+    """Корзина на email из тела запроса (в ключе — хеш нормализованного адреса)."""
+    field = 'email'
+
+    def get_ident_key(self, request):
+        data = request.data
+        email = data.get(self.field) if hasattr(data, 'get') else None
+        if not isinstance(email, str) or not email.strip():
+            return None
+        return hashlib.blake2b(email.strip().lower().encode(), digest_size=16).hexdigest()
+
+
+class LoginIPThrottle(IPThrottle):
+    scope = 'login_ip'
+
+
+class LoginEmailThrottle(EmailThrottle):
+    scope = 'login_email'
+
+
+class RegisterIPThrottle(IPThrottle):
+    scope = 'register_ip'
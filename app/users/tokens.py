@@ -0,0 +1,147 @@
+"""
+JWT-токены со встроенной маской прав RBAC.
+
+Access-токен получает компактный claim ``rbac``::
+
+    {"v": <поколение RBAC>, "r": <счетчик изменений ролей>, "p": {"orders": 3, "reports": 2}}
+
+где ``p`` — эффективные битовые маски CRUD по ресурсам (см. ``users/rbac.py``).
+Пока поколение в токене совпадает с текущим глобальным, а роли пользователя
+не менялись после выпуска токена, ``CustomRBACPermission`` авторизует запрос
+прямо по claim'у, без обращения к БД.
+
+Кроме того, в access-токен записываются флаги пользователя
+(``is_staff``, ``is_superuser``), по которым ``StatelessJWTAuthentication``
+восстанавливает пользователя без запроса к БД (см. ``users/authentication.py``),
+и время последнего изменения его учетных данных (claim ``cred``): после смены
+пароля, активности или флагов токены с более ранним временем отклоняются
+(``users/revocation.py``).
+
+Включается через ``JWT_RBAC_CLAIMS=True`` или ``JWT_STATELESS_AUTH=True``
+(см. ``core/settings.py``).
+
+Все refresh-токены приложения (``CachedRefreshToken``) проверяют черный
+список через процессный кэш (``users/blacklist.py``).
+"""
+from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from . import rbac
+from .blacklist import revoked_tokens
+from .revocation import stamp
+
+RBAC_CLAIM = 'rbac'
+USER_FLAG_CLAIMS = ('is_staff', 'is_superuser')
+CREDENTIALS_CLAIM = 'cred'
+
+
+def build_rbac_claim(user_id):
+    """Claim с текущим поколением RBAC, счетчиком изменений ролей и масками пользователя."""
+    generation, seq, _ = rbac.matrix.refresh([user_id])
+    return {'v': generation, 'r': seq, 'p': rbac.matrix.masks(user_id)}
+
+
+def claim_mask(claim, resource_name, versions):
+    """
+    Маска ресурса из claim'а или ``None``, если claim отсутствует или устарел.
+    ``versions`` — ``rbac.claim_versions`` пользователя.
+    """
+    generation, roles_changed = versions
+    if not isinstance(claim, dict) or claim.get('v') != generation or claim.get('r', -1) < roles_changed:
+        return None
+    return claim.get('p', {}).get(resource_name, 0)
+
+
+class CachedRefreshToken(RefreshToken):
+    """
+    Refresh-токен с кэшированной проверкой черного списка (``users/blacklist.py``)
+    и меньшим числом запросов при отзыве и ротации: пользователь не загружается,
+    строки вставляются без предварительных SELECT.
+    """
+
+    def check_blacklist(self):
+        if revoked_tokens.is_revoked(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is blacklisted'))
+
+    def _outstanding_defaults(self):
+        return {
+            'user_id': self.payload.get(api_settings.USER_ID_CLAIM),
+            'created_at': self.current_time,
+            'token': str(self),
+            'expires_at': datetime_from_epoch(self.payload['exp']),
+        }
+
+    def blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        token_id = OutstandingToken.objects.filter(jti=jti).values_list('id', flat=True).first()
+        if token_id is None:
+            defaults = self._outstanding_defaults()
+            if not get_user_model().objects.filter(pk=defaults['user_id']).exists():
+                defaults['user_id'] = None
+            token_id = OutstandingToken.objects.create(jti=jti, **defaults).id
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token_id=token_id)], ignore_conflicts=True)
+        revoked_tokens.add(jti)
+        return token_id
+
+    def outstand(self):
+        # Вызывается при ротации для токена с новым JTI, поэтому строка создается сразу.
+        return OutstandingToken.objects.create(
+            jti=self.payload[api_settings.JTI_CLAIM], **self._outstanding_defaults()
+        )
+
+
+class CachedTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = CachedRefreshToken
+
+
+class RBACRefreshToken(CachedRefreshToken):
+    """
+    Refresh-токен, выпускающий access-токены с актуальными claim'ами ``rbac``
+    и флагами пользователя. Claim'ы пересчитываются при каждом выпуске
+    access-токена (логин и refresh), поэтому в сам refresh-токен не попадают.
+    """
+    no_copy_claims = RefreshToken.no_copy_claims + (RBAC_CLAIM, CREDENTIALS_CLAIM) + USER_FLAG_CLAIMS
+
+    _user = None
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token._user = user
+        return token
+
+    def _user_flags(self, user_id):
+        fields = (*USER_FLAG_CLAIMS, 'credentials_changed_at')
+        if self._user is not None:
+            flags = {field: getattr(self._user, field) for field in fields}
+        else:
+            flags = get_user_model().objects.filter(pk=user_id).values(*fields).first()
+        if flags is None:
+            return {**dict.fromkeys(USER_FLAG_CLAIMS, False), CREDENTIALS_CLAIM: 0}
+        flags[CREDENTIALS_CLAIM] = stamp(flags.pop('credentials_changed_at'))
+        return flags
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        user_id = self.payload.get(api_settings.USER_ID_CLAIM)
+        if user_id is not None:
+            user_id = int(user_id)
+            for claim, value in self._user_flags(user_id).items():
+                access[claim] = value
+            access[RBAC_CLAIM] = build_rbac_claim(user_id)
+        return access
+
+
+class RBACTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = RBACRefreshToken
+
+
+class RBACTokenRefreshSerializer(CachedTokenRefreshSerializer):
+    token_class = RBACRefreshToken
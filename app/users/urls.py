@@ -1,9 +1,9 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.views import TokenRefreshView
 from .api import (
-    RegisterView, LogoutView, UserProfileView,
-    RoleViewSet, PermissionRuleViewSet,
+    RegisterView, LoginView, LogoutView, UserProfileView, PermissionCheckView,
+    RoleViewSet, PermissionRuleViewSet, RBACDocumentView,
     OrderViewSet, ReportViewSet
 )
 
@@ -20,14 +20,18 @@ resources_router.register(r'reports', ReportViewSet, basename='reports')
 urlpatterns = [
     # Аутентификация
     path('auth/register/', RegisterView.as_view(), name='register'),
-    path('auth/login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('auth/login/', LoginView.as_view(), name='token_obtain_pair'),
     path('auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('auth/logout/', LogoutView.as_view(), name='logout'),
     path('profile/', UserProfileView.as_view(), name='profile'),
 
+    # Пакетная проверка прав
+    path('authz/check/', PermissionCheckView.as_view(), name='authz_check'),
+
     # Ресурсы (CRUD через ViewSets)
     path('resources/', include(resources_router.urls)),
 
     # Админка RBAC
+    path('admin/rbac/', RBACDocumentView.as_view(), name='rbac_document'),
     path('admin/', include(admin_router.urls)),
 ]
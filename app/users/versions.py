@@ -0,0 +1,74 @@
+"""
+Версии коллекций заказов и отчетов пользователя для условных GET (ETag).
+
+Для каждой пары (модель, владелец) в общем кэше Django хранится счетчик,
+который увеличивается при любой записи коллекции: сохранении и удалении
+записи (сигналы, ``users/signals.py``) и массовом создании (``services``).
+ETag списка и записи строится из счетчика, поэтому совпадение
+``If-None-Match`` проверяется без запроса к таблице. ``QuerySet.update()``
+сигналы не отправляет — после него нужен ``bump``.
+
+Отсутствующий счетчик (первое обращение, вытеснение, очистка кэша)
+создается со значением текущего времени в наносекундах: оно больше любого
+прежнего значения, и выданный ранее ETag не совпадет с новым.
+
+Счетчики должны быть общими для всех воркеров: с кэшем в памяти процесса
+запись через один воркер не меняла бы ETag в остальных (проверка
+``users.E001``, ``users/checks.py``).
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils.http import quote_etag
+
+from core import db_router
+
+from .models import Order, Report
+
+# Поле владельца коллекции.
+OWNER_FIELDS = {Order: 'owner_id', Report: 'author_id'}
+
+
+def _key(model, owner_id):
+    return f'collection:{model._meta.model_name}:{owner_id}'
+
+
+def current(model, owner_id):
+    key = _key(model, owner_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _increment(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+
+
+def bump(model, owner_ids, using=DEFAULT_DB_ALIAS):
+    """
+    Изменение коллекций владельцев ``owner_ids``. Внутри транзакции счетчик
+    увеличивается еще раз после фиксации: ответ, построенный по данным до
+    фиксации, не получит ETag актуальной версии. Владельцы закрепляются за
+    основной БД (core/db_router.py), чтобы новую версию не получил ответ,
+    прочитанный с отстающей реплики.
+    """
+    owner_ids = {owner_id for owner_id in owner_ids if owner_id is not None}
+    db_router.pin(owner_ids)
+    keys = [_key(model, owner_id) for owner_id in owner_ids]
+    _increment(keys)
+    if connections[using].in_atomic_block:
+        transaction.on_commit(lambda: _increment(keys), using=using)
+
+
+def etag(model, user_id, *parts):
+    """ETag ответа: версия коллекции пользователя и параметры запроса ``parts``."""
+    value = ':'.join(map(str, (model._meta.label, user_id, current(model, user_id), *parts)))
+    return quote_etag(hashlib.md5(value.encode()).hexdigest())